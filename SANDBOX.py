@@ -1,121 +1,242 @@
-### HỆ THỐNG TÌM RA BỘ SỐ EXTENT CHUẨN CHO ẢNH NỀN SAHINH.PNG ###
+### HỆ THỐNG TÌM RA BỘ SỐ EXTENT CHUẨN CHO ẢNH NỀN SAHINH.PNG (KÉO SLIDER BẰNG TAY) ###
+#
+# Gộp SANDBOX.py + SANDBOX2.py cũ thành một công cụ có tham số (--preset):
+#   config  bắt đầu từ extent đang lưu trong map_config.json (mặc định - tinh chỉnh tiếp)
+#   image   khung nền theo tỉ lệ ảnh, chiều cao = cạnh lớn nhất của vùng node (SANDBOX.py cũ)
+#   bbox    khung nền = đúng vùng bao các node, có lưới (SANDBOX2.py cũ)
+# Vẽ lại bằng blitting thay vì draw_idle mỗi lần kéo:
+#   - Nền tĩnh (trục, lưới, nhãn, khung slider) vẽ 1 lần rồi cache (copy_from_bbox); mỗi lần kéo
+#     chỉ dán lại nền + vẽ ảnh, node và phần động của slider rồi blit.
+#   - Đang kéo: dùng ảnh thu nhỏ trong kim tự tháp (trung bình khối 2x2) + nội suy 'nearest';
+#     nhả chuột mới vẽ lại ảnh gốc đầy đủ.
+#   - Sự kiện slider bị điều tiết: tối đa 1 lần vẽ mỗi THROTTLE giây, giá trị cuối luôn được vẽ.
+# Nút "Lưu" ghi extent vào map_config.json (map_config.save_extent) - các file khác đọc từ đó.
+#
+#   python SANDBOX.py [--preset config|image|bbox] [--graph file.graphml] [--img Sahinh.png]
 
-import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-from matplotlib.widgets import Slider, Button
 import os
+import sys
+import time
 
-# --- CẤU HÌNH FILE ---
-GRAPH_FILE = "Competition_track_graph!.graphml"
-IMG_FILE = "Sahinh.png"
-
-# --- KIỂM TRA FILE ---
-if not os.path.exists(GRAPH_FILE) or not os.path.exists(IMG_FILE):
-    print(f"LỖI: Không tìm thấy file {GRAPH_FILE} hoặc {IMG_FILE}")
-    exit()
-
-# --- LOAD DỮ LIỆU ---
-G = nx.read_graphml(GRAPH_FILE)
-pos = {}
-all_x, all_y = [], []
-for n, data in G.nodes(data=True):
-    x = float(data.get('x', data.get('d0', 0)))
-    y = float(data.get('y', data.get('d1', 0)))
-    pos[n] = (x, y)
-    all_x.append(x)
-    all_y.append(y)
-
-# Tính tâm của đồ thị
-center_x = (min(all_x) + max(all_x)) / 2
-center_y = (min(all_y) + max(all_y)) / 2
-
-# === [SỬA ĐOẠN NÀY] ===
-# Thay vì lấy width/height riêng, ta lấy cạnh lớn nhất để đảm bảo khung ảnh VUÔNG
-# (Giả sử ảnh Sahinh.png của bạn là hình vuông hoặc gần vuông)
-# --- TÍNH TOÁN TỶ LỆ ẢNH CHUẨN (Sửa đoạn này) ---
-img = mpimg.imread(IMG_FILE) # Đọc ảnh trước để lấy kích thước thật
-img_h, img_w = img.shape[:2] # Lấy chiều cao và chiều rộng pixel
-img_aspect_ratio = img_w / img_h # Tính tỷ lệ khung hình (ví dụ 1.77 cho 16:9)
-
-# Tính kích thước vùng bao của các node dữ liệu
-data_width = max(all_x) - min(all_x)
-data_height = max(all_y) - min(all_y)
-max_dim = max(data_width, data_height)
-
-# Thiết lập kích thước khung nền dựa trên tỷ lệ thật của ảnh
-# Lấy cạnh lớn nhất của dữ liệu làm chuẩn chiều cao
-base_height = max_dim 
-# Chiều rộng sẽ tự động co giãn theo tỷ lệ ảnh gốc
-base_width = max_dim * img_aspect_ratio 
-
-print(f"-> Đã phát hiện ảnh gốc kích thước: {img_w}x{img_h} (Tỷ lệ: {img_aspect_ratio:.2f})")
-
-# --- THIẾT LẬP GIAO DIỆN ---
-fig, ax = plt.subplots(figsize=(14, 8))
-plt.subplots_adjust(left=0.1, bottom=0.35) 
-
-# 1. Khai báo biến khởi tạo TRƯỚC
-initial_scale = 1.45 
-initial_dx = 0
-initial_dy = 0
-
-# 2. Định nghĩa hàm tính toán TRƯỚC KHI DÙNG (Quan trọng!)
-def calculate_extent(scale, dx, dy):
-    new_w = base_width * scale
-    new_h = base_height * scale
-    
-    cx = center_x + dx
-    cy = center_y + dy
-    
-    return [cx - new_w/2, cx + new_w/2, cy - new_h/2, cy + new_h/2]
-
-# 3. Bây giờ mới vẽ ảnh nền (vì đã có hàm calculate_extent để dùng)
-img_obj = ax.imshow(img, extent=calculate_extent(initial_scale, 0, 0), aspect='equal', alpha=0.7)
-
-# 4. Vẽ các Node ĐÈ LÊN TRÊN ảnh
-nx.draw_networkx_nodes(G, pos, ax=ax, node_size=10, node_color='red', edgecolors='black')
-
-ax.set_title("KÉO THANH TRƯỢT ĐỂ CHỈNH - SAU ĐÓ COPY SỐ Ở DƯỚI")
-
-# --- TẠO CÁC THANH TRƯỢT (SLIDERS) ---
-axcolor = 'lightgoldenrodyellow'
-
-ax_scale = plt.axes([0.2, 0.2, 0.6, 0.03], facecolor=axcolor)
-s_scale = Slider(ax_scale, 'Độ Phóng (Scale)', 0.1, 10.0, valinit=initial_scale, valstep=0.01)
-
-ax_dx = plt.axes([0.2, 0.15, 0.6, 0.03], facecolor=axcolor)
-s_dx = Slider(ax_dx, 'Dịch Ngang (X)', -50.0, 50.0, valinit=0, valstep=0.1)
-
-ax_dy = plt.axes([0.2, 0.1, 0.6, 0.03], facecolor=axcolor)
-s_dy = Slider(ax_dy, 'Dịch Dọc (Y)', -50.0, 50.0, valinit=0, valstep=0.1)
-
-# --- HÀM CẬP NHẬT KHI KÉO ---
-def update(val):
-    scale = s_scale.val
-    dx = s_dx.val
-    dy = s_dy.val
-    
-    new_extent = calculate_extent(scale, dx, dy)
-    
-    img_obj.set_extent(new_extent)
-    fig.canvas.draw_idle()
-
-s_scale.on_changed(update)
-s_dx.on_changed(update)
-s_dy.on_changed(update)
-
-# --- NÚT IN KẾT QUẢ ---
-resetax = plt.axes([0.8, 0.025, 0.1, 0.04])
-button = Button(resetax, 'In Tọa Độ', color=axcolor, hovercolor='0.975')
-
-def print_result(event):
-    ext = calculate_extent(s_scale.val, s_dx.val, s_dy.val)
-    print("\n" + "="*40)
-    print("Bộ số cần tìm:")
-    print(f"MY_EXTENT = [{ext[0]:.4f}, {ext[1]:.4f}, {ext[2]:.4f}, {ext[3]:.4f}]")
-    print("="*40 + "\n")
-
-button.on_clicked(print_result)
-
-plt.show()
\ No newline at end of file
+import matplotlib.image as mpimg
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.widgets import Button, Slider
+
+from map_cache import GRAPH_FILE
+from map_config import CONFIG_FILE, IMG_FILE, load_extent, save_extent
+from track_graph import load_track
+
+# --- CẤU HÌNH ---
+PRESETS = {
+    'config': {'base': 'config', 'scale': 1.0, 'scale_range': (0.5, 2.0), 'scale_step': 0.001,
+               'shift': 2.0, 'shift_step': 0.005, 'alpha': 0.7, 'grid': True},
+    'image': {'base': 'image', 'scale': 1.45, 'scale_range': (0.1, 10.0), 'scale_step': 0.01,
+              'shift': 50.0, 'shift_step': 0.1, 'alpha': 0.7, 'grid': False},
+    'bbox': {'base': 'bbox', 'scale': 1.1, 'scale_range': (0.5, 5.0), 'scale_step': 0.01,
+             'shift': 20.0, 'shift_step': 0.05, 'alpha': 0.6, 'grid': True},
+}
+DEFAULT_PRESET = 'config'
+THROTTLE = 1 / 30          # s - khoảng cách tối thiểu giữa 2 lần vẽ khi kéo
+DRAG_MAX_PIXELS = 400      # cạnh dài nhất của ảnh thu nhỏ dùng khi kéo
+AXCOLOR = 'lightgoldenrodyellow'
+
+
+# ================= DỮ LIỆU =================
+def image_pyramid(img, max_pixels=DRAG_MAX_PIXELS):
+    """[ảnh gốc, 1/2, 1/4, ...] - mỗi tầng là trung bình khối 2x2 của tầng trước."""
+    levels = [img]
+    while max(levels[-1].shape[:2]) > max_pixels:
+        a = levels[-1]
+        h, w = a.shape[0] // 2 * 2, a.shape[1] // 2 * 2
+        a = a[:h, :w].astype(np.float32)
+        small = (a[0::2, 0::2] + a[1::2, 0::2] + a[0::2, 1::2] + a[1::2, 1::2]) / 4
+        levels.append(small.astype(img.dtype) if img.dtype == np.uint8 else small)
+    return levels
+
+
+def base_frame(mode, xy, img_shape, extent):
+    """Khung nền ở scale = 1 -> (tâm x, tâm y, rộng, cao) theo chế độ của preset."""
+    if mode == 'config':
+        left, right, bottom, top = extent
+        return (left + right) / 2, (bottom + top) / 2, right - left, top - bottom
+    (x0, y0), (x1, y1) = xy.min(axis=0), xy.max(axis=0)
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    if mode == 'bbox':
+        return cx, cy, x1 - x0, y1 - y0
+    # Lấy cạnh lớn nhất của dữ liệu làm chiều cao, chiều rộng co giãn theo tỉ lệ ảnh gốc
+    img_h, img_w = img_shape[:2]
+    max_dim = max(x1 - x0, y1 - y0)
+    return cx, cy, max_dim * img_w / img_h, max_dim
+
+
+def calculate_extent(frame, scale, dx, dy):
+    cx, cy, w, h = frame
+    cx, cy, w, h = cx + dx, cy + dy, w * scale, h * scale
+    return [float(v) for v in (cx - w / 2, cx + w / 2, cy - h / 2, cy + h / 2)]
+
+
+# ================= GIAO DIỆN =================
+class CalibrationView:
+    """Cửa sổ slider scale / dx / dy vẽ bằng blitting."""
+
+    def __init__(self, track, img, preset=PRESETS[DEFAULT_PRESET], config_file=CONFIG_FILE):
+        self.preset = preset
+        self.config_file = config_file
+        xy = np.asarray(track.xy, dtype=np.float64)
+        self.frame = base_frame(preset['base'], xy, img.shape, load_extent(config_file))
+        self.pyramid = image_pyramid(img)
+        self.background = None
+        self.dragging = False
+        self.last_draw = 0.0
+        self.pending = False
+
+        self.fig, self.ax = plt.subplots(figsize=(14, 8))
+        self.fig.subplots_adjust(left=0.1, bottom=0.35)
+        ax = self.ax
+        ext = calculate_extent(self.frame, preset['scale'], 0, 0)
+        # animated=True: không nằm trong nền cache, chỉ vẽ bằng draw_artist
+        self.img_obj = ax.imshow(img, extent=ext, aspect='equal', alpha=preset['alpha'],
+                                 interpolation='antialiased', animated=True)
+        self.nodes = ax.scatter(xy[:, 0], xy[:, 1], s=10, c='red', edgecolors='black',
+                                zorder=2, animated=True)
+        # Trục cố định theo vùng node + khung ảnh ban đầu -> nền cache không đổi khi kéo
+        pad = 0.5
+        ax.set_xlim(min(ext[0], xy[:, 0].min()) - pad, max(ext[1], xy[:, 0].max()) + pad)
+        ax.set_ylim(min(ext[2], xy[:, 1].min()) - pad, max(ext[3], xy[:, 1].max()) + pad)
+        ax.set_autoscale_on(False)
+        if preset['grid']:
+            ax.grid(True, linestyle='--', alpha=0.4)
+        ax.set_title("KÉO THANH TRƯỢT ĐỂ CHỈNH - BẤM 'LƯU' ĐỂ GHI VÀO " + config_file)
+
+        # --- SLIDER (drawon=False: không tự gọi draw_idle, phần động được blit cùng ảnh) ---
+        s_min, s_max = preset['scale_range']
+        shift = preset['shift']
+        self.s_scale = self._slider([0.2, 0.2, 0.6, 0.03], 'Độ Phóng (Scale)', s_min, s_max,
+                                    preset['scale'], preset['scale_step'])
+        self.s_dx = self._slider([0.2, 0.15, 0.6, 0.03], 'Dịch Ngang (X)', -shift, shift, 0,
+                                 preset['shift_step'])
+        self.s_dy = self._slider([0.2, 0.1, 0.6, 0.03], 'Dịch Dọc (Y)', -shift, shift, 0,
+                                 preset['shift_step'])
+        self.sliders = (self.s_scale, self.s_dx, self.s_dy)
+        # Phần thay đổi khi kéo: thanh tô, tay nắm, chữ giá trị
+        self.slider_artists = []
+        for s in self.sliders:
+            parts = [s.poly, s.valtext] + [line for line in s.ax.lines if line is not s.vline]
+            for a in parts:
+                a.set_animated(True)
+            self.slider_artists += [(s.ax, a) for a in parts]
+            s.on_changed(self.on_slider)
+
+        ax_print = self.fig.add_axes([0.65, 0.025, 0.12, 0.04])
+        self.b_print = Button(ax_print, 'In Tọa Độ', color=AXCOLOR, hovercolor='0.975')
+        self.b_print.on_clicked(self.print_result)
+        ax_save = self.fig.add_axes([0.8, 0.025, 0.12, 0.04])
+        self.b_save = Button(ax_save, 'Lưu', color=AXCOLOR, hovercolor='0.975')
+        self.b_save.on_clicked(self.save)
+
+        canvas = self.fig.canvas
+        canvas.mpl_connect('draw_event', self.on_draw)
+        canvas.mpl_connect('button_release_event', self.on_release)
+        self.timer = canvas.new_timer(interval=int(THROTTLE * 1000))
+        self.timer.single_shot = True
+        self.timer.add_callback(self.flush)
+
+    def _slider(self, rect, label, vmin, vmax, vinit, step):
+        s = Slider(self.fig.add_axes(rect, facecolor=AXCOLOR), label, vmin, vmax,
+                   valinit=vinit, valstep=step)
+        s.drawon = False
+        return s
+
+    def extent(self):
+        return calculate_extent(self.frame, self.s_scale.val, self.s_dx.val, self.s_dy.val)
+
+    # --- VẼ ---
+    def on_draw(self, event):
+        """Sau mỗi lần vẽ đầy đủ (mở cửa sổ, resize, nhả chuột): cache lại nền tĩnh."""
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        self.ax.draw_artist(self.img_obj)
+        self.ax.draw_artist(self.nodes)
+        for ax, a in self.slider_artists:
+            ax.draw_artist(a)
+
+    def blit(self):
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        self.draw_animated()
+        canvas.blit(self.fig.bbox)
+        self.last_draw = time.perf_counter()
+
+    # --- SỰ KIỆN ---
+    def on_slider(self, val):
+        if any(s.drag_active for s in self.sliders) and not self.dragging:
+            # Bắt đầu kéo: đổi sang ảnh thu nhỏ, nội suy rẻ nhất
+            self.dragging = True
+            self.img_obj.set_data(self.pyramid[-1])
+            self.img_obj.set_interpolation('nearest')
+        self.img_obj.set_extent(self.extent())
+        if time.perf_counter() - self.last_draw >= THROTTLE:
+            self.pending = False
+            self.blit()
+        elif not self.pending:
+            # Quá dày: hoãn lại, timer vẽ giá trị cuối cùng sau THROTTLE
+            self.pending = True
+            self.timer.start()
+
+    def flush(self):
+        if self.pending:
+            self.pending = False
+            self.blit()
+
+    def on_release(self, event):
+        if not self.dragging:
+            return
+        self.dragging = False
+        self.pending = False
+        self.img_obj.set_data(self.pyramid[0])
+        self.img_obj.set_interpolation('antialiased')
+        self.img_obj.set_extent(self.extent())
+        self.blit()
+
+    def print_result(self, event=None):
+        ext = self.extent()
+        print("\n" + "=" * 40)
+        print("Bộ số cần tìm:")
+        print(f"MY_EXTENT = [{ext[0]:.4f}, {ext[1]:.4f}, {ext[2]:.4f}, {ext[3]:.4f}]")
+        print("=" * 40 + "\n")
+
+    def save(self, event=None):
+        ext = self.extent()
+        save_extent([round(v, 4) for v in ext], self.config_file)
+        print(f"✅ Đã lưu extent {[round(v, 4) for v in ext]} vào {self.config_file}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def opt(flag, default):
+        return args[args.index(flag) + 1] if flag in args else default
+
+    preset_name = opt("--preset", DEFAULT_PRESET)
+    graph_file = opt("--graph", GRAPH_FILE)
+    img_file = opt("--img", IMG_FILE)
+    if preset_name not in PRESETS:
+        print(f"LỖI: preset '{preset_name}' không có - chọn một trong {', '.join(PRESETS)}")
+        sys.exit(1)
+    if not os.path.exists(graph_file) or not os.path.exists(img_file):
+        print(f"LỖI: Không tìm thấy file {graph_file} hoặc {img_file}")
+        sys.exit(1)
+
+    track = load_track(graph_file)
+    img = mpimg.imread(img_file)
+    img_h, img_w = img.shape[:2]
+    print(f"-> Đã phát hiện ảnh gốc kích thước: {img_w}x{img_h} (Tỷ lệ: {img_w / img_h:.2f})")
+    view = CalibrationView(track, img, PRESETS[preset_name])
+    print(f"-> Preset '{preset_name}', ảnh kéo thả {view.pyramid[-1].shape[1]}x{view.pyramid[-1].shape[0]}")
+    plt.show()
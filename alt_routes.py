@@ -0,0 +1,285 @@
+### ĐƯỜNG DỰ PHÒNG: K ĐƯỜNG NGẮN NHẤT KHÔNG LẶP (YEN) CHO TỪNG CẶP WAYPOINT ###
+#
+# Tính sẵn tối đa K đường khác nhau cho mỗi cặp waypoint liên tiếp. Khi đang chạy mà
+# một cạnh / node trên lộ trình bị chặn (AStarPlanner.block_edge / block_node), lấy ngay
+# đường dự phòng rẻ nhất còn thông thay vì tìm lại từ đầu.
+#   - Yen chạy trên SearchGraph (trạng thái-cạnh), tìm kiếm con bằng A* của AStarPlanner
+#     với cờ chặn tạm thời -> tôn trọng luôn các chặn đang bật lúc tính.
+#   - Đa dạng: một đường chỉ được nhận nếu phần chiều dài trùng cạnh với MỖI đường đã nhận
+#     không vượt MAX_OVERLAP (0 = hoàn toàn khác nhau, 1 = không lọc). Tỉ lệ tính trên đường
+#     ngắn hơn trong 2 đường -> đường bao trọn một đường đã nhận (đi vòng thêm) trùng 100%.
+#   - Cache theo cặp (s, t) + chỉ mục ngược cạnh -> các cặp dùng cạnh đó: khi cạnh đổi trọng
+#     số / bị xóa chỉ tính lại các cặp liên quan (invalidate_edges).
+#
+#   python alt_routes.py [waypoint ...] [--k K] [--overlap X] [--check]
+
+import heapq
+import math
+import numpy as np
+
+from instrument import count, traced
+from map_cache import GRAPH_FILE, load_map
+from astar_planner import AStarPlanner
+from edge_weights import edge_lengths
+
+# --- CẤU HÌNH ---
+K_ROUTES = 3          # số đường giữ cho mỗi cặp waypoint (kể cả đường tối ưu)
+MAX_OVERLAP = 0.6     # tỉ lệ chiều dài trùng tối đa với mỗi đường đã nhận (so với đường ngắn hơn)
+MAX_CANDIDATES = 40   # số đường Yen liệt kê tối đa cho mỗi cặp (chặn thời gian khi khó đa dạng)
+
+
+def _arc_costs(graph, path):
+    """Chi phí cộng dồn dọc theo dãy đỉnh SearchGraph: out[i] = chi phí từ path[0] tới path[i]."""
+    indptr, indices, weights = graph.indptr, graph.indices, graph.weights
+    out = [0.0]
+    for u, v in zip(path, path[1:]):
+        e = indptr[u] + int(np.flatnonzero(indices[indptr[u]:indptr[u + 1]] == v)[0])
+        out.append(out[-1] + float(weights[e]))
+    return out
+
+
+@traced("plan.yen")
+def k_shortest_paths(planner, src, dst, k=K_ROUTES, max_overlap=MAX_OVERLAP,
+                     max_candidates=MAX_CANDIDATES, lengths=None):
+    """Yen giữa 2 đỉnh SearchGraph -> list (chi phí, dãy đỉnh) tăng dần theo chi phí.
+
+    Liệt kê các đường không lặp đỉnh (không đi lại một trạng thái-cạnh) theo thứ tự chi phí,
+    giữ đường trùng <= max_overlap với mọi đường đã giữ, dừng khi đủ k đường hoặc đã liệt
+    kê max_candidates đường.
+    """
+    graph = planner.graph
+    if lengths is None:
+        lengths = edge_lengths(graph.track)
+    n_real = len(lengths)
+
+    def real_edges(path):
+        return {v for v in path if v < n_real}
+
+    cost, path = planner.search_vertices(src, dst)
+    if path is None:
+        return []
+    listed = []                     # mọi đường Yen đã liệt kê (làm gốc cho spur)
+    kept = []                       # (chi phí, dãy đỉnh, tập cạnh thật, chiều dài)
+    candidates = [(cost, path)]
+    seen = {tuple(path)}
+    base = planner.vertex_mask()
+    mask = planner.vertex_mask()
+    n_spur = 0
+    while candidates and len(kept) < k:
+        cost, path = heapq.heappop(candidates)
+        listed.append(path)
+        # Lọc đa dạng: chiều dài cạnh thật trùng với từng đường đã giữ, chia cho chiều dài
+        # đường ngắn hơn trong 2 đường (đường chứa trọn đường đã giữ -> trùng 100%)
+        edges = real_edges(path)
+        length = sum(lengths[e] for e in edges) or 1.0
+        if all(sum(lengths[e] for e in edges & other) / min(length, other_length) <= max_overlap
+               for _, _, other, other_length in kept):
+            kept.append((cost, path, edges, length))
+        if len(listed) >= max_candidates:
+            break
+
+        # Spur từ từng đỉnh của đường vừa lấy: chặn phần gốc, cấm các cung đã dùng
+        acc = _arc_costs(graph, path)
+        for i in range(len(path) - 1):
+            spur, root = path[i], path[:i + 1]
+            banned = {p[i + 1] for p in listed if len(p) > i + 1 and p[:i + 1] == root}
+            for v in root[:-1]:
+                mask[v] = 1
+            spur_cost, spur_path = planner.search_vertices(spur, dst, blocked=mask, banned=banned)
+            for v in root[:-1]:
+                mask[v] = base[v]
+            n_spur += 1
+            if spur_path is None:
+                continue
+            new = root[:-1] + spur_path
+            if tuple(new) not in seen:
+                seen.add(tuple(new))
+                heapq.heappush(candidates, (acc[i] + spur_cost, new))
+    count("plan.yen_spur", n_spur)
+    return [(c, p) for c, p, _, _ in kept]
+
+
+class AltRouteCache:
+    """K đường dự phòng cho từng cặp waypoint, tính lười và chỉ tính lại cặp bị ảnh hưởng."""
+
+    def __init__(self, planner, k=K_ROUTES, max_overlap=MAX_OVERLAP):
+        self.planner = planner
+        self.track = planner.track
+        self.graph = planner.graph
+        self.k = k
+        self.max_overlap = max_overlap
+        self.lengths = edge_lengths(self.track)
+        self.routes = {}     # (s, t) index node -> list (chi phí, dãy đỉnh SearchGraph)
+        self.by_edge = {}    # trạng thái-cạnh -> tập cặp (s, t) có đường đi qua nó
+
+    def alternatives(self, s, t):
+        """Các đường dự phòng (chi phí, dãy đỉnh) giữa 2 index node, tính nếu chưa có."""
+        key = (s, t)
+        if key not in self.routes:
+            graph = self.graph
+            routes = k_shortest_paths(self.planner, graph.start_vertex(s), graph.goal_vertex(t),
+                                      self.k, self.max_overlap, lengths=self.lengths)
+            self.routes[key] = routes
+            for _, path in routes:
+                for v in path[1:-1]:
+                    self.by_edge.setdefault(v, set()).add(key)
+        return self.routes[key]
+
+    def precompute(self, points_list):
+        """Tính sẵn cho mọi cặp waypoint liên tiếp (list id)."""
+        idx = [self.track.node(str(p)) for p in points_list]
+        for s, t in zip(idx, idx[1:]):
+            if s != t:
+                self.alternatives(s, t)
+
+    def invalidate_edges(self, edges):
+        """Xóa cache của các cặp có đường đi qua một trong các trạng thái-cạnh đã đổi -> số cặp.
+
+        Đủ khi cạnh tăng trọng số / bị xóa; cạnh mới hoặc giảm trọng số có thể tạo đường
+        tốt hơn cho cặp bất kỳ -> dùng clear().
+        """
+        pairs = set()
+        for e in np.asarray(edges, dtype=np.int64).tolist():
+            pairs |= self.by_edge.pop(e, set())
+        for key in pairs:
+            for _, path in self.routes.pop(key, ()):
+                for v in path[1:-1]:
+                    users = self.by_edge.get(v)
+                    if users is not None:
+                        users.discard(key)
+        return len(pairs)
+
+    def invalidate_nodes(self, nids):
+        """Như invalidate_edges cho mọi trạng thái-cạnh (kể cả link chuyển làn) chạm các node này."""
+        graph = self.graph
+        idx = np.array([self.track.node(n) for n in nids], dtype=np.int64)
+        return self.invalidate_edges(np.flatnonzero(np.isin(graph.edge_src, idx) | np.isin(graph.edge_dst, idx)))
+
+    def clear(self):
+        self.routes = {}
+        self.by_edge = {}
+
+    @traced("plan.fallback")
+    def fallback(self, s, t):
+        """Đường dự phòng rẻ nhất còn thông theo cờ chặn hiện tại -> (chi phí, list index node).
+
+        Hết đường dự phòng thì tìm lại bằng A* (có thể trả (inf, None)).
+        """
+        if s == t:
+            return self.planner.search(s, t)
+        for cost, path in self.alternatives(s, t):
+            if not self.planner.path_blocked(path):
+                return cost, self.graph.decode(path)
+        count("plan.fallback_miss")
+        return self.planner.search(s, t)
+
+    def plan(self, points_list):
+        """Ghép lộ trình qua các waypoint (list id) từ cache -> full_path, None nếu bị chặn hết."""
+        ids, full_path = self.track.ids, []
+        for i in range(len(points_list) - 1):
+            start, end = str(points_list[i]), str(points_list[i + 1])
+            _, segment = self.fallback(self.track.node(start), self.track.node(end))
+            if segment is None:
+                print(f"LỖI: Không tìm thấy đường từ {start} đến {end}!")
+                return None
+            full_path.extend(ids[j] for j in (segment if i == 0 else segment[1:]))
+        return full_path
+
+
+# ================= DEMO + KIỂM TRA =================
+def check_yen(planner, pairs, k=5):
+    """So chi phí k đường đầu của Yen (không lọc đa dạng) với nx.shortest_simple_paths."""
+    import itertools
+    import networkx as nx
+
+    graph = planner.graph
+    G = nx.DiGraph()
+    G.add_nodes_from(range(graph.n_vertices))
+    for u in range(graph.n_vertices):
+        for e in range(graph.indptr[u], graph.indptr[u + 1]):
+            G.add_edge(u, int(graph.indices[e]), weight=float(graph.weights[e]))
+    mismatch = 0
+    for s, t in pairs:
+        src, dst = graph.start_vertex(s), graph.goal_vertex(t)
+        # max_overlap = inf: không lọc đa dạng -> phải trùng đúng k đường đầu của nx
+        ours = [c for c, _ in k_shortest_paths(planner, src, dst, k=k, max_overlap=math.inf,
+                                                max_candidates=k)]
+        try:
+            ref = [nx.path_weight(G, p, 'weight')
+                   for p in itertools.islice(nx.shortest_simple_paths(G, src, dst, weight='weight'), k)]
+        except nx.NetworkXNoPath:
+            ref = []
+        if len(ours) != len(ref) or not np.allclose(ours, ref):
+            mismatch += 1
+    return mismatch
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    args = sys.argv[1:]
+
+    def opt(flag, default):
+        if flag in args:
+            k = args.index(flag)
+            value = args[k + 1]
+            del args[k:k + 2]
+            return type(default)(value)
+        return default
+
+    k = opt("--k", K_ROUTES)
+    overlap = opt("--overlap", MAX_OVERLAP)
+    check = "--check" in args
+    if check:
+        args.remove("--check")
+    waypoints = args or ["1", "89", "36", "67"]
+
+    track, graph = load_map(GRAPH_FILE)
+    planner = AStarPlanner(track, graph)
+    cache = AltRouteCache(planner, k=k, max_overlap=overlap)
+    t0 = time.perf_counter()
+    cache.precompute(waypoints)
+    print(f"--- {k} ĐƯỜNG DỰ PHÒNG / CẶP (trùng <= {overlap:.0%}) - tính trong "
+          f"{(time.perf_counter() - t0) * 1000:.1f} ms ---")
+    idx = [track.node(w) for w in waypoints]
+    pairs = [(s, t) for s, t in zip(idx, idx[1:]) if s != t]
+    for s, t in pairs:
+        print(f"{track.ids[s]} -> {track.ids[t]}:")
+        for cost, path in cache.alternatives(s, t):
+            nodes = graph.decode(path)
+            print(f"   {cost:7.2f}s | {len(nodes):3d} node | {' '.join(track.ids[i] for i in nodes)}")
+
+    # Chặn lần lượt từng cạnh thật trên đường tối ưu: đường dự phòng vs tìm lại bằng A*
+    t_fb, t_astar, worse, hits = [], [], [], 0
+    for s, t in pairs:
+        best = cache.alternatives(s, t)[0][1]
+        for e in [v for v in best if v < track.n_edges]:
+            planner.set_edge_blocked(e, True)
+            hits += any(not planner.path_blocked(p) for _, p in cache.alternatives(s, t))
+            t0 = time.perf_counter()
+            cost, _ = cache.fallback(s, t)
+            t_fb.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            ref, _ = planner.search(s, t)
+            t_astar.append(time.perf_counter() - t0)
+            planner.set_edge_blocked(e, False)
+            if math.isfinite(ref):
+                worse.append(cost - ref)
+    if t_fb:
+        print(f"--- CHẶN 1 CẠNH TRÊN ĐƯỜNG TỐI ƯU ({len(t_fb)} lần) ---")
+        for name, ts in (("đường dự phòng", t_fb), ("A* tìm lại", t_astar)):
+            ts = np.array(ts) * 1e6
+            print(f"{name:<16} | p50 {np.percentile(ts, 50):8.1f} us | p99 {np.percentile(ts, 99):8.1f} us")
+        print(f"-> {hits}/{len(t_fb)} lần có sẵn đường dự phòng trong cache (còn lại tìm lại bằng A*)")
+        print(f"-> Dự phòng chậm hơn đường tối ưu mới trung bình {np.mean(worse):.2f}s, tối đa {np.max(worse):.2f}s")
+
+    # Đổi trọng số một cạnh: chỉ các cặp có đường đi qua nó bị tính lại
+    e = cache.alternatives(*pairs[0])[0][1][1]
+    n = cache.invalidate_edges([e])
+    print(f"-> Đổi cạnh {e}: xóa cache {n}/{len(pairs)} cặp")
+
+    if check:
+        rng = np.random.default_rng(0)
+        test = [tuple(int(i) for i in rng.choice(track.n_nodes, 2, replace=False)) for _ in range(30)]
+        print(f"-> Lệch chi phí so với nx.shortest_simple_paths: {check_yen(planner, test)}/{len(test)} cặp")
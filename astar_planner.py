@@ -0,0 +1,233 @@
+### BỘ LẬP LỘ TRÌNH A* + CHẶN ĐƯỜNG ĐỘNG (VẬT CẢN / KHU VỰC NGƯỜI ĐI BỘ) ###
+#
+# Tìm kiếm chạy trên SearchGraph (trạng thái-cạnh, xem edge_weights.py).
+# Heuristic h(v) = khoảng cách Euclid(vị trí của v, đích) / V_MAX.
+# Mọi cung có trọng số = quãng đường / vận tốc với vận tốc <= V_MAX, và đoạn thẳng
+# luôn ngắn hơn mọi đường đi -> h không bao giờ vượt chi phí thật (admissible),
+# nên A* trả về đúng đường tối ưu như Dijkstra nhưng mở ít đỉnh hơn.
+
+import heapq
+import math
+import numpy as np
+
+from instrument import count, traced
+from map_cache import GRAPH_FILE, load_map
+from edge_weights import V_MAX
+
+
+class AStarPlanner:
+    """A* trên CSR; node/cạnh bị chặn được bật/tắt mà không dựng lại đồ thị."""
+
+    def __init__(self, track, graph, v_max=V_MAX):
+        self.track = track
+        self.graph = graph
+        self.inv_v = 1.0 / v_max
+        # Bản list Python của CSR: truy cập trong vòng lặp nhanh hơn mảng numpy
+        self._indptr = graph.indptr.tolist()
+        self._indices = graph.indices.tolist()
+        self._weights = np.asarray(graph.weights, dtype=np.float64).tolist()
+        self._x = graph.vertex_xy[:, 0].tolist()
+        self._y = graph.vertex_xy[:, 1].tolist()
+        # Cờ chặn theo node / cạnh gốc; gộp lại thành cờ chặn theo đỉnh của SearchGraph.
+        # bytearray thay vì mảng bool numpy: đọc từng phần tử trong vòng lặp rẻ hơn nhiều
+        self.blocked_nodes = bytearray(track.n_nodes)
+        self.blocked_edges = bytearray(track.n_edges)
+        self._blocked = bytearray(graph.n_vertices)
+        # Cạnh thật -> mọi trạng thái chạy trên làn của nó (chính nó + O/C/R khi vượt xe)
+        base = np.asarray(graph.base_edge)
+        states = np.flatnonzero(base >= 0)
+        order = states[np.argsort(base[states], kind='stable')]
+        split = np.searchsorted(base[order], np.arange(1, track.n_edges))
+        self._states_of = [s.tolist() for s in np.split(order, split)]
+        self.last_expanded = 0   # số đỉnh đã mở ở lần search gần nhất
+
+    # --- CHẶN / MỞ ĐƯỜNG ---
+    def _edge(self, u, v):
+        e = self.track.edge_index(self.track.node(u), self.track.node(v))
+        if e < 0:
+            raise KeyError(f"Không có cạnh {u} -> {v}")
+        return e
+
+    def _refresh_edge(self, e):
+        # Trạng thái e bị chặn nếu cạnh thật mà nó chạy trên làn (base_edge: chính e, hoặc cạnh
+        # nét đứt mà link vượt xe / đoạn đi ngược dùng) hoặc một đầu của e bị chặn.
+        # Link chuyển làn cùng chiều (base_edge = -1) chỉ bị chặn theo node hai đầu
+        graph = self.graph
+        base = graph.base_edge[e]
+        self._blocked[e] = ((base >= 0 and self.blocked_edges[base])
+                            or self.blocked_nodes[graph.edge_src[e]]
+                            or self.blocked_nodes[graph.edge_dst[e]])
+
+    def set_edge_blocked(self, e, blocked=True):
+        """Bật/tắt chặn theo chỉ số cạnh CSR (dùng trong vòng lặp nóng)."""
+        self.blocked_edges[e] = bool(blocked)
+        for s in self._states_of[e]:
+            self._refresh_edge(s)
+
+    def block_node(self, nid, blocked=True):
+        i = self.track.node(nid)
+        self.blocked_nodes[i] = bool(blocked)
+        self._blocked[self.graph.start_vertex(i)] = bool(blocked)
+        self._blocked[self.graph.goal_vertex(i)] = bool(blocked)
+        for e in np.flatnonzero((self.graph.edge_src == i) | (self.graph.edge_dst == i)):
+            self._refresh_edge(e)
+
+    def block_edge(self, u, v, blocked=True):
+        self.set_edge_blocked(self._edge(u, v), blocked)
+
+    def unblock_node(self, nid):
+        self.block_node(nid, False)
+
+    def unblock_edge(self, u, v):
+        self.block_edge(u, v, False)
+
+    def clear_blocks(self):
+        self.blocked_nodes = bytearray(len(self.blocked_nodes))
+        self.blocked_edges = bytearray(len(self.blocked_edges))
+        self._blocked = bytearray(len(self._blocked))
+
+    def vertex_mask(self):
+        """Bản sao cờ chặn theo đỉnh SearchGraph (để chặn thêm tạm thời, không đụng planner)."""
+        return bytearray(self._blocked)
+
+    def path_blocked(self, vertex_path):
+        """True nếu dãy đỉnh SearchGraph đi qua một đỉnh đang bị chặn."""
+        blocked = self._blocked
+        return any(blocked[v] for v in vertex_path)
+
+    # --- TÌM ĐƯỜNG ---
+    @traced("plan.astar")
+    def search(self, s, t):
+        """A* giữa 2 index node -> (chi phí, list index node) hoặc (inf, None)."""
+        if s == t:
+            return (math.inf, None) if self.blocked_nodes[s] else (0.0, [s])
+        cost, path = self.search_vertices(self.graph.start_vertex(s), self.graph.goal_vertex(t))
+        return (cost, None) if path is None else (cost, self.graph.decode(path))
+
+    def search_vertices(self, src, dst, blocked=None, banned=()):
+        """A* giữa 2 đỉnh SearchGraph -> (chi phí, list đỉnh) hoặc (inf, None).
+
+        blocked: cờ chặn theo đỉnh thay cho cờ của planner (xem vertex_mask);
+        banned: các đỉnh không được đi thẳng tới từ src (cung bị cấm, dùng cho Yen).
+        """
+        blocked = self._blocked if blocked is None else blocked
+        if blocked[src] or blocked[dst]:
+            self.last_expanded = 0
+            return math.inf, None
+        indptr, indices, w = self._indptr, self._indices, self._weights
+        xs, ys, inv_v = self._x, self._y, self.inv_v
+        tx, ty = xs[dst], ys[dst]
+
+        g = {src: 0.0}
+        pred = {src: -1}
+        heap = [(math.hypot(xs[src] - tx, ys[src] - ty) * inv_v, 0.0, src)]
+        expanded = 0
+        while heap:
+            _, gu, u = heapq.heappop(heap)
+            if u == dst:
+                self.last_expanded = expanded
+                count("plan.astar_expanded", expanded)
+                path = [dst]
+                while pred[path[-1]] >= 0:
+                    path.append(pred[path[-1]])
+                path.reverse()
+                return gu, path
+            if gu > g[u]: continue  # bản ghi cũ trong heap
+            expanded += 1
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                gv = gu + w[e]
+                # h nhất quán -> đỉnh đã đóng không bao giờ được cải thiện, chỉ cần so g
+                if gv < g.get(v, math.inf) and not blocked[v] and (u != src or v not in banned):
+                    g[v] = gv
+                    pred[v] = u
+                    heapq.heappush(heap, (gv + math.hypot(xs[v] - tx, ys[v] - ty) * inv_v, gv, v))
+        self.last_expanded = expanded
+        count("plan.astar_expanded", expanded)
+        return math.inf, None
+
+    @traced("plan.astar_route")
+    def plan(self, points_list):
+        """Ghép lộ trình qua các waypoint (list id) -> full_path, None nếu bị chặn hết."""
+        ids, full_path = self.track.ids, []
+        for i in range(len(points_list) - 1):
+            start, end = str(points_list[i]), str(points_list[i + 1])
+            _, segment = self.search(self.track.node(start), self.track.node(end))
+            if segment is None:
+                print(f"LỖI: Không tìm thấy đường từ {start} đến {end}!")
+                return None
+            full_path.extend(ids[j] for j in (segment if i == 0 else segment[1:]))
+        return full_path
+
+
+# ================= BENCHMARK: A* + CHẶN ĐỘNG vs NETWORKX =================
+def benchmark(graph_file=GRAPH_FILE, n_queries=500, seed=0):
+    """So sánh độ trễ replan khi chặn 1 cạnh: A* (bật cờ) vs nx.dijkstra_path (xóa đỉnh)."""
+    import time
+    import networkx as nx
+
+    track, graph = load_map(graph_file)
+    planner = AStarPlanner(track, graph)
+    # Cùng đồ thị trạng thái-cạnh, dựng bằng networkx như cách làm cũ
+    G = nx.DiGraph()
+    G.add_nodes_from(range(graph.n_vertices))
+    for u in range(graph.n_vertices):
+        for e in range(graph.indptr[u], graph.indptr[u + 1]):
+            G.add_edge(u, int(graph.indices[e]), weight=float(graph.weights[e]))
+    rng = np.random.default_rng(seed)
+    connected = [i for i in range(track.n_nodes) if track.indptr[i + 1] > track.indptr[i]]
+
+    # Sinh truy vấn: lộ trình gốc, rồi chặn 1 cạnh nằm giữa lộ trình đó
+    queries = []
+    while len(queries) < n_queries:
+        s, t = (int(i) for i in rng.choice(connected, 2, replace=False))
+        _, path = planner.search(s, t)
+        if path is None or len(path) < 3: continue
+        k = int(rng.integers(len(path) - 1))
+        e = track.edge_index(path[k], path[k + 1])
+        if e < 0: continue   # đoạn chuyển làn, không phải cạnh thật
+        queries.append((s, t, e))
+
+    # Cùng code nhưng heuristic = 0 (tức Dijkstra) để đếm số đỉnh phải mở
+    dijkstra = AStarPlanner(track, graph, v_max=math.inf)
+
+    t_astar = []
+    t_nx = []
+    n_astar = n_dijkstra = 0
+    mismatch = 0
+    for s, t, e in queries:
+        t0 = time.perf_counter()
+        planner.set_edge_blocked(e, True)
+        cost, _ = planner.search(s, t)
+        planner.set_edge_blocked(e, False)
+        t_astar.append(time.perf_counter() - t0)
+        n_astar += planner.last_expanded
+
+        dijkstra.set_edge_blocked(e, True)
+        dijkstra.search(s, t)
+        dijkstra.set_edge_blocked(e, False)
+        n_dijkstra += dijkstra.last_expanded
+
+        t0 = time.perf_counter()
+        in_edges = list(G.in_edges(e, data=True))
+        G.remove_node(e)
+        try:
+            ref = nx.dijkstra_path_length(G, graph.start_vertex(s), graph.goal_vertex(t), weight='weight')
+        except nx.NetworkXNoPath:
+            ref = math.inf
+        G.add_edges_from(in_edges)
+        G.add_edges_from((e, int(graph.indices[k]), {'weight': float(graph.weights[k])})
+                         for k in range(graph.indptr[e], graph.indptr[e + 1]))
+        t_nx.append(time.perf_counter() - t0)
+        if not (cost == ref or abs(cost - ref) < 1e-9): mismatch += 1
+
+    print(f"--- REPLAN KHI CHẶN 1 CẠNH ({len(queries)} truy vấn, {track.n_nodes} nodes) ---")
+    for name, ts in (("A* (cờ chặn)", t_astar), ("networkx dijkstra", t_nx)):
+        ts = np.array(ts) * 1e6
+        print(f"{name:<20} | p50 {np.percentile(ts, 50):8.1f} us | p99 {np.percentile(ts, 99):8.1f} us")
+    print(f"-> Số đỉnh mở trung bình: A* {n_astar / len(queries):.1f}, Dijkstra {n_dijkstra / len(queries):.1f}")
+    print(f"-> Chi phí lệch so với networkx: {mismatch} truy vấn")
+
+
+if __name__ == "__main__":
+    benchmark()
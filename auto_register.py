@@ -0,0 +1,214 @@
+### TỰ ĐỘNG CĂN ẢNH NỀN (SAHINH.PNG) THEO TỌA ĐỘ NODE - THAY CHO KÉO SLIDER ###
+#
+# 1. Tách vạch kẻ đường trắng trên nền tối (ngưỡng độ sáng), thu nhỏ ảnh DOWNSAMPLE lần.
+# 2. Biến đổi khoảng cách (distance transform) chính xác, tách theo cột rồi theo hàng.
+# 3. Lấy mẫu dày dọc các cạnh của đồ thị; với một extent thử, mỗi mẫu đọc được khoảng cách
+#    (mét) tới vạch gần nhất. Node nằm giữa làn nên khoảng cách đó phải rơi vào dải
+#    [LANE_MIN, LANE_MAX]; chi phí = trung bình bình phương phần lệch khỏi dải (cắt ở TRUNCATE
+#    để vài đoạn đồ thị không có vạch tương ứng không kéo lệch kết quả).
+# 4. Lưới thô theo tỉ lệ + tịnh tiến (vector hóa, trên 1/COARSE_SUBSAMPLE số mẫu), rồi
+#    Nelder-Mead trên (tâm x, tâm y, rộng, cao) từ N_STARTS ứng viên tốt nhất khác nhau và
+#    từ extent ban đầu -> hội tụ cả khi bắt đầu từ khung bao của node (lệch tỉ lệ vài %).
+# Extent của imshow không biểu diễn được phép quay nên chỉ khớp tỉ lệ + tịnh tiến.
+#
+#   python auto_register.py [file graphml] [file ảnh] [--from-config]
+#   (mặc định bắt đầu từ khung bao của node; --from-config: từ extent trong map_config.json)
+
+import time
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from map_cache import GRAPH_FILE, load_map
+from map_config import CONFIG_FILE, IMG_FILE, load_extent, save_extent
+
+# --- CẤU HÌNH ---
+MARK_THRESHOLD = 0.6       # Độ sáng (0..1) coi là vạch kẻ
+DOWNSAMPLE = 3             # Thu nhỏ ảnh trước khi tính distance transform
+SAMPLE_SPACING = 0.05      # m - khoảng cách lấy mẫu dọc cạnh
+LANE_MIN = 0.10            # m - khoảng cách hợp lệ từ tâm làn tới vạch
+LANE_MAX = 0.22
+TRUNCATE = 0.10            # m - phần lệch tối đa được tính cho mỗi mẫu
+SEARCH_RANGE = 0.4         # m - phạm vi tìm lưới thô quanh extent ban đầu
+SEARCH_STEP = 0.08
+SCALE_RANGE = 0.10         # ± tỉ lệ quanh extent ban đầu
+SCALE_STEP = 0.02
+COARSE_SUBSAMPLE = 4       # lưới thô chỉ dùng 1/4 số điểm mẫu
+N_STARTS = 3               # số điểm xuất phát (khác nhau) cho Nelder-Mead
+
+
+def marking_mask(img, threshold=MARK_THRESHOLD):
+    gray = img[..., :3].mean(axis=2) if img.ndim == 3 else img
+    if gray.dtype == np.uint8:
+        gray = gray / 255.0
+    return gray > threshold
+
+
+def distance_transform(mask):
+    """Khoảng cách Euclid (pixel) từ mỗi ô tới ô True gần nhất - chính xác, tách 2 lượt."""
+    h, w = mask.shape
+    far = h + w
+    rows = np.arange(h)[:, None]
+    # Lượt cột: khoảng cách dọc tới vạch gần nhất phía trên / phía dưới
+    above = np.maximum.accumulate(np.where(mask, rows, -far), axis=0)
+    below = np.minimum.accumulate(np.where(mask, rows, 2 * far)[::-1], axis=0)[::-1]
+    g2 = np.minimum(rows - above, below - rows).astype(np.float64) ** 2
+    # Lượt hàng: d(y, x)^2 = min_x' (x - x')^2 + g(y, x')^2
+    dx2 = (np.arange(w)[:, None] - np.arange(w)[None, :]).astype(np.float64) ** 2
+    d2 = np.empty((h, w))
+    for y in range(h):
+        d2[y] = (dx2 + g2[y][None, :]).min(axis=1)
+    return np.sqrt(d2)
+
+
+def edge_samples(track, spacing=SAMPLE_SPACING):
+    """Các điểm cách đều ~spacing dọc mọi cạnh (M, 2)."""
+    xy = np.asarray(track.xy, dtype=np.float64)
+    a, b = xy[track.edge_src], xy[track.indices]
+    n = np.maximum(1, np.ceil(np.hypot(*(b - a).T) / spacing)).astype(np.int64)
+    seg = np.repeat(np.arange(len(a)), n)
+    t = (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)) / np.repeat(n, n)
+    return a[seg] + t[:, None] * (b - a)[seg]
+
+
+class ExtentFitter:
+    """Chi phí khớp của một (hoặc nhiều) extent ứng viên với các điểm mẫu trên đồ thị."""
+
+    def __init__(self, img, points, downsample=DOWNSAMPLE):
+        mask = marking_mask(img)
+        self.img_h, self.img_w = mask.shape
+        f = downsample
+        h, w = self.img_h // f, self.img_w // f
+        mask = mask[:h * f, :w * f].reshape(h, f, w, f).any(axis=(1, 3))
+        self.dt = distance_transform(mask) * f   # pixel ảnh gốc
+        self.f = f
+        self.points = np.asarray(points, dtype=np.float64)
+
+    def distances(self, extents, points=None):
+        """Khoảng cách (m) tới vạch của từng điểm mẫu, cho K extent -> (K, M)."""
+        points = self.points if points is None else points
+        ext = np.atleast_2d(extents)
+        left, right, bottom, top = (ext[:, i, None] for i in range(4))
+        px = (points[None, :, 0] - left) / (right - left) * self.img_w
+        py = (top - points[None, :, 1]) / (top - bottom) * self.img_h
+        h, w = self.dt.shape
+        gx = np.clip(px / self.f - 0.5, 0, w - 1.001)
+        gy = np.clip(py / self.f - 0.5, 0, h - 1.001)
+        x0, y0 = gx.astype(np.int64), gy.astype(np.int64)
+        fx, fy = gx - x0, gy - y0
+        dt = self.dt
+        v = ((dt[y0, x0] * (1 - fx) + dt[y0, x0 + 1] * fx) * (1 - fy)
+             + (dt[y0 + 1, x0] * (1 - fx) + dt[y0 + 1, x0 + 1] * fx) * fy)
+        return v * (right - left) / self.img_w
+
+    def cost(self, extents, points=None):
+        d = self.distances(extents, points)
+        r = np.maximum(LANE_MIN - d, 0) + np.maximum(d - LANE_MAX, 0)
+        return np.mean(np.minimum(r, TRUNCATE) ** 2, axis=1)
+
+
+def _to_params(extent):
+    l, r, b, t = extent
+    return np.array([(l + r) / 2, (b + t) / 2, r - l, t - b])
+
+def _to_extent(p):
+    cx, cy, sx, sy = p
+    return np.array([cx - sx / 2, cx + sx / 2, cy - sy / 2, cy + sy / 2])
+
+
+def nelder_mead(f, x0, step, iters=200, tol=1e-9):
+    """Nelder-Mead tối giản (không dùng scipy)."""
+    n = len(x0)
+    simplex = np.vstack([x0] + [x0 + np.eye(n)[i] * step[i] for i in range(n)])
+    values = np.array([f(x) for x in simplex])
+    for _ in range(iters):
+        order = np.argsort(values)
+        simplex, values = simplex[order], values[order]
+        if values[-1] - values[0] < tol:
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        xr = centroid + (centroid - simplex[-1])
+        fr = f(xr)
+        if fr < values[0]:
+            xe = centroid + 2 * (centroid - simplex[-1])
+            fe = f(xe)
+            simplex[-1], values[-1] = (xe, fe) if fe < fr else (xr, fr)
+        elif fr < values[-2]:
+            simplex[-1], values[-1] = xr, fr
+        else:
+            xc = centroid + 0.5 * (simplex[-1] - centroid)
+            fc = f(xc)
+            if fc < values[-1]:
+                simplex[-1], values[-1] = xc, fc
+            else:   # co cả simplex về điểm tốt nhất
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                values[1:] = [f(x) for x in simplex[1:]]
+    k = np.argmin(values)
+    return simplex[k], values[k]
+
+
+def register_extent(track, img, initial=None):
+    """Tìm extent [left, right, bottom, top] khớp ảnh với đồ thị. -> (extent, chi phí, ban đầu)."""
+    fitter = ExtentFitter(img, edge_samples(track))
+    if initial is None:
+        # Không có gợi ý: khung bao của node, giữ tỉ lệ khung hình của ảnh
+        xy = np.asarray(track.xy)
+        lo, hi = xy.min(axis=0), xy.max(axis=0)
+        sx = max(hi[0] - lo[0], (hi[1] - lo[1]) * fitter.img_w / fitter.img_h)
+        initial = _to_extent([*(lo + hi) / 2, sx, sx * fitter.img_h / fitter.img_w])
+    initial = np.asarray(initial, dtype=np.float64)
+    cost0 = float(fitter.cost(initial)[0])
+
+    # Lưới thô theo tỉ lệ + tịnh tiến: đánh giá mọi ứng viên trong một lần gọi
+    p0 = _to_params(initial)
+    scales = 1 + np.arange(-SCALE_RANGE, SCALE_RANGE + 1e-9, SCALE_STEP)
+    off = np.arange(-SEARCH_RANGE, SEARCH_RANGE + 1e-9, SEARCH_STEP)
+    k, dx, dy = (g.ravel() for g in np.meshgrid(scales, off, off, indexing='ij'))
+    cands = np.stack([p0[0] + dx, p0[1] + dy, p0[2] * k, p0[3] * k], axis=1)
+    coarse = fitter.cost(np.array([_to_extent(q) for q in cands]), fitter.points[::COARSE_SUBSAMPLE])
+
+    # Các điểm xuất phát tốt nhất, cách nhau ít nhất 1 bước lưới (tránh chạy lại cùng một hõm)
+    starts = []
+    for q in cands[np.argsort(coarse)]:
+        if all(np.abs(q[:2] - r[:2]).max() > SEARCH_STEP or abs(q[2] / r[2] - 1) > SCALE_STEP
+               for r in starts):
+            starts.append(q)
+            if len(starts) == N_STARTS:
+                break
+
+    # Tinh chỉnh tâm + tỉ lệ từ từng điểm xuất phát (và từ extent ban đầu), lấy tốt nhất
+    best, p = np.inf, p0
+    for q in starts + [p0]:
+        step = np.array([SEARCH_STEP / 2, SEARCH_STEP / 2, 0.01 * q[2], 0.01 * q[3]])
+        q, c = nelder_mead(lambda z: fitter.cost(_to_extent(z))[0], q, step)
+        if c < best:
+            best, p = c, q
+    return [round(float(v), 4) for v in _to_extent(p)], float(best), cost0
+
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    from_config = "--from-config" in args
+    if from_config:
+        args.remove("--from-config")
+    graph_file = args[0] if len(args) > 0 else GRAPH_FILE
+    img_file = args[1] if len(args) > 1 else IMG_FILE
+
+    track, _ = load_map(graph_file)
+    img = mpimg.imread(img_file)
+    old = load_extent()
+    t0 = time.perf_counter()
+    extent, cost, cost0 = register_extent(track, img, old if from_config else None)
+    dt = time.perf_counter() - t0
+    old_cost = float(ExtentFitter(img, edge_samples(track)).cost(old)[0])
+
+    print(f"-> Bắt đầu từ {'map_config.json' if from_config else 'khung bao node'} (chi phí {cost0 * 1e4:.2f} cm²)")
+    print(f"-> Extent cũ : {old}  (chi phí {old_cost * 1e4:.2f} cm²)")
+    print(f"-> Extent mới: {extent}  (chi phí {cost * 1e4:.2f} cm²)")
+    print(f"-> Thời gian căn chỉnh: {dt * 1000:.0f} ms")
+    if cost > old_cost:
+        print(f"⚠️ Extent mới khớp kém hơn extent cũ, giữ nguyên {CONFIG_FILE}")
+    else:
+        save_extent(extent)
+        print(f"✅ Đã ghi extent vào {CONFIG_FILE}")
@@ -0,0 +1,137 @@
+### ĐÁNH GIÁ LỘ TRÌNH HÀNG LOẠT TỪ FILE JSONL (OFFLINE, NHIỀU NHÂN) ###
+#
+# Đọc dần file JSONL (mỗi dòng {"request_id": ..., "waypoints": [...]}), chia theo khối cho
+# một pool tiến trình - mỗi tiến trình nạp bảng đường đi + đồ thị MỘT lần - và ghi kết quả
+# ra JSONL theo đúng thứ tự đầu vào ngay khi từng khối xong (không giữ cả file trong bộ nhớ):
+#   {"request_id", "waypoints", "path", "cost" (s, bảng đường đi), "est_time" (s, hồ sơ vận tốc),
+#    "length" (m), "violations": [{"prev", "node", "next", "angle"}]}  hoặc  {"request_id", "error"}
+#
+#   python batch_eval.py <file.jsonl | thư mục> [file ra .jsonl] [số tiến trình]
+
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from map_cache import GRAPH_FILE, load_map
+from route_table import iter_requests, load_route_table
+from steering_safety import MAX_STEERING_ANGLE, scan_triples
+from velocity_profile import route_velocity
+
+# --- CẤU HÌNH ---
+CHUNK_SIZE = 64        # số yêu cầu mỗi lần gửi cho một tiến trình
+MAX_IN_FLIGHT = 4      # số khối đang chờ mỗi tiến trình (giới hạn bộ nhớ khi đọc luồng)
+
+
+class RouteEvaluator:
+    """Đồ thị + bảng đường đi + tập bộ 3 node vượt góc lái, dùng chung cho mọi yêu cầu."""
+
+    def __init__(self, graph_file=GRAPH_FILE):
+        self.track, _ = load_map(graph_file)
+        self.table = load_route_table(graph_file)
+        scan = scan_triples(self.track)
+        bad = np.flatnonzero(scan['angle'] > MAX_STEERING_ANGLE)
+        self.violating = {(int(scan['prev'][i]), int(scan['node'][i]), int(scan['next'][i])):
+                          float(scan['angle'][i]) for i in bad}
+
+    def evaluate(self, req):
+        rid = req.get('request_id')
+        if 'error' in req:    # dòng đầu vào hỏng (xem iter_requests)
+            return {'request_id': rid, 'error': req['error']}
+        waypoints = req.get('waypoints')
+        if not isinstance(waypoints, list) or not waypoints:
+            return {'request_id': rid, 'error': "thiếu 'waypoints'"}
+        waypoints = [str(w) for w in waypoints]
+        nid = self.table.missing(waypoints)
+        if nid is not None:
+            return {'request_id': rid, 'error': f"không có node {nid}"}
+        path = self.table.plan(waypoints, verbose=False)
+        if path is None:
+            return {'request_id': rid, 'error': "không tìm thấy đường"}
+
+        idx = [self.track.node(n) for n in path]
+        ids = self.track.ids
+        violations = []
+        for p, n, s in zip(idx, idx[1:], idx[2:]):
+            angle = self.violating.get((p, n, s))
+            if angle is not None:
+                violations.append({'prev': ids[p], 'node': ids[n], 'next': ids[s],
+                                   'angle': round(angle, 2)})
+        profile = route_velocity(self.track, path) if len(path) > 1 else None
+        return {'request_id': rid, 'waypoints': waypoints, 'path': path,
+                'cost': round(self.table.cost(waypoints), 4),
+                'est_time': round(profile['lap_time'], 4) if profile else 0.0,
+                'length': round(float(profile['s'][-1]), 4) if profile else 0.0,
+                'violations': violations}
+
+
+# ================= POOL TIẾN TRÌNH =================
+_worker = {}
+
+def _init_worker(graph_file):
+    _worker['eval'] = RouteEvaluator(graph_file)
+
+def _eval_chunk(reqs):
+    results = [_worker['eval'].evaluate(r) for r in reqs]
+    return ([json.dumps(r, ensure_ascii=False) for r in results],
+            sum('error' in r for r in results))
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def evaluate_file(request_path, out=sys.stdout, workers=None, graph_file=GRAPH_FILE):
+    """Đánh giá mọi yêu cầu, ghi từng dòng JSONL ra out theo thứ tự đầu vào. -> (số dòng, số lỗi)."""
+    # Biên dịch cache/bảng đường đi ở tiến trình chính trước, để các worker chỉ việc nạp
+    load_route_table(graph_file)
+    workers = workers or os.cpu_count() or 1
+    n = errors = 0
+
+    def emit(result):
+        nonlocal n, errors
+        lines, n_err = result
+        out.write("".join(line + "\n" for line in lines))
+        n += len(lines)
+        errors += n_err
+
+    chunks = _chunks(iter_requests(request_path), CHUNK_SIZE)
+
+    if workers == 1:
+        _init_worker(graph_file)
+        for chunk in chunks:
+            emit(_eval_chunk(chunk))
+        return n, errors
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(graph_file,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_eval_chunk, chunk))
+            if len(pending) >= workers * MAX_IN_FLIGHT:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return n, errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Cách dùng: python batch_eval.py <file.jsonl | thư mục> [file ra .jsonl] [số tiến trình]")
+        sys.exit(1)
+    out_file = sys.argv[2] if len(sys.argv) > 2 else None
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    t0 = time.perf_counter()
+    if out_file:
+        with open(out_file, "w", encoding="utf-8") as f:
+            n, errors = evaluate_file(sys.argv[1], f, workers)
+    else:
+        n, errors = evaluate_file(sys.argv[1], sys.stdout, workers)
+    print(f"✅ Đã đánh giá {n} lộ trình ({errors} lỗi) trong {time.perf_counter() - t0:.2f}s",
+          file=sys.stderr)
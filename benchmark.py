@@ -0,0 +1,196 @@
+### BỘ ĐO HIỆU NĂNG TÁI LẬP ĐƯỢC: ĐỌC MAP, TÍNH TRỌNG SỐ, TÌM ĐƯỜNG, QUÉT ĐỘ CONG ###
+#
+# Sinh đường đua tổng hợp bằng cách lát nhiều bản sao của map thi đấu thành lưới (nối các
+# bản sao cạnh nhau bằng đường 2 chiều giữa node biên trái/phải và trên/dưới của thành phần
+# liên thông mạnh chính -> cả map vẫn đi tới được mọi bản sao), từ ~200 tới ~200k node.
+# Với mỗi cỡ, đo (lấy min + trung vị của REPEAT lần):
+#   parse        load_track: đọc GraphML
+#   weights      build_search_graph: trọng số chuyển tiếp + chuyển làn
+#   route_single A* giữa 2 node ngẫu nhiên (thời gian / truy vấn)
+#   route_multi  A* qua WAYPOINTS waypoint ngẫu nhiên (thời gian / lộ trình)
+#   curvature    scan_triples: bán kính + góc lái mọi bộ 3 node
+#   ch_build     (--ch) co đồ thị thành contraction hierarchy - đo 1 lần vì chậm
+#   route_ch     (--ch) cùng các truy vấn route_single nhưng trên hierarchy
+# Kết quả ghi ra JSON kèm thông tin máy + commit; --compare in tỉ lệ so với một lần chạy cũ
+# (chỉ có ý nghĩa khi cùng máy). Hạt giống ngẫu nhiên cố định -> cùng truy vấn mỗi lần chạy.
+#
+#   python benchmark.py [--sizes 200,2000,20000,200000] [--repeat 3] [--out file.json]
+#                       [--compare file_cũ.json] [--ch]
+
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from astar_planner import AStarPlanner
+from contraction_hierarchy import CHPlanner, contract
+from edge_weights import build_search_graph
+from extract_nodes import write_track
+from map_cache import GRAPH_FILE
+from steering_safety import scan_triples
+from track_graph import TrackGraph, build_csr, load_track
+from validate_graph import strongly_connected_components
+
+# --- CẤU HÌNH ---
+SIZES = (200, 2000, 20000, 200000)   # số node mục tiêu của map tổng hợp
+REPEAT = 3
+N_QUERIES = 20                       # số truy vấn route_single mỗi lần đo
+N_ROUTES = 5                         # số lộ trình route_multi mỗi lần đo
+WAYPOINTS = 5                        # số waypoint mỗi lộ trình
+TILE_GAP = 1.0                       # m - khoảng trống giữa các bản sao
+SEED = 0
+OUT_FILE = "benchmark_results.json"
+
+
+# ================= MAP TỔNG HỢP =================
+def synthetic_track(base, n_target):
+    """Lát round(n_target / số node) bản sao của base thành lưới gần vuông -> TrackGraph."""
+    label, _ = strongly_connected_components(base.n_nodes, base.indptr, base.indices)
+    main = np.bincount(label).argmax()
+    core = np.flatnonzero(label == main)
+    xy = np.asarray(base.xy, dtype=np.float64)
+    # Chỉ lấy các node có cạnh (bỏ mốc ORIGIN / REF_X)
+    used = np.flatnonzero((np.diff(base.indptr) > 0) | (np.bincount(base.indices, minlength=base.n_nodes) > 0))
+    remap = np.full(base.n_nodes, -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    n = len(used)
+    copies = max(1, round(n_target / n))
+    cols = math.ceil(math.sqrt(copies))
+    span = xy[used].max(axis=0) - xy[used].min(axis=0) + TILE_GAP
+    left, right = core[np.argmin(xy[core, 0])], core[np.argmax(xy[core, 0])]
+    bottom, top = core[np.argmin(xy[core, 1])], core[np.argmax(xy[core, 1])]
+
+    c = np.arange(copies)
+    offset = np.stack([c % cols, c // cols], axis=1) * span
+    all_xy = (xy[used][None, :, :] + offset[:, None, :]).reshape(-1, 2)
+    ids = [f"{k}:{base.ids[i]}" for k in range(copies) for i in used]
+    src = (remap[base.edge_src][None, :] + n * c[:, None]).ravel()
+    dst = (remap[base.indices][None, :] + n * c[:, None]).ravel()
+    dotted = np.tile(np.asarray(base.dotted, dtype=bool), copies)
+
+    # Đường nối 2 chiều giữa các bản sao kề nhau
+    a_h = c[(c % cols < cols - 1) & (c + 1 < copies)]
+    a_v = c[c + cols < copies]
+    a = np.concatenate([a_h * n + remap[right], a_v * n + remap[top]])
+    b = np.concatenate([(a_h + 1) * n + remap[left], (a_v + cols) * n + remap[bottom]])
+    src = np.concatenate([src, a, b])
+    dst = np.concatenate([dst, b, a])
+    dotted = np.concatenate([dotted, np.zeros(2 * len(a), dtype=bool)])
+    indptr, indices, dotted = build_csr(len(ids), src, dst, dotted)
+    return TrackGraph(ids, all_xy, indptr, indices, dotted)
+
+
+# ================= ĐO =================
+def _timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return times, result
+
+
+def _record(results, size, track, stage, times, per=1):
+    t = np.array(times) / per
+    row = {'nodes': track.n_nodes, 'edges': track.n_edges, 'target': size, 'stage': stage,
+           'min_s': round(float(t.min()), 6), 'median_s': round(float(np.median(t)), 6),
+           'repeat': len(times), 'per': per}
+    results.append(row)
+    print(f"{track.n_nodes:>8} nodes | {stage:<13} | min {row['min_s'] * 1000:10.3f} ms"
+          f" | median {row['median_s'] * 1000:10.3f} ms")
+
+
+def bench_size(base, size, repeat, workdir, ch=False):
+    results = []
+    track = synthetic_track(base, size)
+    graph_file = os.path.join(workdir, f"synthetic_{size}.graphml")
+    write_track(track, graph_file)
+
+    times, track = _timed(lambda: load_track(graph_file), repeat)
+    _record(results, size, track, 'parse', times)
+    times, graph = _timed(lambda: build_search_graph(track), repeat)
+    _record(results, size, track, 'weights', times)
+
+    # Truy vấn cố định theo hạt giống, chỉ trên thành phần liên thông mạnh chính
+    label, _ = strongly_connected_components(track.n_nodes, track.indptr, track.indices)
+    core = np.flatnonzero(label == np.bincount(label).argmax())
+    rng = np.random.default_rng(SEED)
+    pairs = rng.choice(core, (N_QUERIES, 2))
+    routes = [[track.ids[i] for i in rng.choice(core, WAYPOINTS)] for _ in range(N_ROUTES)]
+    planner = AStarPlanner(track, graph)
+
+    times, _ = _timed(lambda: [planner.search(int(s), int(t)) for s, t in pairs], repeat)
+    _record(results, size, track, 'route_single', times, per=N_QUERIES)
+    times, paths = _timed(lambda: [planner.plan(r) for r in routes], repeat)
+    if any(p is None for p in paths):
+        print("⚠️ Có lộ trình không tìm được đường - kết quả route_multi không đầy đủ")
+    _record(results, size, track, 'route_multi', times, per=N_ROUTES)
+
+    times, _ = _timed(lambda: scan_triples(track), repeat)
+    _record(results, size, track, 'curvature', times)
+
+    if ch:
+        times, arrays = _timed(lambda: contract(graph), 1)
+        _record(results, size, track, 'ch_build', times)
+        ch_planner = CHPlanner(track, graph, arrays)
+        times, _ = _timed(lambda: [ch_planner.search(int(s), int(t)) for s, t in pairs], repeat)
+        _record(results, size, track, 'route_ch', times, per=N_QUERIES)
+    return results
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'machine': platform.machine(),
+            'cpu_count': os.cpu_count()}
+
+
+def run_benchmarks(sizes=SIZES, repeat=REPEAT, graph_file=GRAPH_FILE, ch=False):
+    base = load_track(graph_file)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            results += bench_size(base, size, repeat, workdir, ch)
+    return {'meta': {**machine_info(), 'base_map': graph_file, 'repeat': repeat, 'seed': SEED},
+            'results': results}
+
+
+def compare(new, old):
+    """In tỉ lệ median mới / cũ cho từng (số node, bước) có ở cả hai lần chạy."""
+    ref = {(r['nodes'], r['stage']): r for r in old['results']}
+    print(f"--- SO SÁNH VỚI {old['meta'].get('commit')} ({old['meta'].get('time')}) ---")
+    for r in new['results']:
+        o = ref.get((r['nodes'], r['stage']))
+        if o and o['median_s'] > 0:
+            ratio = r['median_s'] / o['median_s']
+            flag = "❌" if ratio > 1.1 else ("✅" if ratio < 0.9 else "  ")
+            print(f"{flag} {r['nodes']:>8} nodes | {r['stage']:<13} | x{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+
+    def opt(flag, default):
+        return args[args.index(flag) + 1] if flag in args else default
+
+    sizes = [int(s) for s in opt("--sizes", ",".join(map(str, SIZES))).split(",")]
+    report = run_benchmarks(sizes, int(opt("--repeat", REPEAT)), ch="--ch" in args)
+    out_file = opt("--out", OUT_FILE)
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Đã ghi kết quả vào {out_file}")
+    if "--compare" in args:
+        with open(opt("--compare", None), encoding="utf-8") as f:
+            compare(report, json.load(f))
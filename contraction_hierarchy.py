@@ -0,0 +1,351 @@
+### CONTRACTION HIERARCHY TRÊN SEARCHGRAPH - TRUY VẤN ĐIỂM-ĐIỂM NHANH CHO MAP LỚN ###
+#
+# Bảng all-pairs (route_table.py) tốn N x V bộ nhớ -> chỉ hợp với map thi đấu nhỏ. Với map
+# lớn (hàng trăm nghìn node vẽ bằng yEd + extract_nodes.py) thì tiền xử lý một lần:
+#   1. Lần lượt "co" từng đỉnh của SearchGraph (trọng số thời gian có xét độ cong, đúng đồ
+#      thị mà A*/route_table dùng) theo thứ tự ưu tiên = EDGE_DIFF_WEIGHT x (số đường tắt phải
+#      thêm - số cung bị bỏ) + số láng giềng đã co (cập nhật lười). Co đỉnh v: với mỗi
+#      u -> v -> x, nếu tìm kiếm chứng nhân (witness, Dijkstra giới hạn WITNESS_SETTLE_LIMIT
+#      đỉnh, bỏ qua v) không thấy đường u -> x nào rẻ hơn hoặc bằng thì thêm đường tắt u -> x
+#      (ghi nhớ đỉnh giữa v).
+#   2. Mọi cung còn lại lúc co đều nối tới đỉnh bậc cao hơn -> tách làm 2 CSR: "lên" (u -> x,
+#      bậc x > bậc u) và "xuống" lưu ngược (tại x giữ u khi u -> x, bậc u > bậc x).
+# Truy vấn: Dijkstra 2 chiều, chiều xuôi chỉ đi lên từ cổng xuất phát S_s, chiều ngược chỉ đi
+# lên (trên CSR xuống lưu ngược) từ cổng đích T_t; mỗi chiều dừng khi khóa nhỏ nhất >= chi phí
+# tốt nhất đã gặp. Đường tắt được mở lại đệ quy theo đỉnh giữa -> dãy đỉnh SearchGraph gốc
+# -> decode như A*. Chi phí đúng bằng Dijkstra (đường đi trùng khi không có 2 đường bằng nhau).
+# Lưu vào file .ch cạnh GraphML (bố cục .trackbin, mmap), tự build lại khi GraphML hoặc mô
+# hình trọng số đổi. Không hỗ trợ chặn đường động - khi có vật cản dùng AStarPlanner.
+#
+#   python contraction_hierarchy.py [file graphml] [số truy vấn kiểm tra]
+
+import heapq
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from edge_weights import weight_model
+from instrument import traced
+from map_cache import GRAPH_FILE, file_sha256, load_map, map_arrays, write_arrays
+from track_graph import build_csr
+
+# --- CẤU HÌNH ---
+CH_EXT = ".ch"
+MAGIC = b"TRKCH\x00\x00\x00"
+CH_VERSION = 2
+WITNESS_SETTLE_LIMIT = 60     # số đỉnh tối đa mỗi lần tìm witness (ít hơn -> thêm đường tắt thừa)
+EDGE_DIFF_WEIGHT = 2          # hệ số của (số đường tắt - số cung bị bỏ) trong thứ tự co
+
+
+# ================= TIỀN XỬ LÝ =================
+def _witness(out_adj, src, skip, max_cost, targets, limit):
+    """Dijkstra giới hạn từ src, không đi qua skip -> dict khoảng cách tạm thời."""
+    dist = {src: 0.0}
+    heap = [(0.0, src)]
+    remaining = len(targets)
+    settled = 0
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]: continue
+        if d > max_cost: break
+        if u in targets:
+            remaining -= 1
+            if remaining == 0: break
+        settled += 1
+        if settled > limit: break
+        for x, wx in out_adj[u].items():
+            if x == skip: continue
+            nd = d + wx
+            if nd < dist.get(x, math.inf):
+                dist[x] = nd
+                heapq.heappush(heap, (nd, x))
+    return dist
+
+
+def _shortcuts(out_adj, in_adj, v, limit):
+    """Các đường tắt (u, x, trọng số) cần thêm nếu co v."""
+    outs = out_adj[v]
+    if not outs:
+        return []
+    max_out = max(outs.values())
+    result = []
+    for u, wu in in_adj[v].items():
+        targets = {x for x in outs if x != u}
+        if not targets: continue
+        dist = _witness(out_adj, u, v, wu + max_out, targets, limit)
+        for x in targets:
+            need = wu + outs[x]
+            if dist.get(x, math.inf) > need:
+                result.append((u, x, need))
+    return result
+
+
+@traced("weight.contraction")
+def contract(graph, limit=WITNESS_SETTLE_LIMIT, verbose=False):
+    """Co toàn bộ SearchGraph -> dict mảng: rank, up_* (CSR lên), down_* (CSR xuống lưu ngược).
+
+    up_mid / down_mid: đỉnh giữa của đường tắt, -1 nếu là cung gốc.
+    """
+    V = graph.n_vertices
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+    weights = np.asarray(graph.weights, dtype=np.float64).tolist()
+    out_adj = [{} for _ in range(V)]
+    in_adj = [{} for _ in range(V)]
+    for u in range(V):
+        for e in range(indptr[u], indptr[u + 1]):
+            x = indices[e]
+            if x == u: continue   # cung tự vòng không bao giờ nằm trên đường ngắn nhất
+            if weights[e] < out_adj[u].get(x, math.inf):
+                out_adj[u][x] = weights[e]
+                in_adj[x][u] = weights[e]
+    mid = {}
+    deleted = [0] * V
+    contracted = bytearray(V)
+
+    def priority(v):
+        diff = len(_shortcuts(out_adj, in_adj, v, limit)) - len(in_adj[v]) - len(out_adj[v])
+        return EDGE_DIFF_WEIGHT * diff + deleted[v]
+
+    prio = [priority(v) for v in range(V)]
+    heap = [(p, v) for v, p in enumerate(prio)]
+    heapq.heapify(heap)
+    rank = np.empty(V, dtype=np.int32)
+    up_src, up_dst, up_w, up_mid = [], [], [], []
+    dn_src, dn_dst, dn_w, dn_mid = [], [], [], []
+    level = 0
+    t0 = time.perf_counter()
+    while heap:
+        p, v = heapq.heappop(heap)
+        if contracted[v] or p != prio[v]: continue
+        # Cập nhật lười: tính lại, nếu không còn nhỏ nhất thì đẩy lại vào heap
+        p = priority(v)
+        if heap and p > heap[0][0]:
+            prio[v] = p
+            heapq.heappush(heap, (p, v))
+            continue
+        for u, x, w in _shortcuts(out_adj, in_adj, v, limit):
+            if w < out_adj[u].get(x, math.inf):
+                out_adj[u][x] = w
+                in_adj[x][u] = w
+                mid[u, x] = v
+        # Cung còn lại đều tới đỉnh chưa co (bậc cao hơn v)
+        for x, w in out_adj[v].items():
+            up_src.append(v); up_dst.append(x); up_w.append(w); up_mid.append(mid.get((v, x), -1))
+            del in_adj[x][v]
+        for u, w in in_adj[v].items():
+            dn_src.append(v); dn_dst.append(u); dn_w.append(w); dn_mid.append(mid.get((u, v), -1))
+            del out_adj[u][v]
+        neighbours = set(out_adj[v]) | set(in_adj[v])
+        out_adj[v], in_adj[v] = {}, {}
+        contracted[v] = 1
+        rank[v] = level
+        level += 1
+        for n in neighbours:
+            deleted[n] += 1
+            prio[n] = priority(n)
+            heapq.heappush(heap, (prio[n], n))
+        if verbose and level % 50000 == 0:
+            print(f"   ... đã co {level}/{V} đỉnh ({time.perf_counter() - t0:.1f}s)")
+
+    up_indptr, up_indices, up_order = build_csr(V, np.array(up_src, dtype=np.int64),
+                                                np.array(up_dst, dtype=np.int64),
+                                                np.arange(len(up_src)))
+    dn_indptr, dn_indices, dn_order = build_csr(V, np.array(dn_src, dtype=np.int64),
+                                                np.array(dn_dst, dtype=np.int64),
+                                                np.arange(len(dn_src)))
+    return {
+        'rank': rank,
+        'up_indptr': up_indptr.astype('<i4'), 'up_indices': up_indices.astype('<i4'),
+        'up_weights': np.array(up_w, dtype='<f8')[up_order],
+        'up_mid': np.array(up_mid, dtype='<i4')[up_order],
+        'down_indptr': dn_indptr.astype('<i4'), 'down_indices': dn_indices.astype('<i4'),
+        'down_weights': np.array(dn_w, dtype='<f8')[dn_order],
+        'down_mid': np.array(dn_mid, dtype='<i4')[dn_order],
+    }
+
+
+# ================= TRUY VẤN =================
+class CHPlanner:
+    """Truy vấn 2 chiều trên hierarchy; cùng giao diện search / plan với AStarPlanner."""
+
+    def __init__(self, track, graph, arrays):
+        self.track = track
+        self.graph = graph
+        self.n_shortcuts = int((np.asarray(arrays['up_mid']) >= 0).sum()
+                               + (np.asarray(arrays['down_mid']) >= 0).sum())
+        # Bản list Python: truy cập trong vòng lặp nhanh hơn mảng numpy
+        self._rank = arrays['rank'].tolist()
+        self._up = (arrays['up_indptr'].tolist(), arrays['up_indices'].tolist(),
+                    arrays['up_weights'].tolist(), arrays['up_mid'].tolist())
+        self._down = (arrays['down_indptr'].tolist(), arrays['down_indices'].tolist(),
+                      arrays['down_weights'].tolist(), arrays['down_mid'].tolist())
+        self.last_settled = 0   # số đỉnh đã mở (cả 2 chiều) ở lần search gần nhất
+
+    def _mid(self, a, b):
+        """Đỉnh giữa của cung a -> b trong hierarchy (-1 nếu là cung gốc)."""
+        if self._rank[b] > self._rank[a]:
+            indptr, indices, _, mid = self._up
+            row = a
+            other = b
+        else:
+            indptr, indices, _, mid = self._down
+            row = b
+            other = a
+        for k in range(indptr[row], indptr[row + 1]):
+            if indices[k] == other:
+                return mid[k]
+        raise KeyError(f"Không có cung {a} -> {b} trong hierarchy")
+
+    def _unpack(self, vertices):
+        """Mở mọi đường tắt trong dãy đỉnh hierarchy -> dãy đỉnh SearchGraph gốc."""
+        path = [vertices[0]]
+        for a, b in zip(vertices, vertices[1:]):
+            stack = [(a, b)]
+            while stack:
+                a, b = stack.pop()
+                m = self._mid(a, b)
+                if m < 0:
+                    path.append(b)
+                else:
+                    stack.append((m, b))
+                    stack.append((a, m))
+        return path
+
+    @traced("plan.ch")
+    def search(self, s, t):
+        """Truy vấn giữa 2 index node -> (chi phí, list index node) hoặc (inf, None)."""
+        if s == t:
+            return 0.0, [s]
+        src, dst = self.graph.start_vertex(s), self.graph.goal_vertex(t)
+        dist = ({src: 0.0}, {dst: 0.0})
+        pred = ({src: -1}, {dst: -1})
+        heaps = ([(0.0, src)], [(0.0, dst)])
+        csr = (self._up, self._down)
+        best, meet = math.inf, -1
+        settled = 0
+        side = 0
+        while (heaps[0] and heaps[0][0][0] < best) or (heaps[1] and heaps[1][0][0] < best):
+            # Xen kẽ 2 chiều; chiều nào đã hết việc thì chỉ chạy chiều kia
+            if not (heaps[side] and heaps[side][0][0] < best):
+                side ^= 1
+            heap, d_own, d_other, p_own = heaps[side], dist[side], dist[side ^ 1], pred[side]
+            indptr, indices, w, _ = csr[side]
+            d, u = heapq.heappop(heap)
+            side ^= 1
+            if d > d_own[u]: continue
+            settled += 1
+            for k in range(indptr[u], indptr[u + 1]):
+                x = indices[k]
+                nd = d + w[k]
+                if nd < d_own.get(x, math.inf):
+                    d_own[x] = nd
+                    p_own[x] = u
+                    heapq.heappush(heap, (nd, x))
+                    other = d_other.get(x)
+                    if other is not None and nd + other < best:
+                        best, meet = nd + other, x
+            other = d_other.get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+        self.last_settled = settled
+        if meet < 0:
+            return math.inf, None
+        chain = [meet]
+        while pred[0][chain[-1]] >= 0:
+            chain.append(pred[0][chain[-1]])
+        chain.reverse()
+        v = meet
+        while pred[1][v] >= 0:
+            v = pred[1][v]
+            chain.append(v)
+        return best, self.graph.decode(self._unpack(chain))
+
+    def plan(self, points_list):
+        """Ghép lộ trình qua các waypoint (list id) -> full_path, None nếu không có đường."""
+        ids, full_path = self.track.ids, []
+        for i in range(len(points_list) - 1):
+            start, end = str(points_list[i]), str(points_list[i + 1])
+            _, segment = self.search(self.track.node(start), self.track.node(end))
+            if segment is None:
+                print(f"LỖI: Không tìm thấy đường từ {start} đến {end}!")
+                return None
+            full_path.extend(ids[j] for j in (segment if i == 0 else segment[1:]))
+        return full_path
+
+
+# ================= LƯU / NẠP =================
+def default_ch_path(graph_file):
+    return os.path.splitext(graph_file)[0] + CH_EXT
+
+
+def save_ch(graph_file=GRAPH_FILE, ch_file=None, verbose=False):
+    """Chế độ offline: co đồ thị và lưu cùng hash GraphML + mô hình trọng số."""
+    ch_file = ch_file or default_ch_path(graph_file)
+    _, graph = load_map(graph_file)
+    arrays = contract(graph, verbose=verbose)
+    header = {'source_sha256': file_sha256(graph_file), 'weight_model': weight_model(),
+              'witness_settle_limit': WITNESS_SETTLE_LIMIT}
+    return write_arrays(ch_file, header, arrays, MAGIC, CH_VERSION)
+
+
+def is_fresh(graph_file, ch_file):
+    if not os.path.exists(ch_file):
+        return False
+    try:
+        header, _ = map_arrays(ch_file, MAGIC, CH_VERSION)
+    except (OSError, ValueError):
+        return False
+    return header['source_sha256'] == file_sha256(graph_file) and header['weight_model'] == weight_model()
+
+
+def load_ch(graph_file=GRAPH_FILE, ch_file=None):
+    """Nạp hierarchy (tự build lại nếu cũ) -> CHPlanner."""
+    ch_file = ch_file or default_ch_path(graph_file)
+    if not is_fresh(graph_file, ch_file):
+        print(f"-> Hierarchy {ch_file} cũ hoặc chưa có, đang co lại đồ thị...")
+        save_ch(graph_file, ch_file, verbose=True)
+    track, graph = load_map(graph_file)
+    _, arrays = map_arrays(ch_file, MAGIC, CH_VERSION)
+    return CHPlanner(track, graph, arrays)
+
+
+if __name__ == "__main__":
+    from astar_planner import AStarPlanner
+
+    graph_file = sys.argv[1] if len(sys.argv) > 1 else GRAPH_FILE
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    t0 = time.perf_counter()
+    out = save_ch(graph_file, verbose=True)
+    dt = time.perf_counter() - t0
+    planner = load_ch(graph_file)
+    track, graph = planner.track, planner.graph
+    print(f"✅ Đã co {graph.n_vertices} đỉnh -> {out} ({os.path.getsize(out)} bytes, "
+          f"{planner.n_shortcuts} đường tắt) trong {dt:.2f}s")
+
+    # Kiểm tra với Dijkstra (A* với heuristic = 0) trên các cặp ngẫu nhiên
+    dijkstra = AStarPlanner(track, graph, v_max=math.inf)
+    rng = np.random.default_rng(0)
+    connected = np.flatnonzero(np.diff(track.indptr) > 0)
+    t_ch, t_dij, mismatch, diff_path = [], [], 0, 0
+    for s, t in rng.choice(connected, (n_queries, 2)):
+        s, t = int(s), int(t)
+        t1 = time.perf_counter()
+        cost, path = planner.search(s, t)
+        t_ch.append(time.perf_counter() - t1)
+        t1 = time.perf_counter()
+        ref, ref_path = dijkstra.search(s, t)
+        t_dij.append(time.perf_counter() - t1)
+        if not (cost == ref or abs(cost - ref) < 1e-9):
+            mismatch += 1
+        elif path != ref_path:
+            diff_path += 1
+    print(f"--- {n_queries} TRUY VẤN NGẪU NHIÊN ({track.n_nodes} nodes) ---")
+    for name, ts in (("Contraction hierarchy", t_ch), ("Dijkstra", t_dij)):
+        ts = np.array(ts) * 1e6
+        print(f"{name:<22} | p50 {np.percentile(ts, 50):10.1f} us | p99 {np.percentile(ts, 99):10.1f} us")
+    print(f"-> Chi phí lệch so với Dijkstra: {mismatch} truy vấn, "
+          f"cùng chi phí nhưng khác đường: {diff_path}")
@@ -0,0 +1,269 @@
+### BẢN ĐỒ CHI PHÍ DẠNG LƯỚI TỪ ẢNH SAHINH.PNG - TRA CỨU HÀNG LOẠT O(1) MỖI ĐIỂM ###
+#
+# Ảnh nền (căn bằng extent trong map_config.json - SANDBOX.py / auto_register.py) là nguồn
+# "sự thật" duy nhất về mặt đường. Ở đây đổi nó thành lưới theo mét, mỗi ô = 1 pixel ảnh
+# (hàng 0 là đáy, y nhỏ nhất), 3 lớp:
+#   flags   uint8    bit DRIVABLE: xe được phép ở đây | bit MARKING: vạch kẻ trắng
+#   offset  float16  khoảng cách CÓ DẤU (m) tới tâm làn gần nhất (cạnh đồ thị), dương = bên trái
+#                    theo chiều đi của làn; NaN nếu xa tâm làn hơn MAX_LANE_DIST
+#   yaw     float16  hướng đi (rad) của làn gần nhất, NaN như trên
+# Mặt đường trong ảnh CAD chỉ là vùng tối nằm giữa 2 vạch biên, cùng màu với bên ngoài, nên
+# vùng lái được = loang (flood fill) từ các điểm mẫu dọc tâm làn qua pixel không phải vạch,
+# giới hạn trong MAX_LANE_DIST quanh tâm làn (chặn rò ra ngoài ở chỗ vạch biên bị hở); vạch
+# sát vùng đó (vạch chia làn, vạch biên) cũng tính là lái được.
+# Lưu vào file .costmap cạnh GraphML (cùng bố cục với .trackbin, mmap chỉ đọc), tự build lại
+# khi GraphML, ảnh hoặc extent đổi. Tra cứu chỉ là phép chia + 1 lần lấy phần tử mảng.
+#
+#   python costmap.py [file graphml] [file ảnh]
+
+import os
+import sys
+import time
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from auto_register import MARK_THRESHOLD, edge_samples, marking_mask
+from instrument import traced
+from map_cache import GRAPH_FILE, file_sha256, load_map, map_arrays, write_arrays
+from map_config import CONFIG_FILE, IMG_FILE, load_extent
+from spatial_index import GridIndex
+
+# --- CẤU HÌNH ---
+COSTMAP_EXT = ".costmap"
+MAGIC = b"TRKCOST\x00"
+COSTMAP_VERSION = 1
+DRIVABLE = 1              # bit trong flags
+MARKING = 2
+MAX_LANE_DIST = 0.25      # m - xa tâm làn hơn thì không bao giờ là mặt đường (làn rộng ~0.4 m)
+MARK_REACH = 0.04         # m - vạch cách vùng loang không quá khoảng này tính là lái được
+MAX_FILL_ITERS = 500      # số bước loang tối đa (mỗi bước 1 pixel)
+CHUNK = 1 << 16           # số ô mỗi lần tra cạnh gần nhất khi build
+
+
+def default_costmap_path(graph_file):
+    return os.path.splitext(graph_file)[0] + COSTMAP_EXT
+
+
+def costmap_params():
+    """Mọi thứ ảnh hưởng tới nội dung lớp -> đổi là phải build lại."""
+    return {'version': COSTMAP_VERSION, 'mark_threshold': MARK_THRESHOLD,
+            'max_lane_dist': MAX_LANE_DIST, 'mark_reach': MARK_REACH}
+
+
+# ================= BUILD =================
+def _dilate(mask, ry, rx):
+    """Giãn mask theo ô chữ nhật (2ry+1) x (2rx+1) - tổng tích lũy, không vòng lặp pixel."""
+    for axis, r in ((0, ry), (1, rx)):
+        if r <= 0:
+            continue
+        c = np.cumsum(mask, axis=axis, dtype=np.int32)
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (r + 1, r)
+        c = np.pad(c, pad, mode='edge')
+        c = np.moveaxis(c, axis, 0)
+        c[:r + 1] = 0
+        n = mask.shape[axis]
+        mask = np.moveaxis(c[2 * r + 1:2 * r + 1 + n] - c[:n] > 0, 0, axis)
+    return mask
+
+
+def _flood(seed, free, max_iters=MAX_FILL_ITERS):
+    """Loang 4 hướng từ seed qua các ô free, tới khi không lan thêm được."""
+    fill = seed & free
+    for _ in range(max_iters):
+        grown = fill.copy()
+        grown[1:] |= fill[:-1]
+        grown[:-1] |= fill[1:]
+        grown[:, 1:] |= fill[:, :-1]
+        grown[:, :-1] |= fill[:, 1:]
+        grown &= free
+        if np.array_equal(grown, fill):
+            break
+        fill = grown
+    return fill
+
+
+@traced("load.compile_costmap")
+def build_layers(track, img, extent):
+    """Ảnh + extent + đồ thị -> dict 'flags', 'offset', 'yaw' (hàng 0 = đáy) + 'res'."""
+    left, right, bottom, top = extent
+    h, w = img.shape[:2]
+    res_x, res_y = (right - left) / w, (top - bottom) / h
+    marking = marking_mask(img)[::-1]
+
+    # Ô chứa điểm mẫu dọc tâm làn (cạnh đồ thị) = hạt giống loang
+    pts = edge_samples(track, min(res_x, res_y))
+    c = np.floor((pts[:, 0] - left) / res_x).astype(np.int64)
+    r = np.floor((pts[:, 1] - bottom) / res_y).astype(np.int64)
+    ok = (c >= 0) & (c < w) & (r >= 0) & (r < h)
+    seed = np.zeros((h, w), dtype=bool)
+    seed[r[ok], c[ok]] = True
+    near = _dilate(seed, int(np.ceil(MAX_LANE_DIST / res_y)), int(np.ceil(MAX_LANE_DIST / res_x)))
+
+    fill = _flood(seed, near & ~marking)
+    reach = _dilate(fill, int(np.ceil(MARK_REACH / res_y)), int(np.ceil(MARK_REACH / res_x)))
+    drivable = fill | (marking & near & reach)
+
+    # Khoảng cách có dấu + hướng làn cho mọi ô gần tâm làn
+    xy = np.asarray(track.xy, dtype=np.float64)
+    index = GridIndex(track)
+    offset = np.full((h, w), np.nan, dtype=np.float32)
+    yaw = np.full((h, w), np.nan, dtype=np.float32)
+    rows, cols = np.nonzero(near)
+    for k in range(0, len(rows), CHUNK):
+        rr, cc = rows[k:k + CHUNK], cols[k:k + CHUNK]
+        p = np.stack([left + (cc + 0.5) * res_x, bottom + (rr + 0.5) * res_y], axis=1)
+        hit = index.nearest_edge(p)
+        e = hit['edge']
+        a = xy[track.edge_src[e]]
+        ab = xy[track.indices[e]] - a
+        cross = ab[:, 0] * (p[:, 1] - a[:, 1]) - ab[:, 1] * (p[:, 0] - a[:, 0])
+        d = np.where(cross < 0, -hit['dist'], hit['dist'])
+        keep = hit['dist'] <= MAX_LANE_DIST
+        offset[rr[keep], cc[keep]] = d[keep]
+        yaw[rr[keep], cc[keep]] = np.arctan2(ab[keep, 1], ab[keep, 0])
+
+    flags = drivable.astype(np.uint8) * DRIVABLE | marking.astype(np.uint8) * MARKING
+    return {'flags': flags, 'offset': offset.astype(np.float16), 'yaw': yaw.astype(np.float16),
+            'res': (res_x, res_y)}
+
+
+def compile_costmap(graph_file=GRAPH_FILE, img_file=IMG_FILE, extent=None, out_file=None):
+    out_file = out_file or default_costmap_path(graph_file)
+    extent = [float(v) for v in (extent if extent is not None else load_extent())]
+    track, _ = load_map(graph_file)
+    layers = build_layers(track, mpimg.imread(img_file), extent)
+    header = {
+        'graph_sha256': file_sha256(graph_file),
+        'image_sha256': file_sha256(img_file),
+        'extent': extent,
+        'params': costmap_params(),
+    }
+    return write_arrays(out_file, header, {k: layers[k] for k in ('flags', 'offset', 'yaw')},
+                        MAGIC, COSTMAP_VERSION)
+
+
+# ================= TRA CỨU =================
+class CostMap:
+    """3 lớp lưới (thường là view mmap) + tra cứu theo lô cho mảng điểm (..., 2) bất kỳ."""
+
+    def __init__(self, extent, flags, offset, yaw):
+        self.extent = [float(v) for v in extent]
+        self.left, self.right, self.bottom, self.top = self.extent
+        self.shape = flags.shape
+        h, w = self.shape
+        self.res_x = (self.right - self.left) / w
+        self.res_y = (self.top - self.bottom) / h
+        self.flags, self.offset, self.yaw = flags, offset, yaw
+        # View 1 chiều -> tra bằng 1 chỉ số phẳng
+        self._flags, self._offset, self._yaw = flags.reshape(-1), offset.reshape(-1), yaw.reshape(-1)
+
+    def cells(self, points):
+        """-> (chỉ số ô phẳng, điểm nằm trong lưới). Điểm ngoài lưới trỏ tạm về ô 0."""
+        points = np.asarray(points, dtype=np.float64)
+        c = np.floor((points[..., 0] - self.left) / self.res_x).astype(np.int64)
+        r = np.floor((points[..., 1] - self.bottom) / self.res_y).astype(np.int64)
+        h, w = self.shape
+        inside = (c >= 0) & (c < w) & (r >= 0) & (r < h)
+        return np.where(inside, r * w + c, 0), inside
+
+    def is_drivable(self, points):
+        idx, inside = self.cells(points)
+        return inside & (self._flags[idx] & DRIVABLE).astype(bool)
+
+    def lane_offset(self, points):
+        """Khoảng cách có dấu tới tâm làn (m, dương = bên trái làn), NaN nếu xa / ngoài lưới."""
+        idx, inside = self.cells(points)
+        return np.where(inside, self._offset[idx].astype(np.float32), np.float32(np.nan))
+
+    def lane_heading(self, points):
+        idx, inside = self.cells(points)
+        return np.where(inside, self._yaw[idx].astype(np.float32), np.float32(np.nan))
+
+    def lookup(self, points):
+        """Cả 3 lớp một lần (chỉ tính chỉ số ô 1 lần) -> dict 'drivable', 'offset', 'yaw'."""
+        idx, inside = self.cells(points)
+        nan = np.float32(np.nan)
+        return {'drivable': inside & (self._flags[idx] & DRIVABLE).astype(bool),
+                'offset': np.where(inside, self._offset[idx].astype(np.float32), nan),
+                'yaw': np.where(inside, self._yaw[idx].astype(np.float32), nan)}
+
+    def score(self, paths, yaw=None):
+        """Chấm điểm nhiều quỹ đạo cùng lúc: paths (..., M, 2), yaw (..., M) tùy chọn.
+
+        -> dict mảng (...): 'off_track' (số điểm ngoài mặt đường), 'max_offset' (m, |lệch tâm
+        làn| lớn nhất), 'mean_offset' (m) và 'max_heading_error' (rad, khi có yaw).
+        """
+        res = self.lookup(paths)
+        off = np.abs(res['offset'])
+        known = ~np.isnan(off)
+        # Điểm xa tâm làn (NaN) coi như lệch MAX_LANE_DIST
+        off = np.where(known, off, np.float32(MAX_LANE_DIST))
+        out = {'off_track': np.count_nonzero(~res['drivable'], axis=-1),
+               'max_offset': off.max(axis=-1), 'mean_offset': off.mean(axis=-1)}
+        if yaw is not None:
+            err = np.abs((np.asarray(yaw) - res['yaw'] + np.pi) % (2 * np.pi) - np.pi)
+            out['max_heading_error'] = np.where(known, err, np.float32(np.pi)).max(axis=-1)
+        return out
+
+
+def open_costmap(path):
+    header, arrays = map_arrays(path, MAGIC, COSTMAP_VERSION)
+    return CostMap(header['extent'], arrays['flags'], arrays['offset'], arrays['yaw'])
+
+
+def is_fresh(path, graph_file, img_file, extent):
+    if not os.path.exists(path):
+        return False
+    try:
+        header, _ = map_arrays(path, MAGIC, COSTMAP_VERSION)
+    except (OSError, ValueError):
+        return False
+    return (header['graph_sha256'] == file_sha256(graph_file)
+            and header['image_sha256'] == file_sha256(img_file)
+            and np.allclose(header['extent'], extent, rtol=0, atol=1e-9)
+            and header['params'] == costmap_params())
+
+
+def load_costmap(graph_file=GRAPH_FILE, img_file=IMG_FILE, config_file=CONFIG_FILE, path=None):
+    """Điểm vào khi chạy: dùng file .costmap nếu còn mới, nếu không thì build lại."""
+    path = path or default_costmap_path(graph_file)
+    extent = load_extent(config_file)
+    if not is_fresh(path, graph_file, img_file, extent):
+        print(f"-> Costmap {path} cũ hoặc chưa có, đang build lại...")
+        compile_costmap(graph_file, img_file, extent, path)
+    return open_costmap(path)
+
+
+if __name__ == "__main__":
+    from route_table import load_route_table
+    from trajectory import trajectory_for_route
+
+    graph_file = sys.argv[1] if len(sys.argv) > 1 else GRAPH_FILE
+    img_file = sys.argv[2] if len(sys.argv) > 2 else IMG_FILE
+
+    t0 = time.perf_counter()
+    out = compile_costmap(graph_file, img_file)
+    dt = time.perf_counter() - t0
+    cmap = open_costmap(out)
+    h, w = cmap.shape
+    drivable = (np.asarray(cmap.flags) & DRIVABLE).astype(bool)
+    print(f"✅ Đã build {out} ({os.path.getsize(out)} bytes) trong {dt * 1000:.0f} ms")
+    print(f"-> Lưới {w}x{h}, ô {cmap.res_x * 100:.2f} x {cmap.res_y * 100:.2f} cm, "
+          f"mặt đường {drivable.mean() * 100:.1f}% ({drivable.sum() * cmap.res_x * cmap.res_y:.2f} m²)")
+
+    # Chấm quỹ đạo mẫu + đo tốc độ tra cứu
+    track, _ = load_map(graph_file)
+    traj = trajectory_for_route(track, load_route_table(graph_file).plan(["1", "89", "36", "67"]))
+    path = np.stack([traj['x'], traj['y']], axis=1)
+    s = cmap.score(path, traj['yaw'])
+    print(f"-> Quỹ đạo mẫu {len(path)} điểm: {int(s['off_track'])} điểm ngoài đường, lệch tâm làn "
+          f"lớn nhất {float(s['max_offset']) * 100:.1f} cm, sai hướng lớn nhất "
+          f"{np.degrees(float(s['max_heading_error'])):.1f}°")
+    batch = np.broadcast_to(path, (100000 // len(path) + 1, *path.shape)).reshape(-1, 2)[:100000]
+    t0 = time.perf_counter()
+    for _ in range(10):
+        cmap.lookup(batch)
+    dt = (time.perf_counter() - t0) / 10
+    print(f"-> Tra cứu {len(batch)} điểm: {dt * 1000:.3f} ms ({len(batch) / dt / 1000:.0f} điểm/ms)")
@@ -0,0 +1,380 @@
+### MÔ HÌNH TRỌNG SỐ (THỜI GIAN = QUÃNG ĐƯỜNG / VẬN TỐC) - TÍNH THEO CHUYỂN TIẾP ###
+#
+# Vận tốc trên một cạnh phụ thuộc vào khúc cua NGAY SAU nó, tức là phụ thuộc nhánh mà
+# xe thực sự rẽ vào. Vì vậy chi phí được gắn cho từng chuyển tiếp (cạnh vào -> cạnh ra)
+# thay vì cho từng cạnh (line graph / edge-state).
+#
+# Đồ thị tìm kiếm (SearchGraph) có E + 2N đỉnh:
+#   [0, E)        trạng thái "đang đi trên cạnh e" (chưa tính chi phí của e)
+#   [E, E+N)      cổng XUẤT PHÁT tại node v  --0-->              các cạnh ra của v
+#   [E+N, E+2N)   cổng ĐÍCH tại node v        <--len(e)/V_MAX--  các cạnh vào v (dừng, không rẽ)
+#   và cung e1 -> e2 với chi phí len(e1) / v(góc rẽ e1 -> e2).
+# Cổng xuất phát chỉ có cung ra, cổng đích chỉ có cung vào -> mọi đường S_s ~> T_t
+# đều là lộ trình hợp lệ, và mọi thuật toán đường ngắn nhất trên CSR dùng được nguyên vẹn.
+#
+# CHUYỂN LÀN: vạch nét đứt (cờ dotted) cho phép chuyển sang làn bên cạnh CÙNG CHIỀU. Mỗi
+# cặp (cạnh nét đứt e1 kết thúc tại v, cạnh nét đứt e2 bắt đầu tại m ở làn bên cạnh, hơi
+# phía trước) thành thêm một trạng thái-cạnh ảo v -> m, đặt sau E cạnh thật:
+#   e1 -> link     chi phí len(e1) / v(góc rẽ e1 -> link)        (như chuyển tiếp thường)
+#   link -> e2     chi phí len(link) / v(góc rẽ link -> e2) + LANE_CHANGE_PENALTY
+# Chỉ tạo link khi cả hai làn thẳng ít nhất MIN_STRAIGHT_BEFORE / MIN_STRAIGHT_AFTER mét
+# quanh điểm chuyển làn. Chọn đổi làn hay không vẫn chỉ là MỘT lần tìm đường ngắn nhất.
+#
+# VƯỢT XE QUA LÀN NGƯỢC CHIỀU: vạch giữa nét đứt giữa hai làn ngược chiều (như đoạn 84-93 /
+# 96-105 của map thi đấu) cho phép sang làn ngược chiều rồi trở về. Thêm 3 loại trạng thái ảo:
+#   O  link rời làn: cuối cạnh e1 -> node dst(f) của cạnh nét đứt f ở làn ngược chiều
+#   C  đi NGƯỢC cạnh nét đứt f (dst(f) -> src(f)), chi phí nhân CONTRA_FLOW_FACTOR
+#   R  link trở về: src(f) -> đầu cạnh e2 ở làn cùng chiều, phía trước
+# O và C không có cung tới cổng đích -> đã sang làn ngược thì bắt buộc phải trở về.
+# Không có vật cản thì vượt luôn đắt hơn đi thẳng; khi cạnh / node trên làn mình bị chặn
+# (AStarPlanner) lộ trình tự vượt qua làn bên cạnh.
+# Mỗi trạng thái O / C / R chạy trên làn của đúng một cạnh thật f (SearchGraph.base_edge):
+# chặn f thì chặn luôn cả việc đi ngược f, sang làn f và trở về từ làn f.
+
+import numpy as np
+
+from instrument import traced
+from track_graph import build_csr, edge_transitions
+from spatial_index import GridIndex
+from steering_safety import circumradius
+
+# --- CẤU HÌNH ---
+V_MAX = 1.0           # Vận tốc tối đa trên đường thẳng (m/s)
+V_CURVE_MIN = 0.3     # Vận tốc tối thiểu khi vào cua (m/s)
+TURN_THRESHOLD = 10   # Góc rẽ (độ) bắt đầu bị giảm tốc (mô hình "heuristic")
+A_LAT_MAX = 1.0       # Gia tốc ngang tối đa (m/s^2) (mô hình "lateral")
+
+# "lateral":   v = sqrt(A_LAT_MAX * R) với R là bán kính qua 3 điểm - thời gian chạy thật
+#              (cùng giới hạn mà velocity_profile.py dùng cho lượt forward-backward)
+# "heuristic": v = V_MAX * (1 - góc/100) khi góc > TURN_THRESHOLD - công thức cũ
+SPEED_MODEL = "lateral"
+
+# Chuyển làn qua vạch nét đứt
+LANE_CHANGE = True
+LANE_CHANGE_PENALTY = 0.5        # s - cộng thêm cho mỗi lần chuyển làn
+LANE_OFFSET = (0.2, 0.6)         # m - khoảng cách ngang tới tâm làn bên cạnh
+LANE_CHANGE_ADVANCE = (0.3, 1.2) # m - quãng đường dọc dùng để chuyển làn
+LANE_HEADING_TOL = 20            # độ - lệch hướng tối đa giữa 2 làn (cùng chiều)
+LANE_STRAIGHT_ANGLE = 10         # độ - góc rẽ tối đa để coi là vẫn "đi thẳng"
+MIN_STRAIGHT_BEFORE = 0.5        # m - làn cũ phải thẳng ít nhất chừng này trước điểm rời làn
+MIN_STRAIGHT_AFTER = 0.5         # m - làn mới phải thẳng ít nhất chừng này sau điểm nhập làn
+OVERTAKE = True                  # cho phép vượt qua làn ngược chiều (vạch giữa nét đứt)
+CONTRA_FLOW_FACTOR = 1.5         # hệ số chi phí thời gian khi chạy trên làn ngược chiều
+
+
+def weight_model():
+    """Tham số của mô hình (ghi vào cache để phát hiện khi cấu hình thay đổi)."""
+    return {'speed_model': SPEED_MODEL, 'v_max': V_MAX, 'v_curve_min': V_CURVE_MIN,
+            'turn_threshold': TURN_THRESHOLD, 'a_lat_max': A_LAT_MAX,
+            'lane_change': LANE_CHANGE and {
+                'penalty': LANE_CHANGE_PENALTY, 'offset': list(LANE_OFFSET),
+                'advance': list(LANE_CHANGE_ADVANCE), 'heading_tol': LANE_HEADING_TOL,
+                'straight_angle': LANE_STRAIGHT_ANGLE, 'min_before': MIN_STRAIGHT_BEFORE,
+                'min_after': MIN_STRAIGHT_AFTER,
+                'overtake': OVERTAKE and {'contra_flow_factor': CONTRA_FLOW_FACTOR}}}
+
+
+def edge_lengths(track):
+    if track.length is not None:
+        return np.asarray(track.length, dtype=np.float64)
+    xy = np.asarray(track.xy)
+    d = xy[track.indices] - xy[track.edge_src]
+    return np.hypot(d[:, 0], d[:, 1])
+
+def turn_angles(xy, p, n, s):
+    """Góc đổi hướng (độ) tại n khi đi p -> n -> s, cho cả mảng index."""
+    v1 = xy[n] - xy[p]
+    v2 = xy[s] - xy[n]
+    n1 = np.hypot(v1[:, 0], v1[:, 1])
+    n2 = np.hypot(v2[:, 0], v2[:, 1])
+    ok = (n1 > 0) & (n2 > 0)
+    cos = np.ones(len(p))
+    cos[ok] = np.einsum('ij,ij->i', v1[ok], v2[ok]) / (n1[ok] * n2[ok])
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+def turn_velocity(angle):
+    """Vận tốc cho phép trước khúc cua có góc rẽ angle (độ) - mô hình "heuristic"."""
+    return np.where(angle > TURN_THRESHOLD,
+                    np.maximum(V_MAX * (1 - angle / 100), V_CURVE_MIN), V_MAX)
+
+def lateral_velocity(radius):
+    """Vận tốc cho phép theo gia tốc ngang trên cung bán kính radius - mô hình "lateral"."""
+    return np.clip(np.sqrt(A_LAT_MAX * radius), V_CURVE_MIN, V_MAX)
+
+
+def transition_velocity(xy, p, n, s):
+    """Vận tốc cho phép trên đoạn p -> n khi sau đó rẽ sang n -> s (theo SPEED_MODEL)."""
+    angle = turn_angles(xy, p, n, s)
+    if SPEED_MODEL == "lateral":
+        radius = circumradius(xy[p], xy[n], xy[s])
+        radius[(angle > 90) & np.isinf(radius)] = 0.0   # quay đầu: thẳng hàng nhưng ngược chiều
+        return lateral_velocity(radius)
+    return turn_velocity(angle)
+
+
+@traced("weight.transitions")
+def transition_costs(track):
+    """(e_in, e_out, chi phí) cho mọi chuyển tiếp: thời gian đi hết e_in rồi rẽ sang e_out."""
+    e_in, e_out = edge_transitions(track)
+    xy = np.asarray(track.xy)
+    p, n, s = track.edge_src[e_in], track.indices[e_in], track.indices[e_out]
+    return e_in, e_out, edge_lengths(track)[e_in] / transition_velocity(xy, p, n, s)
+
+
+# ================= CHUYỂN LÀN QUA VẠCH NÉT ĐỨT =================
+def straight_runs(track):
+    """Độ dài đoạn nét đứt thẳng liền mạch (m) kết thúc tại cuối mỗi cạnh / bắt đầu từ
+    đầu mỗi cạnh -> (before, after), bão hòa ở mức lớn nhất cần kiểm tra. Cạnh thường = 0."""
+    E = track.n_edges
+    length = edge_lengths(track) * track.dotted
+    e_in, e_out = edge_transitions(track)
+    xy = np.asarray(track.xy)
+    angle = turn_angles(xy, track.edge_src[e_in], track.indices[e_in], track.indices[e_out])
+    ok = track.dotted[e_in] & track.dotted[e_out] & (angle <= LANE_STRAIGHT_ANGLE)
+    e_in, e_out = e_in[ok], e_out[ok]
+    # Chỉ nối tiếp khi đường thẳng là duy nhất (không rẽ nhánh / nhập nhánh)
+    nxt = np.full(E, -1, dtype=np.int64)
+    prv = np.full(E, -1, dtype=np.int64)
+    once_in = np.bincount(e_in, minlength=E)[e_in] == 1
+    once_out = np.bincount(e_out, minlength=E)[e_out] == 1
+    nxt[e_in[once_in]] = e_out[once_in]
+    prv[e_out[once_out]] = e_in[once_out]
+
+    cap = max(MIN_STRAIGHT_BEFORE, MIN_STRAIGHT_AFTER)
+    runs = []
+    for link in (prv, nxt):
+        run = np.minimum(length, cap)
+        has = link >= 0
+        for _ in range(E):   # lan truyền dọc chuỗi; bão hòa ở cap nên dừng cả khi có vòng
+            new = run.copy()
+            new[has] = np.minimum(length[has] + run[link[has]], cap)
+            if np.array_equal(new, run):
+                break
+            run = new
+        runs.append(run)
+    return runs[0], runs[1]
+
+
+def dotted_lanes(track):
+    """Nhãn làn cho từng cạnh: các cạnh nét đứt nối tiếp nhau (không quay đầu) cùng một
+    nhãn, cạnh thường = -1. Chuyển làn chỉ hợp lệ giữa hai nhãn khác nhau."""
+    dotted = np.asarray(track.dotted, dtype=bool)
+    e_in, e_out = edge_transitions(track)
+    xy = np.asarray(track.xy)
+    angle = turn_angles(xy, track.edge_src[e_in], track.indices[e_in], track.indices[e_out])
+    ok = dotted[e_in] & dotted[e_out] & (angle < 90)
+    a, b = e_in[ok], e_out[ok]
+    label = np.arange(track.n_edges)
+    while True:   # lan truyền nhãn nhỏ nhất theo cả hai chiều tới khi ổn định
+        new = label.copy()
+        np.minimum.at(new, a, label[b])
+        np.minimum.at(new, b, label[a])
+        if np.array_equal(new, label):
+            break
+        label = new
+    return np.where(dotted, label, -1)
+
+
+def _lane_entries(track, points, h, cand, cand_node, cand_heading, cand_lane=None, start_lane=None):
+    """Ghép điểm rời làn với điểm nhập làn ở làn bên cạnh -> list (i, cạnh nhập).
+
+    points[i], h[i]: vị trí + hướng đi tại điểm rời làn i. cand: các cạnh có thể nhập làn,
+    nhập tại node cand_node[c] và đi theo hướng cand_heading[c] (phải gần h[i]). Điểm nhập
+    nằm phía trước trong LANE_CHANGE_ADVANCE, lệch ngang trong LANE_OFFSET; mỗi bên (trái /
+    phải) chỉ giữ điểm nhập sớm nhất. cand_lane / start_lane: bỏ cặp cùng nhãn làn.
+    """
+    if len(points) == 0 or len(cand) == 0:
+        return []
+    xy = np.asarray(track.xy, dtype=np.float64)
+    # Các cạnh ứng viên gom theo node nhập làn (CSR nhỏ)
+    order = cand[np.argsort(cand_node[cand], kind='stable')]
+    ptr = np.searchsorted(cand_node[order], np.arange(track.n_nodes + 1))
+    radius = float(np.hypot(LANE_OFFSET[1], LANE_CHANGE_ADVANCE[1]))
+    near = GridIndex(track).nodes_within(points, radius)
+    cos_tol = np.cos(np.radians(LANE_HEADING_TOL))
+    pairs = []
+    for i, nodes in enumerate(near):
+        if len(nodes) == 0:
+            continue
+        counts = ptr[nodes + 1] - ptr[nodes]
+        c = order[np.repeat(ptr[nodes], counts)
+                  + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+        if len(c) == 0:
+            continue
+        rel = xy[cand_node[c]] - points[i]
+        along = rel @ h[i]
+        lateral = rel[:, 1] * h[i][0] - rel[:, 0] * h[i][1]   # > 0: làn bên trái
+        ok = ((cand_heading[c] @ h[i] >= cos_tol)
+              & (along >= LANE_CHANGE_ADVANCE[0]) & (along <= LANE_CHANGE_ADVANCE[1])
+              & (np.abs(lateral) >= LANE_OFFSET[0]) & (np.abs(lateral) <= LANE_OFFSET[1]))
+        if start_lane is not None:
+            ok &= cand_lane[c] != start_lane[i]
+        for side in (lateral > 0, lateral < 0):
+            k = np.flatnonzero(ok & side)
+            if len(k):
+                pairs.append((i, c[k[np.argmin(along[k])]]))
+    return pairs
+
+
+def _lane_geometry(track):
+    """Hướng đơn vị của từng cạnh + cạnh nét đứt đủ thẳng trước cuối / sau đầu cạnh."""
+    xy = np.asarray(track.xy, dtype=np.float64)
+    d = xy[track.indices] - xy[track.edge_src]
+    heading = d / np.maximum(np.hypot(d[:, 0], d[:, 1]), 1e-12)[:, None]
+    before, after = straight_runs(track)
+    dotted = np.asarray(track.dotted, dtype=bool)
+    return heading, dotted & (before >= MIN_STRAIGHT_BEFORE - 1e-9), dotted & (after >= MIN_STRAIGHT_AFTER - 1e-9)
+
+
+def _pairs(pairs, starts):
+    if not pairs:
+        none = np.zeros(0, dtype=np.int32)
+        return none, none
+    i, c = np.array(pairs, dtype=np.int64).T
+    return starts[i].astype(np.int32), c.astype(np.int32)
+
+
+@traced("weight.lane_change")
+def lane_change_links(track):
+    """Các cặp (e1, e2) được phép chuyển làn: rời làn ở cuối e1, nhập làn ở đầu e2."""
+    none = np.zeros(0, dtype=np.int32)
+    if not LANE_CHANGE or not np.any(track.dotted):
+        return none, none
+    xy = np.asarray(track.xy, dtype=np.float64)
+    heading, can_leave, can_enter = _lane_geometry(track)
+    lane = dotted_lanes(track)
+    leave = np.flatnonzero(can_leave)
+    pairs = _lane_entries(track, xy[track.indices[leave]], heading[leave], np.flatnonzero(can_enter),
+                          track.edge_src, heading, lane, lane[leave])
+    return _pairs(pairs, leave)
+
+
+@traced("weight.overtake")
+def overtake_links(track):
+    """Vượt xe qua làn ngược chiều -> (o_in, o_out, r_in, r_out).
+
+    o_in -> o_out: rời làn ở cuối cạnh o_in, sang làn ngược chiều tại dst(o_out) rồi đi
+    ngược cạnh o_out. r_in -> r_out: đi ngược hết cạnh r_in (tới src(r_in)) rồi trở về
+    làn cùng chiều ở đầu cạnh r_out.
+    """
+    none = np.zeros(0, dtype=np.int32)
+    if not (LANE_CHANGE and OVERTAKE) or not np.any(track.dotted):
+        return none, none, none, none
+    xy = np.asarray(track.xy, dtype=np.float64)
+    src, dst = track.edge_src, track.indices
+    heading, can_leave, can_enter = _lane_geometry(track)
+    # Đi ngược cạnh f (hướng -heading[f]): đoạn thẳng "trước cuối f" nằm sau điểm vào,
+    # đoạn thẳng "sau đầu f" nằm trước điểm ra
+    leave = np.flatnonzero(can_leave)
+    o_in, o_out = _pairs(_lane_entries(track, xy[dst[leave]], heading[leave], np.flatnonzero(can_leave),
+                                       dst, -heading), leave)
+    if len(o_in) == 0:
+        return none, none, none, none
+    back = np.flatnonzero(can_enter)
+    r_in, r_out = _pairs(_lane_entries(track, xy[src[back]], -heading[back], np.flatnonzero(can_enter),
+                                       src, heading), back)
+    return o_in, o_out, r_in, r_out
+
+
+class SearchGraph:
+    """CSR của đồ thị trạng thái-cạnh (xem đầu file) + cách đổi về dãy node gốc."""
+
+    def __init__(self, track, indptr, indices, weights, edge_src=None, edge_dst=None, base_edge=None):
+        self.track = track
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        # Node đầu/cuối của mọi trạng thái-cạnh: E cạnh thật rồi tới các link chuyển làn
+        self.edge_src = track.edge_src if edge_src is None else edge_src
+        self.edge_dst = track.indices if edge_dst is None else edge_dst
+        self.n_edges = len(self.edge_dst)
+        self.n_nodes = track.n_nodes
+        # Cạnh thật có làn mà trạng thái-cạnh chạy trên đó (-1: link chuyển làn cùng chiều)
+        if base_edge is None:
+            base_edge = np.full(self.n_edges, -1, dtype=np.int32)
+            base_edge[:track.n_edges] = np.arange(track.n_edges)
+        self.base_edge = base_edge
+        xy = np.asarray(track.xy)
+        # Vị trí đại diện của mỗi đỉnh (cho heuristic): cạnh e -> node nguồn của e
+        self.vertex_xy = np.concatenate([xy[self.edge_src], xy, xy])
+
+    @property
+    def n_lane_changes(self):
+        return self.n_edges - self.track.n_edges
+
+    @property
+    def n_vertices(self):
+        return len(self.indptr) - 1
+
+    def start_vertex(self, i):
+        return self.n_edges + i
+
+    def goal_vertex(self, i):
+        return self.n_edges + self.n_nodes + i
+
+    def decode(self, vertex_path):
+        """Dãy đỉnh S_s, e1, ..., ek, T_t -> dãy index node s, dst(e1), ..., dst(ek)."""
+        dst = self.edge_dst
+        E = self.n_edges
+        return [vertex_path[0] - E] + [int(dst[v]) for v in vertex_path[1:] if v < E]
+
+
+@traced("weight.search_graph")
+def build_search_graph(track):
+    """Tính trọng số vector hóa cho toàn bộ đồ thị và dựng SearchGraph."""
+    N = track.n_nodes
+    e_in, e_out, cost = transition_costs(track)
+    length = edge_lengths(track)
+
+    # Link chuyển làn l = (e1, e2): thêm trạng thái-cạnh v -> m với index E_track + l
+    l_in, l_out = lane_change_links(track)
+    xy = np.asarray(track.xy)
+    Et = track.n_edges
+    v, m = track.indices[l_in], track.edge_src[l_out]
+    l_len = np.hypot(*(xy[m] - xy[v]).T)
+
+    # Vượt xe: link sang làn ngược (O), đi ngược cạnh nét đứt (C), link trở về (R)
+    o_in, o_out, r_in, r_out = overtake_links(track)
+    contra = np.flatnonzero(track.dotted) if len(o_in) else np.zeros(0, dtype=np.int64)
+    c_of = np.full(Et, -1, dtype=np.int64)
+    c_of[contra] = np.arange(len(contra))
+    o_src, o_dst = track.indices[o_in], track.indices[o_out]
+    r_src, r_dst = track.edge_src[r_in], track.edge_src[r_out]
+    o_len = np.hypot(*(xy[o_dst] - xy[o_src]).T)
+    r_len = np.hypot(*(xy[r_dst] - xy[r_src]).T)
+
+    edge_src = np.concatenate([track.edge_src, v, o_src, track.indices[contra], r_src]).astype(np.int32)
+    edge_dst = np.concatenate([track.indices, m, o_dst, track.edge_src[contra], r_dst]).astype(np.int32)
+    links = Et + np.arange(len(l_in), dtype=np.int32)
+    o_ids = Et + len(l_in) + np.arange(len(o_in), dtype=np.int32)
+    c_base = Et + len(l_in) + len(o_in)
+    r_ids = c_base + len(contra) + np.arange(len(r_in), dtype=np.int32)
+    E = len(edge_dst)
+    base_edge = np.concatenate([np.arange(Et), np.full(len(l_in), -1), o_out, contra, r_in]).astype(np.int32)
+
+    # Chuyển tiếp giữa hai trạng thái đi ngược: g -> f thật (không quay đầu) thành f' -> g'
+    both = np.isin(e_in, contra) & np.isin(e_out, contra)
+    g, f = e_in[both], e_out[both]
+    keep = turn_angles(xy, track.edge_src[g], track.indices[g], track.indices[f]) < 90
+    g, f = g[keep], f[keep]
+
+    goals = np.concatenate([np.arange(Et + len(l_in), dtype=np.int32), r_ids])
+    to_goal = np.concatenate([length / V_MAX, l_len / V_MAX + LANE_CHANGE_PENALTY,
+                              r_len / V_MAX + LANE_CHANGE_PENALTY])
+    src = np.concatenate([E + track.edge_src, e_in, l_in, links,
+                          o_in, o_ids, c_base + c_of[f], c_base + c_of[r_in], r_ids, goals])
+    dst = np.concatenate([np.arange(Et), e_out, links, l_out,
+                          o_ids, c_base + c_of[o_out], c_base + c_of[g], r_ids, r_out, E + N + edge_dst[goals]])
+    w = np.concatenate([np.zeros(Et), cost,
+                        length[l_in] / transition_velocity(xy, track.edge_src[l_in], v, m),
+                        l_len / transition_velocity(xy, v, m, track.indices[l_out]) + LANE_CHANGE_PENALTY,
+                        length[o_in] / transition_velocity(xy, track.edge_src[o_in], o_src, o_dst),
+                        o_len / transition_velocity(xy, o_src, o_dst, track.edge_src[o_out]) + LANE_CHANGE_PENALTY,
+                        CONTRA_FLOW_FACTOR * length[f]
+                        / transition_velocity(xy, track.indices[f], track.edge_src[f], track.edge_src[g]),
+                        CONTRA_FLOW_FACTOR * length[r_in]
+                        / transition_velocity(xy, track.indices[r_in], track.edge_src[r_in], r_dst),
+                        r_len / transition_velocity(xy, r_src, r_dst, track.indices[r_out]) + LANE_CHANGE_PENALTY,
+                        to_goal])
+    indptr, indices, weights = build_csr(E + 2 * N, src, dst, w)
+    return SearchGraph(track, indptr, indices, weights, edge_src, edge_dst, base_edge)
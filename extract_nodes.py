@@ -1,12 +1,106 @@
 import xml.etree.ElementTree as ET
 import xml.dom.minidom
+from xml.sax.saxutils import quoteattr
+import hashlib
+import json
 import math
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from instrument import traced
 
 # --- CẤU HÌNH ---
 INPUT_FILE = "BFMC_Track_graph!.graphml"        # Tên file gốc (từ yEd)
 OUTPUT_FILE = "Competition_track_graph_FINAL.graphml" # Tên file đích
 REAL_DISTANCE = 3.0                             # Khoảng cách thực tế giữa ORIGIN và REF_X (mét)
+STATE_EXT = ".state.json"                       # Snapshot cho chế độ incremental (cạnh file đích)
+STATE_VERSION = 2                               # Đổi khi định dạng snapshot thay đổi
+
+# Điểm mốc: ORIGIN = (0, 0), REF_X = (REAL_DISTANCE, 0), và bao nhiêu node mốc tùy ý có nhãn
+#   "ANCHOR <tên> <x mét> <y mét>"   (vd. "ANCHOR A1 6.0 4.5"; tên không được là số)
+# Phép biến đổi pixel -> mét được khớp bình phương tối thiểu qua mọi điểm mốc:
+#   "similarity": tỉ lệ đều + quay + tịnh tiến (+ lật trục Y) - cần >= 2 mốc
+#   "affine":     thêm tỉ lệ riêng từng trục + xiên (skew)       - cần >= 3 mốc không thẳng hàng
+TRANSFORM_MODEL = "similarity"
+RESIDUAL_WARN = 0.02                            # Sai số tại mốc (mét) bắt đầu cảnh báo
+ANCHOR_RE = re.compile(r"ANCHOR\s+(\S+)\s+([-+0-9.eE]+)\s+([-+0-9.eE]+)")
+
+
+# ================= ĐIỂM MỐC & PHÉP BIẾN ĐỔI PIXEL -> MÉT =================
+def parse_anchor(lbl):
+    """Nhãn node -> (tên, (x_met, y_met)) nếu là điểm mốc, ngược lại None."""
+    if "ORIGIN" in lbl:
+        return "ORIGIN", (0.0, 0.0)
+    if "REF_X" in lbl:
+        return "REF_X", (REAL_DISTANCE, 0.0)
+    m = ANCHOR_RE.search(lbl)
+    if m:
+        return m.group(1), (float(m.group(2)), float(m.group(3)))
+    return None
+
+
+def fit_transform(pixel, real, model=TRANSFORM_MODEL):
+    """Khớp ma trận M (2, 3) sao cho real ≈ [px, py, 1] @ M.T (bình phương tối thiểu).
+
+    Similarity có sẵn phép lật trục Y (ảnh: Y hướng xuống, map: Y hướng lên):
+        x = a*px + b*py + tx,   y = b*px - a*py + ty
+    """
+    pixel = np.asarray(pixel, dtype=np.float64)
+    real = np.asarray(real, dtype=np.float64)
+    k = len(pixel)
+    if model == "affine" and k >= 3:
+        A = np.column_stack([pixel, np.ones(k)])
+        if np.linalg.matrix_rank(A) == 3:
+            sol = np.linalg.lstsq(A, real, rcond=None)[0]      # (3, 2)
+            return sol.T
+        print("⚠️ Các điểm mốc thẳng hàng, không khớp được affine -> dùng similarity.")
+    elif model == "affine":
+        print(f"⚠️ Affine cần >= 3 điểm mốc (có {k}) -> dùng similarity.")
+    px, py = pixel[:, 0], pixel[:, 1]
+    one, zero = np.ones(k), np.zeros(k)
+    A = np.vstack([np.column_stack([px, py, one, zero]),
+                   np.column_stack([-py, px, zero, one])])
+    a, b, tx, ty = np.linalg.lstsq(A, np.concatenate([real[:, 0], real[:, 1]]), rcond=None)[0]
+    return np.array([[a, b, tx], [b, -a, ty]])
+
+
+def apply_transform(M, pixel):
+    """Áp M cho cả mảng điểm pixel (K, 2) bằng một phép nhân ma trận."""
+    pixel = np.asarray(pixel, dtype=np.float64).reshape(-1, 2)
+    return pixel @ M[:, :2].T + M[:, 2]
+
+
+def transform_rotation(M):
+    """Góc quay (độ, dương = ngược chiều kim đồng hồ trên map) của trục X ảnh sau khi đổi qua M.
+
+    M[:, 0] là ảnh của trục X pixel (1, 0) -> góc của nó là atan2(M[1, 0], M[0, 0]).
+    """
+    return math.degrees(math.atan2(M[1, 0], M[0, 0]))
+
 
+def calibrate(anchors, model=TRANSFORM_MODEL):
+    """anchors: {tên: ((px, py), (x, y))} -> M; in sai số từng mốc để lộ lỗi hiệu chỉnh."""
+    names = list(anchors)
+    pixel = np.array([anchors[n][0] for n in names])
+    real = np.array([anchors[n][1] for n in names])
+    M = fit_transform(pixel, real, model)
+    err = np.hypot(*(apply_transform(M, pixel) - real).T)
+    scale = math.sqrt(abs(np.linalg.det(M[:, :2])))
+    rot = transform_rotation(M)
+    print(f"   -> {len(names)} điểm mốc | 1 pixel = {scale:.6f} mét | quay {rot:.3f}°")
+    for name, e in zip(names, err):
+        mark = "⚠️" if e > RESIDUAL_WARN else "  "
+        print(f"   {mark} mốc {name}: sai số {e * 100:.2f} cm")
+    if len(names) > 2 and err.max() > RESIDUAL_WARN:
+        print(f"⚠️ Sai số mốc lớn nhất {err.max() * 100:.1f} cm > {RESIDUAL_WARN * 100:.0f} cm"
+              " - kiểm tra lại vị trí/tọa độ các mốc!")
+    return M
+
+
+@traced("convert.legacy_read")
 def read_and_convert():
     print(f"--- 1. Đang đọc file {INPUT_FILE}... ---")
     try:
@@ -15,9 +109,8 @@ def read_and_convert():
         # Định nghĩa namespace để tìm thẻ chính xác
         ns = {'g': 'http://graphml.graphdrawing.org/xmlns', 'y': 'http://www.yworks.com/xml/graphml'}
         
-        # --- BƯỚC 1: TÌM TỌA ĐỘ PIXEL CỦA 2 ĐIỂM MỐC ---
-        origin_pos = None
-        ref_pos = None
+        # --- BƯỚC 1: TÌM TỌA ĐỘ PIXEL CỦA CÁC ĐIỂM MỐC ---
+        anchors = {}          # {tên: ((x_pixel, y_pixel), (x_met, y_met))}
         
         for node in root.findall(".//g:node", ns):
             geo = node.find(".//y:Geometry", ns)
@@ -29,27 +122,24 @@ def read_and_convert():
             x = float(geo.get('x'))
             y = float(geo.get('y'))
             
-            if "ORIGIN" in lbl: 
-                origin_pos = (x, y)
-                print(f"   -> Tìm thấy ORIGIN (pixel): {origin_pos}")
-            elif "REF_X" in lbl: 
-                ref_pos = (x, y)
-                print(f"   -> Tìm thấy REF_X (pixel): {ref_pos}")
-
-        if not origin_pos or not ref_pos: 
-            print("!!! LỖI: Không tìm thấy node có nhãn 'ORIGIN' hoặc 'REF_X' trong file yEd.")
+            anchor = parse_anchor(lbl)
+            if anchor:
+                anchors[anchor[0]] = ((x, y), anchor[1])
+                print(f"   -> Tìm thấy {anchor[0]} (pixel): {(x, y)}")
+
+        if len(anchors) < 2:
+            print("!!! LỖI: Cần ít nhất 2 điểm mốc (ORIGIN, REF_X hoặc 'ANCHOR <tên> <x> <y>') trong file yEd.")
             return None, None
 
-        # --- BƯỚC 2: TÍNH TỶ LỆ (SCALE) ---
-        pixel_dist = math.sqrt((ref_pos[0]-origin_pos[0])**2 + (ref_pos[1]-origin_pos[1])**2)
-        scale = REAL_DISTANCE / pixel_dist
-        print(f"   -> Tỷ lệ tính được: 1 pixel = {scale:.6f} mét")
+        # --- BƯỚC 2: KHỚP PHÉP BIẾN ĐỔI PIXEL -> MÉT ---
+        M = calibrate(anchors)
 
         # --- BƯỚC 3: XỬ LÝ TOÀN BỘ NODE (BAO GỒM CẢ ĐIỂM MỐC) ---
         final_nodes = {}      # Lưu {new_id: (x_met, y_met)}
         node_mapping = {}     # Lưu {old_id_yed: new_id}
         
         counter = 0
+        track_ids, track_px = [], []   # node thường: đổi tọa độ một lượt ở cuối
         
         for node in root.findall(".//g:node", ns):
             old_id = node.get('id')
@@ -62,31 +152,26 @@ def read_and_convert():
             
             # === [PHẦN SỬA ĐỔI QUAN TRỌNG] ===
             # Nếu là điểm mốc, gán ID cứng và Tọa độ cứng, KHÔNG được bỏ qua
-            if "ORIGIN" in lbl:
-                final_nodes["ORIGIN"] = (0.0, 0.0) # Gốc luôn là 0,0
-                node_mapping[old_id] = "ORIGIN"
-                print("   -> Đã thêm node: ORIGIN (0.0, 0.0)")
+            anchor = parse_anchor(lbl)
+            if anchor:
+                name, real = anchor
+                final_nodes[name] = real
+                node_mapping[old_id] = name
+                print(f"   -> Đã thêm node: {name} {real}")
                 continue # Xong node này, sang node tiếp theo
-
-            if "REF_X" in lbl:
-                final_nodes["REF_X"] = (REAL_DISTANCE, 0.0) # Luôn nằm trên trục X
-                node_mapping[old_id] = "REF_X"
-                print(f"   -> Đã thêm node: REF_X ({REAL_DISTANCE}, 0.0)")
-                continue
             # ==================================
 
-            # Các node đường đua bình thường -> Tính toán theo công thức
-            rx = float(geo.get('x'))
-            ry = float(geo.get('y'))
-            
-            # Công thức chuyển đổi hệ tọa độ ảnh sang hệ tọa độ mét
-            mx = (rx - origin_pos[0]) * scale
-            my = (origin_pos[1] - ry) * scale # Lật trục Y vì trục Y của ảnh hướng xuống
-            
-            final_nodes[str(counter)] = (mx, my)
+            # Các node đường đua bình thường -> giữ chỗ, tính tọa độ sau
+            final_nodes[str(counter)] = None
             node_mapping[old_id] = str(counter)
+            track_ids.append(str(counter))
+            track_px.append((float(geo.get('x')), float(geo.get('y'))))
             counter += 1
 
+        # Đổi hệ tọa độ ảnh sang mét cho mọi node trong một phép nhân ma trận
+        for node_id, (mx, my) in zip(track_ids, apply_transform(M, track_px).tolist()):
+            final_nodes[node_id] = (mx, my)
+
         print(f"   -> Tổng cộng đã xử lý: {len(final_nodes)} nodes.")
 
         # --- BƯỚC 4: XỬ LÝ (EDGE) ---
@@ -119,6 +204,7 @@ def read_and_convert():
         print(f"Lỗi đọc file: {e}")
         return None, None
 
+@traced("convert.legacy_write")
 def export_to_xml(nodes, edges):
     print(f"--- 2. Đang xuất ra file {OUTPUT_FILE}... ---")
     
@@ -167,8 +253,287 @@ def export_to_xml(nodes, edges):
         
     print("✅ Xong!")
 
+# ================= CHUYỂN ĐỔI DẠNG LUỒNG (ITERPARSE) =================
+# read_and_convert + export_to_xml giữ cả cây yEd, chuỗi XML và DOM minidom trong bộ nhớ.
+# Bản luồng: lượt 1 chỉ tìm các điểm mốc, lượt 2 ghi từng node ra file ngay khi đọc xong
+# (cạnh được đệm vào file tạm rồi ghi sau node), mỗi phần tử được gỡ khỏi cây ngay sau khi dùng.
+# Kết quả giống hệt export_to_xml từng byte (cùng định dạng thụt lề của minidom).
+G_NS = '{http://graphml.graphdrawing.org/xmlns}'
+Y_NS = '{http://www.yworks.com/xml/graphml}'
+BLOCK_SIZE = 4096     # số node đổi tọa độ + ghi ra mỗi lần
+
+OUT_HEADER = (
+    '<?xml version="1.0" ?>\n'
+    '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+    ' xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">\n'
+    '  <key id="d0" for="node" attr.name="x" attr.type="double"/>\n'
+    '  <key id="d1" for="node" attr.name="y" attr.type="double"/>\n'
+    '  <key id="d2" for="edge" attr.name="dotted" attr.type="boolean"/>\n'
+)
+# Chỉ ghi khi đồ thị có độ dài cạnh riêng (cạnh gộp của resample_graph)
+LENGTH_KEY = '  <key id="d3" for="edge" attr.name="length" attr.type="double"/>\n'
+
+
+def _iter_yed(input_file):
+    """Duyệt file yEd theo luồng, gỡ từng node/cạnh khỏi cây ngay sau khi dùng.
+
+    Sinh ra: ('key', attrib) | ('node_start', seq) |
+             ('node', seq, id, (x, y) hoặc None, nhãn) | ('edge', nguồn, đích, {key: text}).
+    seq là thứ tự mở thẻ node (= thứ tự của root.findall(".//g:node")); node nhóm (group)
+    đóng sau các node con nên người dùng phải sắp lại theo seq.
+    """
+    parents, frames = [], []
+    seq = 0
+    for event, elem in ET.iterparse(input_file, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            parents.append(elem)
+            if tag == G_NS + 'node':
+                frames.append([seq, elem.get('id'), None, None])
+                yield ('node_start', seq)
+                seq += 1
+            continue
+        parents.pop()
+        if tag == Y_NS + 'Geometry':
+            # Geometry/NodeLabel đầu tiên bên trong node (như node.find(".//y:Geometry"))
+            if frames and frames[-1][2] is None:
+                frames[-1][2] = (float(elem.get('x')), float(elem.get('y')))
+        elif tag == Y_NS + 'NodeLabel':
+            if frames and frames[-1][3] is None:
+                frames[-1][3] = (elem.text or "").strip()
+        elif tag == G_NS + 'node':
+            s, nid, geo, lbl = frames.pop()
+            yield ('node', s, nid, geo, lbl or "")
+        elif tag == G_NS + 'edge':
+            yield ('edge', elem.get('source'), elem.get('target'),
+                   {d.get('key'): d.text for d in elem.findall(G_NS + 'data')})
+        elif tag == G_NS + 'key':
+            yield ('key', dict(elem.attrib))
+        else:
+            continue
+        if parents:
+            parents[-1].remove(elem)   # cây trong bộ nhớ không lớn dần theo kích thước file
+
+
+@traced("convert.anchors")
+def find_anchors(input_file=INPUT_FILE):
+    """Lượt 1 (rẻ): chỉ lấy các điểm mốc -> {tên: ((x_pixel, y_pixel), (x_met, y_met))}."""
+    anchors = {}
+    for item in _iter_yed(input_file):
+        if item[0] == 'node' and item[3] is not None:
+            anchor = parse_anchor(item[4])
+            if anchor:
+                anchors[anchor[0]] = (item[3], anchor[1])
+    return anchors
+
+
+def _node_xml(node_id, x, y):
+    return (f'    <node id={quoteattr(node_id)}>\n'
+            f'      <data key="d0">{x:.4f}</data>\n'
+            f'      <data key="d1">{y:.4f}</data>\n'
+            f'    </node>\n')
+
+def _edge_xml(src, tgt, is_dotted, length=None):
+    return (f'    <edge source={quoteattr(src)} target={quoteattr(tgt)}>\n'
+            f'      <data key="d2">{is_dotted}</data>\n'
+            + (f'      <data key="d3">{length:.4f}</data>\n' if length is not None else '')
+            + f'    </edge>\n')
+
+
+@traced("convert.write_track")
+def write_track(track, output_file):
+    """Ghi TrackGraph (đã là mét) ra GraphML cùng định dạng với file FINAL."""
+    ids, xy = track.ids, np.asarray(track.xy)
+    tmp_file = output_file + ".tmp"
+    length = track.length.tolist() if track.length is not None else [None] * track.n_edges
+    with open(tmp_file, "w", encoding="utf-8") as out:
+        out.write(OUT_HEADER + (LENGTH_KEY if track.length is not None else '')
+                  + '  <graph edgedefault="directed">\n')
+        for i in range(0, len(ids), BLOCK_SIZE):
+            out.write("".join(_node_xml(nid, x, y)
+                              for nid, (x, y) in zip(ids[i:i + BLOCK_SIZE], xy[i:i + BLOCK_SIZE].tolist())))
+        src, dst, dotted = track.edge_src.tolist(), track.indices.tolist(), track.dotted.tolist()
+        for i in range(0, len(dst), BLOCK_SIZE):
+            out.write("".join(_edge_xml(ids[u], ids[v], bool(d), w)
+                              for u, v, d, w in zip(src[i:i + BLOCK_SIZE], dst[i:i + BLOCK_SIZE],
+                                                    dotted[i:i + BLOCK_SIZE], length[i:i + BLOCK_SIZE])))
+        out.write('  </graph>\n</graphml>')
+    os.replace(tmp_file, output_file)
+
+
+def _anchor_state(anchors):
+    return {name: [*px, *real] for name, (px, real) in anchors.items()}
+
+
+def _convert_pass(input_file, out, anchors, snapshot):
+    """Lượt 2: ghi node theo luồng vào out, cạnh ghi sau cùng. -> (thông tin, state mới).
+
+    Node được đổi tọa độ theo khối BLOCK_SIZE (một phép nhân ma trận mỗi khối).
+    snapshot: state của lần chuyển trước; node có tọa độ pixel không đổi dùng lại tọa độ mét
+    trong snapshot, chỉ node mới / đã dời mới được đổi tọa độ. Trả về None nếu điểm mốc
+    trong file khác anchors (snapshot đã cũ, cần chạy lại đủ 2 lượt).
+    """
+    M = calibrate(anchors)
+    old_nodes = snapshot['nodes'] if snapshot else {}
+
+    node_mapping = {}     # {old_id_yed: new_id}
+    state_nodes = {}      # {new_id: [x_pixel, y_pixel, x_mét, y_mét]}
+    seen_anchors = {}
+    changed = []
+    changed_xy = {}       # {new_id: [x, y] mét} của các node trong changed
+    pending = {}          # node đã đóng nhưng chưa tới lượt ghi (theo seq)
+    block = []            # [(new_id, (x, y) pixel, (x, y) mét nếu đã biết, đã đổi)] chờ ghi
+    next_seq = 0
+    counter = 0
+    dotted_key = 'd10'    # key của file yEd gốc; đọc lại từ <key attr.name="dotted"> nếu có
+
+    def flush():
+        free = [i for i, rec in enumerate(block) if rec[2] is None]
+        metric = [rec[2] for rec in block]
+        for i, xy in zip(free, apply_transform(M, [block[i][1] for i in free]).tolist()):
+            metric[i] = xy
+        for rec, xy in zip(block, metric):
+            state_nodes[rec[0]] = [*rec[1], *xy]
+            if rec[3]:
+                changed_xy[rec[0]] = list(xy)
+        out.write("".join(_node_xml(rec[0], *xy) for rec, xy in zip(block, metric)))
+        block.clear()
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        for item in _iter_yed(input_file):
+            kind = item[0]
+            if kind == 'node':
+                pending[item[1]] = item[2:]
+                while next_seq in pending:
+                    old_id, geo, lbl = pending.pop(next_seq)
+                    next_seq += 1
+                    if geo is None:
+                        continue
+                    anchor = parse_anchor(lbl)
+                    if anchor:
+                        new_id, real = anchor
+                        seen_anchors[new_id] = (geo, real)
+                    else:
+                        new_id, real = str(counter), None
+                        counter += 1
+                    old = old_nodes.get(new_id)
+                    moved = old is None or old[:2] != list(geo)
+                    if moved:
+                        changed.append(new_id)
+                    elif real is None:
+                        real = old[2:]    # hình học không đổi: giữ tọa độ mét của lần trước
+                    node_mapping[old_id] = new_id
+                    block.append((new_id, geo, real, moved))
+                    if len(block) >= BLOCK_SIZE:
+                        flush()
+            elif kind == 'edge':
+                _, src, tgt, data = item
+                val = (data.get(dotted_key) or "").strip().lower()
+                spool.write(json.dumps([src, tgt, val == 'true' or val == '1']) + "\n")
+            elif kind == 'key':
+                if item[1].get('attr.name') == 'dotted' and item[1].get('for') == 'edge':
+                    dotted_key = item[1].get('id')
+        flush()
+
+        if _anchor_state(seen_anchors) != _anchor_state(anchors):
+            return None
+
+        # Cạnh: ghi sau toàn bộ node (giống export_to_xml), chỉ giữ cạnh có 2 đầu đã ánh xạ
+        edge_hash = hashlib.sha1()
+        n_edges = 0
+        spool.seek(0)
+        for line in spool:
+            src, tgt, is_dotted = json.loads(line)
+            if src in node_mapping and tgt in node_mapping:
+                text = _edge_xml(node_mapping[src], node_mapping[tgt], is_dotted)
+                edge_hash.update(text.encode("utf-8"))
+                out.write(text)
+                n_edges += 1
+
+    info = {'nodes': len(state_nodes), 'edges': n_edges, 'changed': changed, 'changed_xy': changed_xy,
+            'removed': [n for n in old_nodes if n not in state_nodes],
+            'edges_changed': snapshot is None or snapshot.get('edges') != edge_hash.hexdigest()}
+    state = {'version': STATE_VERSION, 'anchors': _anchor_state(anchors), 'model': TRANSFORM_MODEL,
+             'edges': edge_hash.hexdigest(), 'nodes': state_nodes}
+    return info, state
+
+
+@traced("convert.streaming")
+def convert_streaming(input_file=INPUT_FILE, output_file=OUTPUT_FILE, incremental=False):
+    """Chuyển file yEd -> GraphML mét theo luồng (bộ nhớ không phụ thuộc kích thước map).
+
+    incremental=True: dùng snapshot <output>.state.json của lần trước - bỏ lượt tìm điểm mốc,
+    chỉ đổi tọa độ các node có hình học thay đổi (node khác lấy lại tọa độ mét trong snapshot),
+    báo riêng các node đó, và không ghi đè file đích nếu không có gì đổi.
+    Trả về dict: 'nodes', 'edges', 'changed' (id node mới/đổi tọa độ), 'changed_xy' ({id: [x, y]
+    mét} của các node đó), 'removed', 'edges_changed'; hoặc None nếu lỗi.
+    """
+    print(f"--- Đang chuyển đổi (streaming) {input_file} -> {output_file}... ---")
+    state_file = output_file + STATE_EXT
+    snapshot = None
+    if incremental and os.path.exists(state_file) and os.path.exists(output_file):
+        with open(state_file, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get('version') != STATE_VERSION or snapshot.get('model') != TRANSFORM_MODEL:
+            snapshot = None   # snapshot định dạng cũ / khác mô hình biến đổi
+
+    tmp_file = output_file + ".tmp"
+    try:
+        result = None
+        if snapshot is not None:
+            with open(tmp_file, "w", encoding="utf-8") as out:
+                out.write(OUT_HEADER + '  <graph edgedefault="directed">\n')
+                anchors = {name: (tuple(v[:2]), tuple(v[2:])) for name, v in snapshot['anchors'].items()}
+                result = _convert_pass(input_file, out, anchors, snapshot)
+            if result is None:
+                print("   -> Điểm mốc đã thay đổi, chuyển đổi lại toàn bộ.")
+        if result is None:
+            snapshot = None
+            anchors = find_anchors(input_file)
+            if len(anchors) < 2:
+                print("!!! LỖI: Cần ít nhất 2 điểm mốc (ORIGIN, REF_X hoặc 'ANCHOR <tên> <x> <y>') trong file yEd.")
+                return None
+            with open(tmp_file, "w", encoding="utf-8") as out:
+                out.write(OUT_HEADER + '  <graph edgedefault="directed">\n')
+                result = _convert_pass(input_file, out, anchors, None)
+        with open(tmp_file, "a", encoding="utf-8") as out:
+            out.write('  </graph>\n</graphml>')
+    except (ET.ParseError, OSError, ValueError, TypeError) as e:
+        print(f"Lỗi đọc file: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        return None
+
+    info, state = result
+    if snapshot is not None and not (info['changed'] or info['removed'] or info['edges_changed']):
+        os.remove(tmp_file)
+        print("   -> Không có thay đổi, giữ nguyên file đích.")
+    else:
+        os.replace(tmp_file, output_file)
+    with open(state_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    print(f"   -> {info['nodes']} nodes, {info['edges']} edges | "
+          f"{len(info['changed'])} node thay đổi, {len(info['removed'])} node bị xóa")
+    print("✅ Xong!")
+    return info
+
+
 #CHẠY 
 if __name__ == "__main__":
-    nodes_data, edges_data = read_and_convert()
-    if nodes_data:
-        export_to_xml(nodes_data, edges_data)
\ No newline at end of file
+    import sys
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    output_file = args[1] if len(args) > 1 else OUTPUT_FILE
+    if "--legacy" in sys.argv:
+        nodes_data, edges_data = read_and_convert()
+        ok = bool(nodes_data)
+        if ok:
+            export_to_xml(nodes_data, edges_data)
+            output_file = OUTPUT_FILE
+    else:
+        ok = convert_streaming(args[0] if args else INPUT_FILE, output_file,
+                               incremental="--incremental" in sys.argv) is not None
+    # Cổng chặn: đồ thị vừa xuất phải qua được validate_graph (mã thoát 1 nếu có lỗi)
+    if ok and "--no-validate" not in sys.argv:
+        from validate_graph import check_graph
+        ok = check_graph(output_file)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,176 @@
+### ĐO THỜI GIAN THEO ĐOẠN (SPAN) + BỘ ĐẾM CHO CÁC BƯỚC NÓNG - BẬT BẰNG BIẾN MÔI TRƯỜNG ###
+#
+#   BFMC_TRACE=1          bật đo: in bảng thời gian từng bước khi thoát + ghi Chrome trace
+#   BFMC_TRACE_MEM=1      đo thêm bộ nhớ cấp phát mỗi bước (tracemalloc - chậm hơn rõ rệt)
+#   BFMC_TRACE_FILE=...   file Chrome trace (mặc định TRACE_FILE) - mở bằng chrome://tracing
+#                         hoặc ui.perfetto.dev
+#
+# Khi TẮT (mặc định) chi phí bằng 0 trên đường nóng:
+#   @traced("tên")        trả về nguyên hàm gốc, không bọc gì cả (quyết định lúc import)
+#   with span("tên"):     trả về một context manager rỗng dùng chung (1 phép kiểm tra cờ)
+#   count("tên", n)       return ngay
+# Tên bước theo dạng "<giai đoạn>.<việc>": load, convert, weight, plan, analyze, render.
+#
+#   BFMC_TRACE=1 python "navigation_test!.py"
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# --- CẤU HÌNH ---
+ENABLED = os.environ.get("BFMC_TRACE", "") not in ("", "0")
+TRACE_MEMORY = ENABLED and os.environ.get("BFMC_TRACE_MEM", "") not in ("", "0")
+TRACE_FILE = os.environ.get("BFMC_TRACE_FILE", "bfmc_trace.json")
+MAX_EVENTS = 200000      # giới hạn số sự kiện giữ cho Chrome trace (thống kê vẫn đủ)
+
+_events = []             # sự kiện "X" của Chrome trace
+_stats = {}              # tên -> [số lần, tổng s, max s, tổng byte ròng, byte đỉnh lớn nhất]
+_counters = {}
+_local = threading.local()
+_t0 = time.perf_counter()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start', 'mem0', 'peak')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        if TRACE_MEMORY:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:   # giữ đỉnh đã đạt của span cha trước khi đặt lại bộ đếm đỉnh
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.mem0, self.peak = current, current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _local.stack.pop()
+        dt = end - self.start
+        net = peak = 0
+        if TRACE_MEMORY:
+            import tracemalloc
+            current, p = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, p)
+            net, peak = current - self.mem0, self.peak - self.mem0
+            if _local.stack:
+                parent = _local.stack[-1]
+                parent.peak = max(parent.peak, self.peak)
+        s = _stats.get(self.name)
+        if s is None:
+            s = _stats[self.name] = [0, 0.0, 0.0, 0, 0]
+        s[0] += 1
+        s[1] += dt
+        s[2] = max(s[2], dt)
+        s[3] += net
+        s[4] = max(s[4], peak)
+        if len(_events) < MAX_EVENTS:
+            ev = {'name': self.name, 'cat': self.name.split('.', 1)[0], 'ph': 'X',
+                  'ts': round((self.start - _t0) * 1e6, 3), 'dur': round(dt * 1e6, 3),
+                  'pid': os.getpid(), 'tid': threading.get_ident()}
+            if self.args or TRACE_MEMORY:
+                ev['args'] = dict(self.args or {}, **({'mem_net': net, 'mem_peak': peak} if TRACE_MEMORY else {}))
+            _events.append(ev)
+        return False
+
+
+def span(name, **args):
+    """Context manager đo một đoạn code. Tắt -> context manager rỗng dùng chung."""
+    if not ENABLED:
+        return _NULL
+    return _Span(name, args)
+
+
+def traced(name):
+    """Decorator đo cả hàm. Tắt lúc import -> trả về nguyên hàm (không tốn gì)."""
+    def wrap(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def inner(*a, **kw):
+            with _Span(name, None):
+                return fn(*a, **kw)
+        return inner
+    return wrap
+
+
+def count(name, n=1):
+    """Cộng bộ đếm (vd. số đỉnh A* đã mở). Tắt -> không làm gì."""
+    if not ENABLED:
+        return
+    _counters[name] = _counters.get(name, 0) + n
+
+
+# ================= BÁO CÁO =================
+def report():
+    """Thống kê theo bước: {tên: {'calls', 'total_s', 'mean_s', 'max_s', 'mem_net', 'mem_peak'}}."""
+    return {'stages': {name: {'calls': c, 'total_s': round(tot, 6), 'mean_s': round(tot / c, 6),
+                              'max_s': round(mx, 6), 'mem_net': net, 'mem_peak': peak}
+                       for name, (c, tot, mx, net, peak) in sorted(_stats.items())},
+            'counters': dict(sorted(_counters.items()))}
+
+
+def print_report(file=sys.stderr):
+    rep = report()
+    if not rep['stages'] and not rep['counters']:
+        return
+    print(f"--- THỜI GIAN THEO BƯỚC (pid {os.getpid()}) ---", file=file)
+    print(f"{'BƯỚC':<28} | {'SỐ LẦN':>7} | {'TỔNG':>10} | {'TB':>10} | {'MAX':>10}"
+          + (f" | {'BỘ NHỚ ĐỈNH':>12}" if TRACE_MEMORY else ""), file=file)
+    for name, s in rep['stages'].items():
+        line = (f"{name:<28} | {s['calls']:>7} | {s['total_s'] * 1000:8.2f}ms | "
+                f"{s['mean_s'] * 1000:8.3f}ms | {s['max_s'] * 1000:8.2f}ms")
+        if TRACE_MEMORY:
+            line += f" | {s['mem_peak'] / 1024:9.1f} KB"
+        print(line, file=file)
+    for name, v in rep['counters'].items():
+        print(f"{name:<28} = {v}", file=file)
+
+
+def write_chrome_trace(path=TRACE_FILE):
+    """Ghi Chrome trace JSON (các bước + bộ đếm + thống kê tổng)."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms', 'otherData': report()}, f)
+    return path
+
+
+def _at_exit():
+    print_report()
+    if _events:
+        path = write_chrome_trace(TRACE_FILE if os.getpid() == _main_pid
+                                  else f"{os.path.splitext(TRACE_FILE)[0]}.{os.getpid()}.json")
+        print(f"-> Chrome trace: {path}", file=sys.stderr)
+
+
+_main_pid = os.getpid()
+if ENABLED:
+    if TRACE_MEMORY:
+        import tracemalloc
+        tracemalloc.start()
+    atexit.register(_at_exit)
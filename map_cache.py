@@ -0,0 +1,162 @@
+### BIÊN DỊCH MAP SANG FILE NHỊ PHÂN (MMAP) ĐỂ KHỞI ĐỘNG NHANH TRÊN XE ###
+#
+# Bố cục file .trackbin:
+#   MAGIC (8 byte) | version (uint32) | độ dài header (uint32) | header JSON
+#   | các mảng thô, mỗi mảng căn lề ALIGN byte (offset ghi trong header)
+# Khi chạy, cả file được mmap và các mảng chỉ là view vào vùng nhớ đó (không copy).
+
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+from instrument import traced
+from track_graph import TrackGraph, load_track
+from edge_weights import SearchGraph, build_search_graph, edge_lengths, weight_model
+
+# --- CẤU HÌNH ---
+GRAPH_FILE = "Competition_track_graph_FINAL.graphml"
+CACHE_EXT = ".trackbin"
+MAGIC = b"TRKMAP\x00\x00"
+CACHE_VERSION = 6
+ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def default_cache_path(graph_file):
+    return os.path.splitext(graph_file)[0] + CACHE_EXT
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+@traced("load.compile_cache")
+def compile_map(graph_file=GRAPH_FILE, cache_file=None):
+    """Đọc GraphML, tính trọng số và ghi toàn bộ ra file nhị phân."""
+    cache_file = cache_file or default_cache_path(graph_file)
+    track = load_track(graph_file)
+    graph = build_search_graph(track)
+    arrays = {
+        'xy': np.ascontiguousarray(track.xy, dtype='<f8'),
+        'indptr': track.indptr.astype('<i4'),
+        'indices': track.indices.astype('<i4'),
+        'edge_src': track.edge_src.astype('<i4'),
+        'dotted': track.dotted.astype(np.bool_),
+        'length': edge_lengths(track).astype('<f8'),
+        # Đồ thị tìm kiếm trạng thái-cạnh đã gắn trọng số chuyển tiếp (edge_weights.py)
+        'sg_indptr': graph.indptr.astype('<i4'),
+        'sg_indices': graph.indices.astype('<i4'),
+        'sg_weights': graph.weights.astype('<f8'),
+        # Node đầu/cuối của mọi trạng thái-cạnh (cạnh thật + link chuyển làn)
+        'sg_edge_src': graph.edge_src.astype('<i4'),
+        'sg_edge_dst': graph.edge_dst.astype('<i4'),
+        # Cạnh thật mà từng trạng thái chạy trên làn của nó (chặn cạnh -> chặn cả O/C/R theo nó)
+        'sg_base_edge': graph.base_edge.astype('<i4'),
+    }
+
+    header = {
+        'version': CACHE_VERSION,
+        'source_sha256': file_sha256(graph_file),
+        'weight_model': weight_model(),
+        'ids': track.ids,
+    }
+    write_arrays(cache_file, header, arrays)
+    return cache_file
+
+
+def write_arrays(path, header, arrays, magic=MAGIC, version=CACHE_VERSION):
+    """Ghi header JSON + các mảng thô căn lề ALIGN (bố cục ở đầu file) -> path."""
+    # Header phải biết offset của mảng -> tính bố cục với header "giữ chỗ" trước
+    header = dict(header, arrays={})
+    offset = 0  # tính từ đầu vùng dữ liệu (data_start)
+    for name, arr in arrays.items():
+        header['arrays'][name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        offset += arr.nbytes + _pad(arr.nbytes)
+    blob = json.dumps(header).encode("utf-8")
+    data_start = _PREFIX.size + len(blob)
+    data_start += _pad(data_start)
+
+    # Ghi ra file tạm rồi đổi tên -> không bao giờ để lại cache hỏng khi mất điện
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(_PREFIX.pack(magic, version, len(blob)))
+        f.write(blob)
+        f.write(b"\x00" * (data_start - f.tell()))
+        for arr in arrays.values():
+            f.write(np.ascontiguousarray(arr).tobytes())
+            f.write(b"\x00" * _pad(arr.nbytes))
+    os.replace(tmp_file, path)
+    return path
+
+
+def _read_header(cache_file, magic=MAGIC, version=CACHE_VERSION):
+    with open(cache_file, "rb") as f:
+        m, v, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if m != magic or v != version:
+            return None, 0
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = _PREFIX.size + header_len
+    return header, data_start + _pad(data_start)
+
+
+def map_arrays(path, magic=MAGIC, version=CACHE_VERSION):
+    """Mmap file -> (header, {tên: view chỉ đọc}). Sai magic/phiên bản -> ValueError."""
+    header, data_start = _read_header(path, magic, version)
+    if header is None:
+        raise ValueError(f"{path}: sai định dạng hoặc phiên bản cache")
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, meta in header['arrays'].items():
+        dtype = np.dtype(meta['dtype'])
+        start = data_start + meta['offset']
+        count = int(np.prod(meta['shape'], dtype=np.int64))
+        arrays[name] = mm[start:start + count * dtype.itemsize].view(dtype).reshape(meta['shape'])
+    return header, arrays
+
+
+@traced("load.open_cache")
+def open_map(cache_file):
+    """Mmap file cache -> (TrackGraph, SearchGraph). Mọi mảng là view chỉ đọc."""
+    header, arrays = map_arrays(cache_file)
+    track = TrackGraph(header['ids'], arrays['xy'], arrays['indptr'], arrays['indices'],
+                       arrays['dotted'], edge_src=arrays['edge_src'], length=arrays['length'])
+    graph = SearchGraph(track, arrays['sg_indptr'], arrays['sg_indices'], arrays['sg_weights'],
+                        arrays['sg_edge_src'], arrays['sg_edge_dst'], arrays['sg_base_edge'])
+    return track, graph
+
+
+def is_fresh(graph_file, cache_file):
+    """Cache còn dùng được: đúng phiên bản, đúng hash GraphML, đúng mô hình trọng số."""
+    if not os.path.exists(cache_file):
+        return False
+    try:
+        header, _ = _read_header(cache_file)
+    except (OSError, ValueError, struct.error):
+        return False
+    return (header is not None
+            and header['source_sha256'] == file_sha256(graph_file)
+            and header['weight_model'] == weight_model())
+
+
+def load_map(graph_file=GRAPH_FILE, cache_file=None):
+    """Điểm vào khi chạy: dùng cache nếu còn mới, nếu không thì biên dịch lại."""
+    cache_file = cache_file or default_cache_path(graph_file)
+    if not is_fresh(graph_file, cache_file):
+        print(f"-> Cache {cache_file} cũ hoặc chưa có, đang biên dịch lại...")
+        compile_map(graph_file, cache_file)
+    return open_map(cache_file)
+
+
+if __name__ == "__main__":
+    import sys
+    src = sys.argv[1] if len(sys.argv) > 1 else GRAPH_FILE
+    out = compile_map(src)
+    print(f"✅ Đã biên dịch {src} -> {out} ({os.path.getsize(out)} bytes)")
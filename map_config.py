@@ -0,0 +1,39 @@
+### CẤU HÌNH ẢNH NỀN (EXTENT CỦA SAHINH.PNG TRONG HỆ TỌA ĐỘ MÉT) ###
+
+import json
+import os
+import re
+
+# --- CẤU HÌNH ---
+CONFIG_FILE = "map_config.json"
+IMG_FILE = "Sahinh.png"
+DEFAULT_EXTENT = [-0.0923, 12.2724, -0.7284, 8.8704]   # [left, right, bottom, top]
+
+
+def load_config(config_file=CONFIG_FILE):
+    """Đọc map_config.json -> dict. Chấp nhận cả dạng cũ 'MY_EXTENT = [...]' copy từ SANDBOX."""
+    if not os.path.exists(config_file):
+        return {}
+    with open(config_file, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        m = re.search(r"\[([^\]]*)\]", text)
+        if m is None:
+            return {}
+        return {'extent': [float(v) for v in m.group(1).split(",")]}
+
+
+def load_extent(config_file=CONFIG_FILE):
+    extent = load_config(config_file).get('extent')
+    return list(extent) if extent and len(extent) == 4 else list(DEFAULT_EXTENT)
+
+
+def save_extent(extent, config_file=CONFIG_FILE):
+    """Ghi extent vào map_config.json (giữ các khóa khác, chuyển dạng cũ sang JSON)."""
+    config = load_config(config_file)
+    config['extent'] = [float(v) for v in extent]
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
@@ -0,0 +1,235 @@
+### TỐI ƯU THỨ TỰ ĐI QUA CÁC MỤC TIÊU (TSP CÓ HƯỚNG TRÊN BẢNG ĐƯỜNG ĐI) ###
+#
+# Đầu vào: node xuất phát + tập node bắt buộc (không thứ tự) + (tùy chọn) node kết thúc.
+# Chi phí giữa 2 mục tiêu lấy thẳng từ ma trận all-pairs của route_table (thời gian theo
+# mô hình trọng số có tính khúc cua) -> không phải tìm đường lại khi thử thứ tự.
+#   <= HELD_KARP_MAX mục tiêu: quy hoạch động Held-Karp (tối ưu chính xác), vector hóa theo
+#                              từng lớp tập con.
+#   lớn hơn:                   láng giềng gần nhất + 2-opt + Or-opt (chi phí bất đối xứng:
+#                              đoạn bị đảo chiều được tính lại bằng tổng tiền tố chiều ngược).
+# Luôn có lời giải hợp lệ ngay từ đầu (láng giềng gần nhất); phần thời gian còn lại dùng
+# để xáo trộn + tìm kiếm cục bộ lại (iterated local search). Dừng đúng hạn time_budget và
+# trả về lời giải tốt nhất đã có.
+#
+#   python mission_order.py <start> <mục tiêu 1> <mục tiêu 2> ... [--end <node>] [--budget giây]
+
+import time
+
+import numpy as np
+
+from instrument import traced
+from map_cache import GRAPH_FILE
+from route_table import load_route_table
+
+# --- CẤU HÌNH ---
+HELD_KARP_MAX = 15     # số mục tiêu tối đa giải chính xác (2^k * k^2 phép tính)
+TIME_BUDGET = 0.5      # giây
+OR_OPT_MAX = 3         # độ dài đoạn tối đa được di chuyển trong Or-opt
+UNREACHABLE = 1e9      # thay cho inf trong ma trận (tránh inf - inf khi tính delta)
+
+
+def held_karp(c0, C, c_end, deadline):
+    """Thứ tự tối ưu qua k mục tiêu. c0[j]: start -> j, C[i, j]: i -> j, c_end[j]: j -> end.
+
+    -> (thứ tự, chi phí) hoặc None nếu hết thời gian.
+    """
+    k = len(c0)
+    full = (1 << k) - 1
+    dp = np.full((1 << k, k), np.inf)
+    parent = np.full((1 << k, k), -1, dtype=np.int8)
+    bits = 1 << np.arange(k)
+    dp[bits, np.arange(k)] = c0
+    masks = np.arange(1 << k)
+    popcount = np.zeros(1 << k, dtype=np.int64)
+    for b in bits:
+        popcount += (masks & b) > 0
+    for size in range(2, k + 1):
+        if time.perf_counter() > deadline:
+            return None
+        layer = masks[popcount == size]
+        for j in range(k):
+            m = layer[(layer & bits[j]) > 0]
+            cand = dp[m ^ bits[j]] + C[:, j]          # (số tập, k): đi từ i (cuối tập con) sang j
+            best = np.argmin(cand, axis=1)
+            dp[m, j] = cand[np.arange(len(m)), best]
+            parent[m, j] = best
+    total = dp[full] + c_end
+    j = int(np.argmin(total))
+    order, mask = [], full
+    while j >= 0:
+        order.append(j)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    return order[::-1], float(total.min())
+
+
+def _tour_cost(D, tour):
+    t = np.asarray(tour)
+    return float(D[t[:-1], t[1:]].sum())
+
+
+def nearest_neighbor(D, start, targets, end):
+    tour, left = [start], list(targets)
+    while left:
+        j = min(left, key=lambda t: D[tour[-1], t])
+        tour.append(j)
+        left.remove(j)
+    return tour + ([end] if end is not None else [])
+
+
+def two_opt(D, tour, fixed_end, deadline):
+    """Đảo đoạn tour[i..j] (đồ thị có hướng: cộng lại chi phí đoạn theo chiều ngược)."""
+    improved = True
+    last = len(tour) - 1 if fixed_end else len(tour)   # không đụng node kết thúc cố định
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        t = np.asarray(tour)
+        fwd = np.concatenate([[0.0], np.cumsum(D[t[:-1], t[1:]])])   # fwd[b] - fwd[a]: a -> b
+        rev = np.concatenate([[0.0], np.cumsum(D[t[1:], t[:-1]])])   # đi ngược b -> a
+        n = len(t)
+        i, j = np.triu_indices(n, 1)
+        ok = (i >= 1) & (j < last)
+        i, j = i[ok], j[ok]
+        if len(i) == 0:
+            break
+        before = D[t[i - 1], t[i]] + (fwd[j] - fwd[i])
+        after = D[t[i - 1], t[j]] + (rev[j] - rev[i])
+        has_next = j + 1 < n
+        nxt = np.where(has_next, t[np.minimum(j + 1, n - 1)], 0)
+        before = before + np.where(has_next, D[t[j], nxt], 0.0)
+        after = after + np.where(has_next, D[t[i], nxt], 0.0)
+        delta = after - before
+        k = int(np.argmin(delta))
+        if delta[k] < -1e-9:
+            a, b = i[k], j[k]
+            tour[a:b + 1] = tour[a:b + 1][::-1]
+            improved = True
+    return tour
+
+
+def or_opt(D, tour, fixed_end, deadline):
+    """Dời một đoạn 1..OR_OPT_MAX node sang vị trí khác (giữ chiều)."""
+    improved = True
+    last = len(tour) - 1 if fixed_end else len(tour)
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for seg in range(1, OR_OPT_MAX + 1):
+            for a in range(1, last - seg + 1):
+                b = a + seg - 1                                  # đoạn tour[a..b]
+                t = np.asarray(tour)
+                p = t[a - 1]
+                q = t[b + 1] if b + 1 < len(t) else None
+                removed = D[p, t[a]] + (D[t[b], q] - D[p, q] if q is not None else 0.0)
+                rest = np.concatenate([t[:a], t[b + 1:]])
+                # chèn giữa rest[x] và rest[x+1] (hoặc cuối tour nếu không có node kết thúc)
+                x = np.arange(len(rest) - (1 if fixed_end else 0))
+                y_ok = x + 1 < len(rest)
+                y = rest[np.minimum(x + 1, len(rest) - 1)]
+                added = D[rest[x], t[a]] + np.where(y_ok, D[t[b], y] - D[rest[x], y], 0.0)
+                added[(x == a - 1)] = np.inf                      # vị trí cũ
+                k = int(np.argmin(added))
+                if added[k] - removed < -1e-9:
+                    segment = list(tour[a:b + 1])
+                    rest_list = tour[:a] + tour[b + 1:]
+                    tour[:] = rest_list[:k + 1] + segment + rest_list[k + 1:]
+                    improved = True
+                    break
+                if time.perf_counter() > deadline:
+                    return tour
+            if improved:
+                break
+    return tour
+
+
+def local_search(D, tour, fixed_end, deadline):
+    """2-opt rồi Or-opt, lặp lại tới khi không cải thiện được nữa."""
+    cost = _tour_cost(D, tour)
+    while time.perf_counter() < deadline:
+        tour = or_opt(D, two_opt(D, tour, fixed_end, deadline), fixed_end, deadline)
+        new_cost = _tour_cost(D, tour)
+        if new_cost >= cost - 1e-9:
+            break
+        cost = new_cost
+    return tour, cost
+
+
+def iterated_local_search(D, tour, fixed_end, deadline, seed=0):
+    """Tìm kiếm cục bộ, rồi dùng phần thời gian còn lại: xáo trộn kiểu double-bridge
+    lời giải tốt nhất và tìm kiếm cục bộ lại, giữ nếu tốt hơn."""
+    rng = np.random.default_rng(seed)
+    best, best_cost = local_search(D, list(tour), fixed_end, deadline)
+    lo, hi = 1, len(best) - (1 if fixed_end else 0)    # phần được phép xáo trộn
+    if hi - lo < 4:
+        return best
+    while time.perf_counter() < deadline:
+        a, b, c = np.sort(rng.choice(np.arange(lo + 1, hi), 3, replace=False))
+        cand = best[:lo] + best[b:c] + best[a:b] + best[lo:a] + best[c:]
+        cand, cost = local_search(D, cand, fixed_end, deadline)
+        if cost < best_cost - 1e-9:
+            best, best_cost = cand, cost
+    return best
+
+
+@traced("plan.mission_order")
+def optimize_mission(table, start, targets, end=None, time_budget=TIME_BUDGET):
+    """Thứ tự đi qua targets tốt nhất từ start (tới end nếu có).
+
+    -> dict 'order' (id mục tiêu theo thứ tự), 'cost' (s), 'path' (lộ trình node đầy đủ),
+       'method', 'optimal'; hoặc None nếu không có thứ tự nào đi được.
+    """
+    deadline = time.perf_counter() + time_budget
+    start = str(start)
+    end = str(end) if end is not None else None
+    targets = list(dict.fromkeys(str(t) for t in targets if str(t) not in (start, end)))
+    nodes = [start] + targets + ([end] if end is not None else [])
+    idx = np.array([table.index[n] for n in nodes])
+    D = table.dist[np.ix_(idx, idx)]
+    D = np.where(np.isfinite(D), D, UNREACHABLE)
+    k = len(targets)
+    t_ids = list(range(1, k + 1))
+    e = k + 1 if end is not None else None
+
+    # Lời giải ban đầu luôn có sẵn
+    tour = nearest_neighbor(D, 0, t_ids, e)
+    method, optimal = "nearest-neighbor", False
+    if 0 < k <= HELD_KARP_MAX:
+        c_end = D[1:k + 1, e] if e is not None else np.zeros(k)
+        res = held_karp(D[0, 1:k + 1], D[1:k + 1, 1:k + 1], c_end, deadline)
+        if res is not None:
+            tour = [0] + [j + 1 for j in res[0]] + ([e] if e is not None else [])
+            method, optimal = "held-karp", True
+    if not optimal and k > 1:
+        tour = iterated_local_search(D, tour, e is not None, deadline)
+        method = "2-opt+or-opt"
+
+    cost = _tour_cost(D, tour)
+    if cost >= UNREACHABLE:
+        print(f"LỖI: Không có thứ tự nào đi được qua mọi mục tiêu từ {start}!")
+        return None
+    stops = [nodes[i] for i in tour]
+    return {'order': stops[1:len(stops) - (1 if end is not None else 0)], 'cost': cost,
+            'path': table.plan(stops), 'method': method, 'optimal': optimal}
+
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    end = budget = None
+    if "--end" in args:
+        i = args.index("--end")
+        end = args[i + 1]
+        del args[i:i + 2]
+    if "--budget" in args:
+        i = args.index("--budget")
+        budget = float(args[i + 1])
+        del args[i:i + 2]
+    if len(args) < 2:
+        print("Cách dùng: python mission_order.py <start> <mục tiêu> ... [--end <node>] [--budget giây]")
+        sys.exit(1)
+
+    table = load_route_table(GRAPH_FILE)
+    t0 = time.perf_counter()
+    result = optimize_mission(table, args[0], args[1:], end, budget or TIME_BUDGET)
+    dt = time.perf_counter() - t0
+    if result:
+        print(f"-> Thứ tự tốt nhất ({result['method']}): {' -> '.join([args[0]] + result['order'])}")
+        print(f"-> Chi phí: {result['cost']:.2f} s | {len(result['path'])} node | {dt * 1000:.0f} ms")
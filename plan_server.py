@@ -0,0 +1,214 @@
+### DỊCH VỤ LẬP LỘ TRÌNH CHẠY NỀN (ASYNCIO) - GIỮ SẴN ĐỒ THỊ TRONG BỘ NHỚ ###
+#
+# Thay vì chạy navigation_test!.py cho mỗi lộ trình (import lại networkx/matplotlib, đọc lại
+# đồ thị, tính lại trọng số), daemon nạp bảng đường đi MỘT lần rồi phục vụ qua Unix socket
+# (hoặc TCP cục bộ). Giao thức: mỗi dòng một JSON.
+#   -> {"request_id": "r1", "waypoints": ["1", "89", "36", "67"]}
+#   <- {"request_id": "r1", "path": [...], "cost": 12.3, "latency_ms": 0.4}
+#   -> {"cmd": "stats"}
+#   <- {"requests": ..., "batches": ..., "mean_batch": ..., "p50_ms": ..., "p99_ms": ...}
+# Các yêu cầu đến gần như cùng lúc được gom thành lô (chờ thêm BATCH_WINDOW), trùng
+# waypoint thì chỉ tính một lần, và cả lô chạy trong một lần chuyển sang thread pool.
+#
+#   python plan_server.py [--tcp PORT]              # chạy daemon
+#   python plan_server.py --send requests.jsonl     # gửi thử một file yêu cầu rồi in stats
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from map_cache import GRAPH_FILE
+from route_table import iter_requests, load_route_table
+
+# --- CẤU HÌNH ---
+SOCKET_PATH = "/tmp/bfmc_planner.sock"
+HOST = "127.0.0.1"
+BATCH_WINDOW = 0.0       # giây - chờ gom thêm sau yêu cầu đầu tiên của lô (0 = chỉ gom yêu cầu đã tới)
+BATCH_MAX = 256          # số yêu cầu tối đa mỗi lô
+LATENCY_WINDOW = 10000   # số mẫu độ trễ gần nhất dùng để tính p50/p99
+LINE_LIMIT = 1 << 16     # byte - dòng yêu cầu dài hơn bị bỏ và trả lỗi (giới hạn của StreamReader)
+
+
+async def read_line(reader):
+    """Một dòng từ reader (b"" khi hết kết nối). Dòng dài quá giới hạn của reader bị đọc bỏ
+    tới hết '\n' và trả None (kết nối vẫn dùng tiếp được cho các dòng sau)."""
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:   # dòng cuối không có '\n'
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    while True:
+        await reader.readexactly(consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+
+class PlanService:
+    """Bảng đường đi trong bộ nhớ + hàng đợi gom lô + thống kê độ trễ."""
+
+    def __init__(self, graph_file=GRAPH_FILE):
+        self.table = load_route_table(graph_file)
+        self.queue = asyncio.Queue()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.n_requests = 0
+        self.n_batches = 0
+
+    def plan_batch(self, waypoint_lists):
+        """Lập lộ trình cho cả lô (chạy trong thread pool), trùng waypoint tính 1 lần."""
+        results = {}
+        for key in waypoint_lists:
+            if key in results:
+                continue
+            nid = self.table.missing(key)
+            if nid is not None:
+                results[key] = {'error': f"không có node {nid}"}
+                continue
+            path = self.table.plan(list(key), verbose=False)
+            if path is None:
+                results[key] = {'error': "không tìm thấy đường"}
+            else:
+                results[key] = {'path': path, 'cost': self.table.cost(list(key))}
+        return [results[key] for key in waypoint_lists]
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(BATCH_WINDOW)   # 0: chỉ nhường 1 vòng lặp cho các yêu cầu đã đọc
+            while len(batch) < BATCH_MAX and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            keys = [item[0] for item in batch]
+            try:
+                results = await loop.run_in_executor(None, self.plan_batch, keys)
+            except Exception as e:   # lỗi bất ngờ: trả lỗi cho cả lô, daemon vẫn chạy tiếp
+                results = [{'error': str(e)}] * len(batch)
+            self.n_batches += 1
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def plan(self, waypoints):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((tuple(str(w) for w in waypoints), future))
+        return await future
+
+    def stats(self):
+        lat = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {'requests': self.n_requests, 'batches': self.n_batches,
+                'mean_batch': round(self.n_requests / max(self.n_batches, 1), 2),
+                'p50_ms': round(float(np.percentile(lat, 50)), 3),
+                'p99_ms': round(float(np.percentile(lat, 99)), 3)}
+
+    async def handle(self, reader, writer):
+        """Một kết nối: đọc từng dòng, trả lời theo thứ tự hoàn thành (kèm request_id)."""
+        lock = asyncio.Lock()
+
+        async def reply(obj):
+            async with lock:
+                writer.write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        async def serve(req, t0):
+            result = await self.plan(req['waypoints'])
+            latency = (time.perf_counter() - t0) * 1000
+            self.latencies.append(latency)
+            self.n_requests += 1
+            await reply({'request_id': req.get('request_id'), **result, 'latency_ms': round(latency, 3)})
+
+        tasks = set()
+        try:
+            while (line := await read_line(reader)) != b"":
+                t0 = time.perf_counter()
+                if line is None:
+                    await reply({'error': f"dòng yêu cầu dài quá {LINE_LIMIT} byte"})
+                    continue
+                try:
+                    req = json.loads(line)
+                except json.JSONDecodeError:
+                    await reply({'error': "JSON không hợp lệ"})
+                    continue
+                if not isinstance(req, dict):
+                    await reply({'error': "yêu cầu phải là một object JSON"})
+                    continue
+                if req.get('cmd') == 'stats':
+                    await reply(self.stats())
+                elif isinstance(req.get('waypoints'), list) and len(req['waypoints']) >= 1:
+                    task = asyncio.create_task(serve(req, t0))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    await reply({'request_id': req.get('request_id'), 'error': "thiếu 'waypoints'"})
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def run_server(graph_file=GRAPH_FILE, port=None, socket_path=SOCKET_PATH):
+    service = PlanService(graph_file)
+    batcher = asyncio.create_task(service.batcher())
+    if port is None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(service.handle, path=socket_path, limit=LINE_LIMIT)
+        where = socket_path
+    else:
+        server = await asyncio.start_server(service.handle, HOST, port, limit=LINE_LIMIT)
+        where = f"{HOST}:{port}"
+    print(f"✅ Daemon lập lộ trình đang chạy tại {where} ({len(service.table.ids)} node)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+async def send_requests(requests, port=None, socket_path=SOCKET_PATH):
+    """Client thử: gửi tất cả yêu cầu trên một kết nối, nhận đủ câu trả lời, rồi hỏi stats."""
+    if port is None:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    else:
+        reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(b"".join((json.dumps(r) + "\n").encode("utf-8") for r in requests))
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in requests]
+    writer.write(b'{"cmd": "stats"}\n')
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return responses, stats
+
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    port = int(args[args.index("--tcp") + 1]) if "--tcp" in args else None
+    if "--send" in args:
+        reqs = []
+        for r in iter_requests(args[args.index("--send") + 1]):
+            if 'error' in r:
+                print(f"-> {r['request_id']}: ❌ {r['error']} (không gửi)")
+            else:
+                reqs.append(r)
+        responses, stats = asyncio.run(send_requests(reqs, port))
+        for r in responses:
+            status = f"{r['cost']:.2f}s, {len(r['path'])} node" if 'path' in r else f"❌ {r.get('error')}"
+            print(f"-> {r.get('request_id')}: {status} ({r.get('latency_ms', 0):.2f} ms)")
+        print(f"-> Stats: {stats}")
+    else:
+        try:
+            asyncio.run(run_server(port=port))
+        except KeyboardInterrupt:
+            print("Đã dừng daemon.")
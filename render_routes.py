@@ -0,0 +1,126 @@
+### VẼ LỘ TRÌNH HÀNG LOẠT KHÔNG CẦN MÀN HÌNH (HEADLESS) ###
+#
+# Ảnh nền + lớp mạng lưới tĩnh chỉ vẽ MỘT lần rồi chụp lại (copy_from_bbox).
+# Mỗi lộ trình: khôi phục nền đã chụp, vẽ đè 1 LineCollection + các waypoint, ghi PNG.
+# Nhiều lộ trình được chia cho một pool tiến trình, mỗi tiến trình giữ renderer riêng.
+#
+#   python render_routes.py <thư mục *.json | file .jsonl> [thư mục ra] [số tiến trình]
+# Mỗi yêu cầu: {"request_id": "...", "waypoints": ["1", "89", "36", "67"]}
+
+import os
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import matplotlib.image as mpimg
+from matplotlib.collections import LineCollection
+import numpy as np
+
+from instrument import traced
+from map_cache import GRAPH_FILE, load_map
+from map_config import IMG_FILE, load_extent
+from route_table import iter_requests, load_route_table
+
+# --- CẤU HÌNH ---
+OUTPUT_DIR = "route_renders"
+FIGSIZE = (15, 10)
+DPI = 80
+PNG_COMPRESS = 1   # zlib level: mã hóa PNG là phần tốn nhất, 1 nhanh hơn mặc định (6) vài lần
+
+
+class RouteRenderer:
+    """Figure Agg dựng sẵn ảnh nền + mạng lưới; mỗi lần render chỉ vẽ phần lộ trình."""
+
+    def __init__(self, track, img_file=IMG_FILE, extent=None):
+        self.track = track
+        self.xy = np.asarray(track.xy)
+        self.fig, self.ax = plt.subplots(figsize=FIGSIZE, dpi=DPI)
+        ax = self.ax
+
+        # Layer 0: Ảnh nền
+        if os.path.exists(img_file):
+            ax.imshow(mpimg.imread(img_file), extent=extent or load_extent(), aspect='auto')
+
+        # Layer 1: Toàn bộ mạng lưới (một LineCollection thay vì nx.draw_networkx_edges)
+        segs = np.stack([self.xy[track.edge_src], self.xy[track.indices]], axis=1)
+        ax.add_collection(LineCollection(segs, colors='white', linewidths=0.5, alpha=0.15))
+        ax.scatter(self.xy[:, 0], self.xy[:, 1], s=2, c='gray', alpha=0.3)
+        ax.axis('off')
+        ax.set_autoscale_on(False)   # lớp vẽ đè không được làm đổi khung nhìn đã chụp
+        self.fig.tight_layout()
+
+        # Chụp lại nền tĩnh một lần
+        self.fig.canvas.draw()
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    @traced("render.route")
+    def render(self, full_path, points_list, out_file):
+        """Vẽ lộ trình lên nền đã cache và ghi ra PNG."""
+        canvas, ax = self.fig.canvas, self.ax
+        canvas.restore_region(self.background)
+        idx = [self.track.node(n) for n in full_path]
+        wp = [self.track.node(n) for n in points_list]
+
+        # Layer 2: Lộ trình (1 artist duy nhất) + node trên đường
+        route = LineCollection([self.xy[idx]], colors='#ff3300', linewidths=3)
+        nodes = ax.scatter(self.xy[idx, 0], self.xy[idx, 1], s=10, c='yellow', zorder=3)
+        # Layer 3: Waypoints
+        marks = ax.scatter(self.xy[wp, 0], self.xy[wp, 1], s=80, c='cyan', edgecolors='white', zorder=4)
+        title = ax.text(0.5, 1.0, f"Waypoints: {' -> '.join(points_list)}", transform=ax.transAxes,
+                        ha='center', va='top', color='white', backgroundcolor='black')
+        ax.add_collection(route)
+        for artist in (route, nodes, marks, title):
+            ax.draw_artist(artist)
+            artist.remove()
+
+        mpimg.imsave(out_file, np.asarray(canvas.buffer_rgba()), pil_kwargs={'compress_level': PNG_COMPRESS})
+
+
+# ================= BATCH SONG SONG =================
+_worker = {}
+
+def _init_worker(graph_file, img_file):
+    track, _ = load_map(graph_file)
+    _worker['renderer'] = RouteRenderer(track, img_file)
+    _worker['table'] = load_route_table(graph_file)
+
+def _render_one(job):
+    request_id, waypoints, out_file = job
+    full_path = _worker['table'].plan(waypoints)
+    if full_path is None:
+        return request_id, None
+    _worker['renderer'].render(full_path, waypoints, out_file)
+    return request_id, out_file
+
+
+def render_batch(request_path, out_dir=OUTPUT_DIR, workers=None,
+                 graph_file=GRAPH_FILE, img_file=IMG_FILE):
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Biên dịch cache/bảng đường đi ở tiến trình chính trước, để các worker chỉ việc mmap
+    load_route_table(graph_file)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = []
+    for r in iter_requests(request_path):
+        if 'error' in r or not isinstance(r.get('waypoints'), list) or not r['waypoints']:
+            print(f"⚠️ {r['request_id']}: {r.get('error', 'thiếu waypoints')}, bỏ qua")
+            continue
+        jobs.append((str(r['request_id']), [str(w) for w in r['waypoints']],
+                     os.path.join(out_dir, f"{r['request_id']}.png")))
+    done = 0
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(graph_file, img_file)) as pool:
+        for request_id, out_file in pool.map(_render_one, jobs, chunksize=8):
+            if out_file is None:
+                print(f"⚠️ {request_id}: không tìm được lộ trình, bỏ qua")
+            else:
+                done += 1
+    print(f"✅ Đã vẽ {done}/{len(jobs)} lộ trình vào {out_dir}/")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("Cách dùng: python render_routes.py <thư mục | file.jsonl> [thư mục ra] [số tiến trình]")
+        sys.exit(1)
+    render_batch(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else OUTPUT_DIR,
+                 int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -0,0 +1,313 @@
+### LẤY MẪU LẠI ĐỒ THỊ: LÀM DÀY CẠNH DÀI / GỘP CHUỖI NODE THẲNG HÀNG ###
+#
+# Khoảng cách node trong map vẽ tay dao động từ vài cm tới gần 0.5 m:
+#   densify:  chèn node trên cạnh dài để mọi cạnh <= spacing (bộ 3 điểm đều nhau -> bán kính
+#             cong / góc lái ổn định hơn, quỹ đạo điều khiển mịn hơn). Hai chiều của cùng một
+#             đoạn đường dùng chung node chèn. Id mới: "<u>_<v>_<k>" (u, v là 2 đầu đoạn gốc).
+#   simplify: gộp chuỗi node bậc 2 gần thẳng hàng (góc rẽ <= COLLINEAR_ANGLE, lệch khỏi dây
+#             cung <= MAX_DEVIATION) thành 1 cạnh -> đồ thị nhỏ hơn cho bộ lập lộ trình.
+#             Giữ nguyên node giao lộ, node cụt và mọi node trong keep (vd. waypoint).
+#             Cạnh gộp ghi độ dài = tổng độ dài chuỗi gốc (key "length"), không phải dây cung.
+#             Chi phí rẽ thì vẫn tính lại theo node láng giềng mới (vận tốc cả cạnh theo khúc
+#             cua cuối cạnh, bán kính qua 3 node) -> chi phí lộ trình giữa các node giữ lại
+#             lệch so với đồ thị gốc dù expand_path cho cùng dãy node. Cả hai chế độ đều in
+#             độ lệch này (cost_drift) để biết đồ thị mới còn dùng được cho bộ lập lộ trình không.
+# Cả hai đều ghi kèm file ánh xạ <file ra>.resample.json về id gốc:
+#   "inserted": {id mới: [u, v, t]}   node chèn nằm ở u + t * (v - u)
+#   "chains":   {"u->v": [u, ..., v]} cạnh gộp đi qua các node gốc này
+# -> expand_path() đổi lộ trình trên đồ thị rút gọn về dãy node gốc để vẽ / điều khiển.
+#
+#   python resample_graph.py densify  [file vào] [file ra] [--spacing m]
+#   python resample_graph.py simplify [file vào] [file ra] [--keep id1,id2,...]
+
+import json
+import os
+
+import numpy as np
+
+from edge_weights import build_search_graph, edge_lengths, turn_angles
+from extract_nodes import write_track
+from map_cache import GRAPH_FILE
+from route_table import dijkstra
+from track_graph import TrackGraph, build_csr, load_track
+
+# --- CẤU HÌNH ---
+TARGET_SPACING = 0.10    # m - khoảng cách node tối đa sau khi làm dày
+COLLINEAR_ANGLE = 3      # độ - góc rẽ tối đa tại node được gộp
+MAX_DEVIATION = 0.01     # m - node bị gộp cách dây cung của cạnh mới không quá chừng này
+MAPPING_EXT = ".resample.json"
+DRIFT_SOURCES = 40       # số node nguồn lấy mẫu khi so chi phí lộ trình trước / sau
+
+
+# ================= LÀM DÀY =================
+def densify(track, spacing=TARGET_SPACING):
+    """Chia cạnh dài hơn spacing thành các đoạn bằng nhau. -> (TrackGraph, {id mới: (u, v, t)})."""
+    N = track.n_nodes
+    xy = np.asarray(track.xy, dtype=np.float64)
+    src, dst = np.asarray(track.edge_src, dtype=np.int64), np.asarray(track.indices, dtype=np.int64)
+    # Đoạn đường không hướng: u -> v và v -> u dùng chung node chèn
+    lo, hi = np.minimum(src, dst), np.maximum(src, dst)
+    pair_key, pair = np.unique(lo * N + hi, return_inverse=True)
+    p_lo, p_hi = pair_key // N, pair_key % N
+    p_len = np.hypot(*(xy[p_hi] - xy[p_lo]).T)
+    n_seg = np.maximum(1, np.ceil(p_len / spacing - 1e-9)).astype(np.int64)
+    n_new = n_seg - 1
+    first = N + np.cumsum(n_new) - n_new          # index node chèn đầu tiên của mỗi đoạn
+
+    # Node chèn
+    p_of = np.repeat(np.arange(len(n_seg)), n_new)
+    k = np.arange(n_new.sum()) - np.repeat(first - N, n_new) + 1
+    t = k / n_seg[p_of]
+    new_xy = xy[p_lo[p_of]] + t[:, None] * (xy[p_hi[p_of]] - xy[p_lo[p_of]])
+    ids = track.ids
+    new_ids = [f"{ids[a]}_{ids[b]}_{j}" for a, b, j in zip(p_lo[p_of].tolist(), p_hi[p_of].tolist(), k.tolist())]
+    clash = set(new_ids) & set(ids)
+    if clash:
+        raise ValueError(f"Id node chèn trùng id có sẵn: {sorted(clash)[:5]}")
+    inserted = {nid: (ids[a], ids[b], round(float(tt), 6))
+                for nid, a, b, tt in zip(new_ids, p_lo[p_of].tolist(), p_hi[p_of].tolist(), t)}
+
+    # Cạnh con: node thứ j trên đoạn (0 = lo, n_seg = hi), đi ngược nếu cạnh gốc là hi -> lo
+    def node_at(p, j):
+        return np.where(j == 0, p_lo[p], np.where(j == n_seg[p], p_hi[p], first[p] + j - 1))
+
+    e_seg = n_seg[pair]
+    e = np.repeat(np.arange(len(src)), e_seg)
+    i = np.arange(e_seg.sum()) - np.repeat(np.cumsum(e_seg) - e_seg, e_seg)
+    p = pair[e]
+    fwd = src[e] == p_lo[p]
+    a = np.where(fwd, i, n_seg[p] - i)
+    b = np.where(fwd, i + 1, n_seg[p] - i - 1)
+    indptr, indices, dotted, length = build_csr(N + len(new_ids), node_at(p, a), node_at(p, b),
+                                                np.asarray(track.dotted)[e], (edge_lengths(track) / e_seg)[e])
+    out = TrackGraph(list(ids) + new_ids, np.vstack([xy, new_xy]), indptr, indices, dotted,
+                     length=length if track.length is not None else None)
+    return out, inserted
+
+
+# ================= GỘP CHUỖI THẲNG HÀNG =================
+def _through_nodes(track, angle_tol, keep):
+    """Node có thể gộp: đúng 2 láng giềng a, b; đi qua được theo đúng các chiều a <-> b
+    (a->v có khi và chỉ khi v->b có, tương tự chiều ngược), gần thẳng, cùng cờ nét đứt.
+    -> (mask, láng giềng (N, 2))."""
+    N = track.n_nodes
+    xy = np.asarray(track.xy, dtype=np.float64)
+    src, dst = track.edge_src.tolist(), track.indices.tolist()
+    dotted = track.dotted.tolist()
+    out_e = [dict() for _ in range(N)]   # v -> {đích: dotted}
+    in_e = [dict() for _ in range(N)]
+    for u, v, d in zip(src, dst, dotted):
+        out_e[u][v] = d
+        in_e[v][u] = d
+    ok = np.zeros(N, dtype=bool)
+    nbr = np.full((N, 2), -1, dtype=np.int64)
+    for v in range(N):
+        if track.ids[v] in keep:
+            continue
+        around = set(out_e[v]) | set(in_e[v])
+        if len(around) != 2 or v in around:
+            continue
+        a, b = sorted(around)
+        if ((a in in_e[v]) != (b in out_e[v])) or ((b in in_e[v]) != (a in out_e[v])):
+            continue
+        if a in in_e[v] and in_e[v][a] != out_e[v][b]:
+            continue
+        if b in in_e[v] and in_e[v][b] != out_e[v][a]:
+            continue
+        ok[v] = True
+        nbr[v] = a, b
+    cand = np.flatnonzero(ok)
+    if len(cand):
+        angle = turn_angles(xy, nbr[cand, 0], cand, nbr[cand, 1])
+        ok[cand[angle > angle_tol]] = False
+    return ok, nbr
+
+
+def _chord_deviation(xy, chain):
+    a, b = xy[chain[0]], xy[chain[-1]]
+    ab = b - a
+    norm = np.hypot(*ab)
+    if norm == 0:
+        return np.inf
+    p = xy[chain[1:-1]] - a
+    return float(np.max(np.abs(p[:, 0] * ab[1] - p[:, 1] * ab[0])) / norm) if len(chain) > 2 else 0.0
+
+
+def simplify(track, angle_tol=COLLINEAR_ANGLE, max_deviation=MAX_DEVIATION, keep=()):
+    """Gộp chuỗi node thẳng hàng. -> (TrackGraph, {(u, v): [id gốc dọc cạnh gộp]})."""
+    keep = set(str(k) for k in keep)
+    xy = np.asarray(track.xy, dtype=np.float64)
+    through, nbr = _through_nodes(track, angle_tol, keep)
+
+    # 1. Theo từng chuỗi không hướng: giữ lại thêm node để dây cung không lệch quá max_deviation
+    #    và để 2 chuỗi song song không thành 2 cạnh trùng nhau (quyết định trên chuỗi không
+    #    hướng -> hai chiều của con đường luôn được gộp giống nhau)
+    seen = np.zeros(track.n_nodes, dtype=bool)
+    pred_ptr, preds = build_csr(track.n_nodes, track.indices, track.edge_src)
+    used = {frozenset(p) for p in zip(track.edge_src.tolist(), track.indices.tolist())}
+
+    def split_chain(chain):
+        cuts, start = [0], 0
+        for j in range(2, len(chain)):
+            if _chord_deviation(xy, chain[start:j + 1]) > max_deviation:
+                cuts.append(j - 1)
+                start = j - 1
+        cuts.append(len(chain) - 1)
+        pieces = list(zip(cuts, cuts[1:]))
+        while pieces:
+            a, b = pieces.pop()
+            if b - a < 2:
+                continue
+            key = frozenset((chain[a], chain[b]))
+            if len(key) == 1 or key in used:
+                mid = (a + b) // 2
+                through[chain[mid]] = False
+                pieces += [(a, mid), (mid, b)]
+            else:
+                used.add(key)
+        for j in cuts[1:-1]:
+            through[chain[j]] = False
+
+    def walk(prev, v):
+        chain = [prev]
+        while through[v] and not seen[v]:
+            seen[v] = True
+            chain.append(v)
+            a, b = nbr[v]
+            prev, v = v, (b if a == prev else a)
+        chain.append(v)
+        return chain
+
+    for u in np.flatnonzero(~through):
+        around = set(track.successors(u).tolist()) | set(preds[pred_ptr[u]:pred_ptr[u + 1]].tolist())
+        for w in around:
+            if through[w] and not seen[w]:
+                split_chain(walk(u, w))
+    for v in np.flatnonzero(through & ~seen):   # vòng kín chỉ gồm node gộp được
+        if not seen[v]:
+            through[v] = False
+            split_chain(walk(v, nbr[v][0]))
+
+    # 2. Đi theo chiều cạnh từ mỗi node giữ lại, gộp tới node giữ lại kế tiếp
+    kept = np.flatnonzero(~through)
+    new_index = np.full(track.n_nodes, -1, dtype=np.int64)
+    new_index[kept] = np.arange(len(kept))
+    ids = track.ids
+    lengths = edge_lengths(track)
+    src, dst, dotted, length, chains = [], [], [], [], {}
+    for u in kept.tolist():
+        for e in track.out_edges(u):
+            prev, v = u, int(track.indices[e])
+            chain, dist = [u], lengths[e]
+            while through[v]:
+                chain.append(v)
+                a, b = nbr[v]
+                prev, v = v, int(b if a == prev else a)
+                dist += lengths[track.edge_index(prev, v)]
+            chain.append(v)
+            src.append(new_index[u])
+            dst.append(new_index[v])
+            dotted.append(bool(track.dotted[e]))
+            length.append(dist)
+            if len(chain) > 2:
+                chains[(ids[u], ids[v])] = [ids[i] for i in chain]
+    indptr, indices, dotted, length = build_csr(len(kept), src, dst, np.array(dotted, dtype=bool),
+                                                np.array(length, dtype=np.float64))
+    out = TrackGraph([ids[i] for i in kept], xy[kept], indptr, indices, dotted, length=length)
+    return out, chains
+
+
+def expand_path(path, chains):
+    """Lộ trình trên đồ thị rút gọn (list id) -> dãy id node gốc đầy đủ."""
+    if not path:
+        return path
+    full = [path[0]]
+    for u, v in zip(path, path[1:]):
+        full.extend(chains.get((u, v), [u, v])[1:])
+    return full
+
+
+# ================= ĐỘ LỆCH CHI PHÍ LỘ TRÌNH =================
+def cost_drift(before, after, n_sources=DRIFT_SOURCES, seed=0):
+    """So chi phí lộ trình (s) giữa các node có ở cả 2 đồ thị, từ n_sources node nguồn ngẫu nhiên.
+
+    -> dict 'pairs', 'max_abs' (s), 'max_rel', 'mean' (s, dương = đồ thị mới chậm hơn) và
+       'reach_changed' (số cặp đổi trạng thái đi được / không đi được).
+    """
+    common = [nid for nid in after.ids if nid in before.index]
+    ia = np.array([before.node(n) for n in common])
+    ib = np.array([after.node(n) for n in common])
+    sources = np.random.default_rng(seed).permutation(len(common))[:n_sources]
+    tables = []
+    for graph, idx in ((build_search_graph(before), ia), (build_search_graph(after), ib)):
+        csr = graph.indptr.tolist(), graph.indices.tolist(), graph.weights.tolist()
+        goals = graph.goal_vertex(idx)
+        rows = np.array([dijkstra(*csr, graph.start_vertex(idx[s]))[0][goals] for s in sources])
+        rows[np.arange(len(sources)), sources] = np.nan    # bỏ cặp (s, s)
+        tables.append(rows)
+    da, db = tables
+    reach_changed = int((np.isfinite(da) != np.isfinite(db)).sum())
+    ok = np.isfinite(da) & np.isfinite(db) & (da > 0)
+    d = db[ok] - da[ok]
+    rel = np.abs(d) / da[ok]
+    return {'pairs': int(ok.sum()), 'max_abs': float(np.abs(d).max(initial=0.0)),
+            'max_rel': float(rel.max(initial=0.0)), 'mean': float(d.mean()) if len(d) else 0.0,
+            'reach_changed': reach_changed}
+
+
+# ================= FILE ÁNH XẠ =================
+def save_mapping(output_file, inserted=None, chains=None, **params):
+    mapping = {'params': params, 'inserted': inserted or {},
+               'chains': {f"{u}->{v}": c for (u, v), c in (chains or {}).items()}}
+    path = os.path.splitext(output_file)[0] + MAPPING_EXT
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(mapping, f, ensure_ascii=False)
+    return path
+
+
+def load_mapping(output_file):
+    """-> (inserted, chains) từ file ánh xạ đi kèm output_file."""
+    with open(os.path.splitext(output_file)[0] + MAPPING_EXT, encoding="utf-8") as f:
+        mapping = json.load(f)
+    chains = {tuple(k.split("->", 1)): c for k, c in mapping['chains'].items()}
+    return mapping['inserted'], chains
+
+
+if __name__ == "__main__":
+    import sys
+    args = sys.argv[1:]
+    opts = {}
+    for flag in ("--spacing", "--keep"):
+        if flag in args:
+            i = args.index(flag)
+            opts[flag] = args[i + 1]
+            del args[i:i + 2]
+    if not args or args[0] not in ("densify", "simplify"):
+        print("Cách dùng: python resample_graph.py densify|simplify [file vào] [file ra] "
+              "[--spacing m] [--keep id1,id2]")
+        sys.exit(1)
+    mode = args[0]
+    input_file = args[1] if len(args) > 1 else GRAPH_FILE
+    suffix = "_DENSE" if mode == "densify" else "_SIMPLE"
+    output_file = args[2] if len(args) > 2 else os.path.splitext(input_file)[0] + suffix + ".graphml"
+
+    track = load_track(input_file)
+    before = edge_lengths(track)
+    if mode == "densify":
+        spacing = float(opts.get("--spacing", TARGET_SPACING))
+        result, inserted = densify(track, spacing)
+        mapping = save_mapping(output_file, inserted=inserted, spacing=spacing)
+    else:
+        keep = opts["--keep"].split(",") if "--keep" in opts else ()
+        result, chains = simplify(track, keep=keep)
+        mapping = save_mapping(output_file, chains=chains, angle_tol=COLLINEAR_ANGLE,
+                               max_deviation=MAX_DEVIATION, keep=list(keep))
+    write_track(result, output_file)
+    after = edge_lengths(result)
+    print(f"-> {track.n_nodes} nodes / {track.n_edges} edges  ->  {result.n_nodes} nodes / {result.n_edges} edges")
+    print(f"-> Độ dài cạnh: {before.min():.3f}..{before.max():.3f} m  ->  {after.min():.3f}..{after.max():.3f} m")
+    drift = cost_drift(track, result)
+    print(f"-> Chi phí lộ trình giữa node giữ lại ({drift['pairs']} cặp): lệch tối đa "
+          f"{drift['max_abs']:.3f} s ({drift['max_rel']:.1%}), trung bình {drift['mean']:+.3f} s"
+          + (f", {drift['reach_changed']} cặp đổi khả năng đi tới" if drift['reach_changed'] else ""))
+    print(f"✅ Đã ghi {output_file} (ánh xạ id gốc: {mapping})")
@@ -0,0 +1,187 @@
+### BẢNG ĐƯỜNG ĐI TÍNH SẴN (ALL-PAIRS) - TRA CỨU LỘ TRÌNH TỨC THÌ ###
+#
+# Chạy offline:  python route_table.py [file.graphml]
+# Khi chạy trên xe chỉ cần load_route_table(...).plan(["1", "89", "36", "67"])
+
+import heapq
+import json
+import os
+import numpy as np
+
+from instrument import traced
+from map_cache import GRAPH_FILE, file_sha256, load_map
+from edge_weights import weight_model
+
+# --- CẤU HÌNH ---
+TABLE_EXT = ".routes.npz"
+TABLE_VERSION = 3
+
+
+def dijkstra(indptr, indices, weights, source):
+    """Dijkstra một nguồn trên CSR -> (dist, pred). pred = -1 nếu không có đường."""
+    n = len(indptr) - 1
+    dist = np.full(n, np.inf)
+    pred = np.full(n, -1, dtype=np.int32)
+    done = np.zeros(n, dtype=bool)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]: continue
+        done[u] = True
+        for e in range(indptr[u], indptr[u + 1]):
+            v = indices[e]
+            nd = d + weights[e]
+            if nd < dist[v]:
+                dist[v] = nd
+                pred[v] = u
+                heapq.heappush(heap, (nd, v))
+    return dist, pred
+
+
+@traced("weight.route_table")
+def build_tables(graph):
+    """Dijkstra từ cổng xuất phát của mọi node trên SearchGraph.
+
+    -> ma trận chi phí node-node (N, N) và ma trận predecessor theo đỉnh (N, V).
+    """
+    n = graph.n_nodes
+    # Đổi sang list Python một lần: vòng lặp Dijkstra nhanh hơn nhiều so với index mảng numpy
+    indptr, indices, w = graph.indptr.tolist(), graph.indices.tolist(), graph.weights.tolist()
+    goals = graph.goal_vertex(np.arange(n))
+    dist = np.empty((n, n))
+    pred = np.empty((n, graph.n_vertices), dtype=np.int32)
+    for s in range(n):
+        d, pred[s] = dijkstra(indptr, indices, w, graph.start_vertex(s))
+        dist[s] = d[goals]
+    np.fill_diagonal(dist, 0.0)
+    return dist, pred
+
+
+class RouteTable:
+    """Ma trận chi phí + ma trận predecessor, trả lời truy vấn bằng tra bảng."""
+
+    def __init__(self, ids, dist, pred, edge_dst):
+        self.ids = list(ids)
+        self.index = {nid: i for i, nid in enumerate(self.ids)}
+        self.dist = dist
+        self.pred = pred
+        self.edge_dst = edge_dst   # node đích của từng trạng thái-cạnh (kể cả link chuyển làn)
+
+    def node_path(self, s, t):
+        """Dãy index node từ s đến t (None nếu không có đường)."""
+        if s == t:
+            return [s]
+        if not np.isfinite(self.dist[s, t]):
+            return None
+        E, N = len(self.edge_dst), len(self.ids)
+        pred_row = self.pred[s]
+        # Lần ngược từ cổng đích T_t về cổng xuất phát S_s, chỉ giữ các trạng thái-cạnh
+        path = []
+        v = int(pred_row[E + N + t])
+        while v < E:
+            path.append(int(self.edge_dst[v]))
+            v = int(pred_row[v])
+        path.append(s)
+        path.reverse()
+        return path
+
+    def cost(self, points_list):
+        """Tổng chi phí (giây) qua danh sách waypoint, inf nếu có đoạn không đi được."""
+        idx = [self.index[str(p)] for p in points_list]
+        return float(sum(self.dist[a, b] for a, b in zip(idx, idx[1:])))
+
+    def missing(self, points_list):
+        """Waypoint đầu tiên không có trong bản đồ (None nếu có đủ)."""
+        return next((str(p) for p in points_list if str(p) not in self.index), None)
+
+    @traced("plan.table")
+    def plan(self, points_list, verbose=True):
+        """Ghép lộ trình qua các waypoint -> list id node, giống full_path của navigation_test.
+
+        None nếu có waypoint không có trong bản đồ hoặc có đoạn không đi được.
+        """
+        nid = self.missing(points_list)
+        if nid is not None:
+            if verbose:
+                print(f"LỖI: Không có node {nid} trong bản đồ!")
+            return None
+        idx = [self.index[str(p)] for p in points_list]
+        full_path = [self.ids[i] for i in idx[:1]]
+        for s, t in zip(idx, idx[1:]):
+            segment = self.node_path(s, t)
+            if segment is None:
+                if verbose:
+                    print(f"LỖI: Không tìm thấy đường từ {self.ids[s]} đến {self.ids[t]}!")
+                return None
+            full_path.extend(self.ids[j] for j in segment[1:])
+        return full_path
+
+
+def default_table_path(graph_file):
+    return os.path.splitext(graph_file)[0] + TABLE_EXT
+
+
+def save_route_table(graph_file, table_file=None):
+    """Chế độ offline: tính bảng all-pairs và lưu cùng hash của GraphML."""
+    table_file = table_file or default_table_path(graph_file)
+    track, graph = load_map(graph_file)
+    dist, pred = build_tables(graph)
+    with open(table_file, "wb") as f:
+        np.savez(f, dist=dist, pred=pred, ids=np.array(track.ids), edge_dst=np.asarray(graph.edge_dst),
+                 version=TABLE_VERSION, source_sha256=file_sha256(graph_file),
+                 weight_model=json.dumps(weight_model(), sort_keys=True))
+    return table_file
+
+
+@traced("load.route_table")
+def load_route_table(graph_file=GRAPH_FILE, table_file=None):
+    """Đọc bảng đã tính; tự tính lại nếu GraphML hoặc mô hình trọng số đã đổi."""
+    table_file = table_file or default_table_path(graph_file)
+    if os.path.exists(table_file):
+        with np.load(table_file) as data:
+            if ('version' in data and int(data['version']) == TABLE_VERSION
+                    and str(data['source_sha256']) == file_sha256(graph_file)
+                    and str(data['weight_model']) == json.dumps(weight_model(), sort_keys=True)):
+                return RouteTable(data['ids'].tolist(), data['dist'], data['pred'], data['edge_dst'])
+    print(f"-> Bảng đường đi {table_file} cũ hoặc chưa có, đang tính lại...")
+    save_route_table(graph_file, table_file)
+    return load_route_table(graph_file, table_file)
+
+
+def _parse_request(text, default_id):
+    """Một yêu cầu từ chuỗi JSON; lỗi cú pháp / không phải object -> {'request_id', 'error'}."""
+    try:
+        req = json.loads(text)
+    except json.JSONDecodeError as e:
+        return {'request_id': default_id, 'error': f"JSON không hợp lệ: {e.msg}"}
+    if not isinstance(req, dict):
+        return {'request_id': default_id, 'error': "yêu cầu phải là một object JSON"}
+    req.setdefault('request_id', default_id)
+    return req
+
+
+def iter_requests(path):
+    """Đọc yêu cầu từ thư mục (*.json, *.jsonl) hoặc một file .jsonl.
+
+    Dòng / file hỏng không làm dừng cả lô: được trả về dạng {'request_id', 'error'}.
+    """
+    files = sorted(os.path.join(path, f) for f in os.listdir(path)) if os.path.isdir(path) else [path]
+    for file in files:
+        if file.endswith(".json"):
+            with open(file, encoding="utf-8") as f:
+                yield _parse_request(f.read(), os.path.splitext(os.path.basename(file))[0])
+        elif file.endswith(".jsonl"):
+            with open(file, encoding="utf-8") as f:
+                for n, line in enumerate(f):
+                    if line.strip():
+                        yield _parse_request(line, f"{os.path.basename(file)}-{n}")
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    src = sys.argv[1] if len(sys.argv) > 1 else GRAPH_FILE
+    t0 = time.perf_counter()
+    out = save_route_table(src)
+    print(f"✅ Đã tính bảng all-pairs cho {src} -> {out} ({time.perf_counter() - t0:.2f}s)")
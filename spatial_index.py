@@ -0,0 +1,176 @@
+### CHỈ MỤC KHÔNG GIAN (LƯỚI ĐỀU) CHO ĐỊNH VỊ XE TRÊN ĐỒ THỊ ###
+#
+# Lưới ô vuông CELL_SIZE mét phủ toàn bộ map. Mỗi ô giữ danh sách node và đoạn cạnh
+# chạm vào nó (bảng đệm cỡ cố định -> tra cứu hàng loạt chỉ bằng phép toán mảng).
+# Truy vấn gần nhất chỉ xét 3x3 ô quanh điểm: kết quả chắc chắn đúng khi khoảng cách
+# tìm được <= CELL_SIZE; các điểm còn lại (hiếm, ở xa map) được tính vét cạn.
+
+import numpy as np
+
+# --- CẤU HÌNH ---
+CELL_SIZE = 0.5   # mét - cỡ ô lưới (~ độ dài cạnh lớn nhất trong map)
+
+
+def project_on_segments(points, a, b):
+    """Chiếu từng điểm lên đoạn [a, b] tương ứng -> (khoảng cách, t ∈ [0, 1], điểm chiếu)."""
+    abx, aby = b[..., 0] - a[..., 0], b[..., 1] - a[..., 1]
+    apx, apy = points[..., 0] - a[..., 0], points[..., 1] - a[..., 1]
+    len2 = abx * abx + aby * aby
+    t = np.clip((apx * abx + apy * aby) / np.where(len2 > 0, len2, 1.0), 0.0, 1.0)
+    dx, dy = apx - t * abx, apy - t * aby
+    proj = np.stack([points[..., 0] - dx, points[..., 1] - dy], axis=-1)
+    return np.sqrt(dx * dx + dy * dy), t, proj
+
+
+class GridIndex:
+    """Lưới đều trên node + đoạn cạnh của TrackGraph, truy vấn theo lô (M điểm một lần)."""
+
+    def __init__(self, track, cell_size=CELL_SIZE):
+        self.track = track
+        self.cell = cell_size
+        self.xy = np.asarray(track.xy, dtype=np.float64)
+        self.a = self.xy[track.edge_src]
+        self.b = self.xy[track.indices]
+        ab = self.b - self.a
+        len2 = np.einsum('ij,ij->i', ab, ab)
+        self._seg = (self.a[:, 0].copy(), self.a[:, 1].copy(), ab[:, 0].copy(), ab[:, 1].copy(),
+                     np.where(len2 > 0, len2, 1.0))
+        lo = self.xy.min(axis=0) if len(self.xy) else np.zeros(2)
+        hi = self.xy.max(axis=0) if len(self.xy) else np.zeros(2)
+        self.origin = lo
+        self.shape = (np.floor((hi - lo) / cell_size).astype(np.int64) + 1)
+        self.n_cells = int(self.shape[0] * self.shape[1])
+
+        # Node: mỗi node nằm đúng 1 ô
+        self.node_table = self._table(self._cell_id(self._cell_of(self.xy)),
+                                      np.arange(len(self.xy)))
+
+        # Đoạn cạnh: chèn vào mọi ô mà hộp bao của đoạn phủ lên
+        c0 = self._cell_of(np.minimum(self.a, self.b))
+        c1 = self._cell_of(np.maximum(self.a, self.b))
+        span = c1 - c0 + 1
+        counts = span[:, 0] * span[:, 1]
+        seg = np.repeat(np.arange(len(self.a)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = c0[seg, 0] + k % span[seg, 0]
+        cy = c0[seg, 1] + k // span[seg, 0]
+        self.edge_table = self._table(self._cell_id(np.stack([cx, cy], axis=1)), seg)
+
+    # --- Ô LƯỚI ---
+    def _cell_of(self, points):
+        c = np.floor((points - self.origin) / self.cell).astype(np.int64)
+        return np.clip(c, 0, self.shape - 1)
+
+    def _cell_id(self, cells):
+        return cells[:, 1] * self.shape[0] + cells[:, 0]
+
+    def _table(self, cell_ids, items):
+        """Bảng (số ô, K) chứa id phần tử trong từng ô, đệm -1."""
+        n_cells = self.n_cells
+        order = np.argsort(cell_ids, kind='stable')
+        cell_ids, items = cell_ids[order], items[order]
+        counts = np.bincount(cell_ids, minlength=n_cells)
+        # Thêm 1 hàng rỗng cuối bảng cho các ô nằm ngoài lưới
+        table = np.full((n_cells + 1, max(int(counts.max(initial=0)), 1)), -1, dtype=np.int32)
+        slot = np.arange(len(items)) - np.repeat(np.cumsum(counts) - counts, counts)
+        table[cell_ids, slot] = items
+        return table
+
+    def _candidates(self, table, points, reach=1):
+        """Id phần tử trong (2*reach+1)^2 ô quanh mỗi điểm -> (M, C), đệm -1."""
+        c = np.floor((points - self.origin) / self.cell).astype(np.int64)
+        off = np.arange(-reach, reach + 1)
+        cx = c[:, 0, None, None] + off[None, None, :]      # (M, 1, R)
+        cy = c[:, 1, None, None] + off[None, :, None]      # (M, R, 1)
+        inside = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+        ids = np.clip(cy, 0, self.shape[1] - 1) * self.shape[0] + np.clip(cx, 0, self.shape[0] - 1)
+        ids = np.where(inside, ids, self.n_cells)            # ô ngoài lưới -> hàng toàn -1
+        return table[ids.reshape(len(points), -1)].reshape(len(points), -1)
+
+    # --- TRUY VẤN ---
+    def nearest_node(self, points):
+        """Node gần nhất cho từng điểm (M, 2) -> (index node, khoảng cách)."""
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        cand = self._candidates(self.node_table, points)
+        dx = self.xy[cand, 0] - points[:, 0, None]
+        dy = self.xy[cand, 1] - points[:, 1, None]
+        d = np.sqrt(dx * dx + dy * dy)
+        d[cand < 0] = np.inf
+        j = np.argmin(d, axis=1)
+        best, dist = cand[np.arange(len(points)), j], d[np.arange(len(points)), j]
+        miss = ~(dist <= self.cell)
+        if miss.any():   # vét cạn cho điểm ở xa
+            dm = np.hypot(*(self.xy[None] - points[miss][:, None]).transpose(2, 0, 1))
+            best[miss] = np.argmin(dm, axis=1)
+            dist[miss] = dm.min(axis=1)
+        return best, dist
+
+    def nearest_edge(self, points):
+        """Cạnh gần nhất + hình chiếu cho từng điểm.
+
+        -> dict: 'edge' (index cạnh CSR), 'dist', 't' (vị trí trên cạnh, 0..1), 'proj' (M, 2).
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        m = np.arange(len(points))
+        cand = self._candidates(self.edge_table, points)
+        safe = np.maximum(cand, 0)
+        # Tính theo từng thành phần trên mảng 1 chiều (gom index 2 chiều tốn gấp đôi)
+        ax, ay, abx, aby, len2 = (c[safe] for c in self._seg)
+        apx, apy = points[:, 0, None] - ax, points[:, 1, None] - ay
+        t = np.clip((apx * abx + apy * aby) / len2, 0.0, 1.0)
+        dx, dy = apx - t * abx, apy - t * aby
+        d = np.sqrt(dx * dx + dy * dy)
+        d[cand < 0] = np.inf
+        j = np.argmin(d, axis=1)
+        edge, dist, t = cand[m, j], d[m, j], t[m, j]
+        proj = self.a[edge] + t[:, None] * (self.b[edge] - self.a[edge])
+        miss = ~(dist <= self.cell)
+        if miss.any():
+            dm, tm, pm = project_on_segments(points[miss][:, None, :], self.a[None], self.b[None])
+            k = np.argmin(dm, axis=1)
+            r = np.arange(len(k))
+            edge[miss], dist[miss], t[miss], proj[miss] = k, dm[r, k], tm[r, k], pm[r, k]
+        return {'edge': edge, 'dist': dist, 't': t, 'proj': proj}
+
+    def nodes_within(self, points, radius):
+        """Danh sách index node cách mỗi điểm không quá radius (list mảng, mỗi điểm một mảng)."""
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        reach = max(1, int(np.ceil(radius / self.cell)))
+        cand = self._candidates(self.node_table, points, reach)
+        d = np.hypot(*(self.xy[np.maximum(cand, 0)] - points[:, None, :]).transpose(2, 0, 1))
+        hit = (cand >= 0) & (d <= radius)
+        return [np.unique(cand[i][hit[i]]) for i in range(len(points))]
+
+
+class RouteProgress:
+    """Quãng đường đã đi (s) và độ lệch ngang của tư thế xe trên lộ trình hiện tại."""
+
+    def __init__(self, track, full_path):
+        if len(full_path) < 2:
+            raise ValueError("Lộ trình cần ít nhất 2 node để theo dõi tiến độ")
+        idx = np.array([track.node(n) for n in full_path])
+        pts = np.asarray(track.xy, dtype=np.float64)[idx]
+        self.a, self.b = pts[:-1], pts[1:]
+        seg_len = np.hypot(*(self.b - self.a).T)
+        self.s0 = np.concatenate([[0.0], np.cumsum(seg_len)])[:-1]
+        self.seg_len = seg_len
+        self.length = float(seg_len.sum())
+
+    def project(self, points, s_hint=None, window=1.0):
+        """-> dict 's' (m dọc lộ trình), 'lateral' (m, dương = bên trái), 'segment'.
+
+        s_hint: s của lần trước (vd. chu kỳ định vị trước); khi có, chỉ xét các đoạn trong
+        khoảng [s_hint - window, s_hint + window] để không nhảy sang đoạn đi qua lần 2.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        d, t, _ = project_on_segments(points[:, None, :], self.a[None], self.b[None])
+        if s_hint is not None:
+            s_mid = self.s0 + 0.5 * self.seg_len
+            far = np.abs(s_mid[None, :] - np.atleast_1d(s_hint)[:, None]) > window + 0.5 * self.seg_len
+            d = np.where(far, np.inf, d)
+        k = np.argmin(d, axis=1)
+        r = np.arange(len(points))
+        ab = self.b[k] - self.a[k]
+        ap = points - self.a[k]
+        side = np.sign(ab[:, 0] * ap[:, 1] - ab[:, 1] * ap[:, 0])
+        return {'s': self.s0[k] + t[r, k] * self.seg_len[k], 'lateral': side * d[r, k], 'segment': k}
@@ -1,13 +1,25 @@
 ### HỆ THỐNG KIỂM TRA AN TOÀN LÁI XE (GÓC LÁI TỐI ĐA) TRÊN ĐƯỜNG ĐUA ###
+#
+#   python steering_safety.py                              quét toàn bộ INPUT_FILE một lần
+#   python steering_safety.py --watch [file yEd]           theo dõi file yEd, lưu là thấy kết quả
+#   python steering_safety.py --watch-graph [file mét]     theo dõi file GraphML đã đổi sang mét
 
-import xml.etree.ElementTree as ET
+import copy
 import math
 import os
+import time
+import numpy as np
+
+from instrument import traced
+from track_graph import edge_transitions, load_track
 
 # ================= CẤU HÌNH (QUAN TRỌNG) =================
 INPUT_FILE = "Competition_track_graph!.graphml"  # File map đã convert sang mét
 WHEELBASE = 0.26          # Chiều dài trục cơ sở (mét) - ĐO XE THẬT RỒI SỬA SỐ NÀY
 MAX_STEERING_ANGLE = 25   # Góc lái tối đa (độ)
+POLL_INTERVAL = 0.1       # Chế độ theo dõi: chu kỳ kiểm tra file (giây)
+SETTLE_TIME = 0.05        # Chờ file ghi xong (mtime đứng yên) rồi mới đọc (giây)
+ANGLE_EPS = 0.01          # Góc đổi ít hơn (độ) coi như không đổi
 
 # ================= HÀM TOÁN HỌC =================
 def calculate_radius(p1, p2, p3):
@@ -36,81 +48,73 @@ def calculate_steering_angle(radius):
     angle_rad = math.atan(WHEELBASE / radius)
     return math.degrees(angle_rad)
 
+# ================= BẢN VECTOR HÓA (NUMPY) =================
+def circumradius(p1, p2, p3):
+    """Bán kính đường tròn ngoại tiếp cho cả loạt bộ 3 điểm (mảng (M, 2))."""
+    a = np.hypot(*(p1 - p2).T)
+    b = np.hypot(*(p2 - p3).T)
+    c = np.hypot(*(p3 - p1).T)
+    # Diện tích = |tích có hướng| / 2 (tương đương Heron nhưng không mất chính xác)
+    d21, d31 = p2 - p1, p3 - p1
+    area = 0.5 * np.abs(d21[:, 0] * d31[:, 1] - d21[:, 1] * d31[:, 0])
+    radius = np.full(len(area), np.inf)
+    curved = area >= 1e-6   # 3 điểm thẳng hàng -> Bán kính vô cực
+    radius[curved] = (a * b * c)[curved] / (4 * area[curved])
+    return radius
+
+def steering_angles(radius, wheelbase=WHEELBASE):
+    """Góc lái Ackerman (độ) cho cả mảng bán kính."""
+    return np.degrees(np.arctan(wheelbase / radius))
+
+
+@traced("analyze.curvature")
+def scan_triples(track, wheelbase=WHEELBASE, nodes=None):
+    """Tính bán kính + góc lái cho MỌI bộ (trước, giữa, sau) trong đồ thị có hướng.
+
+    Mỗi nhánh tại giao lộ là một bộ riêng. Bỏ qua bộ quay đầu (trước == sau).
+    nodes: chỉ quét các bộ có node giữa nằm trong danh sách index này.
+    Trả về dict các mảng index node 'prev', 'node', 'next' và 'radius', 'angle'.
+    """
+    edges = None
+    if nodes is not None:
+        centre = np.zeros(track.n_nodes, dtype=bool)
+        centre[np.asarray(nodes, dtype=np.int64)] = True
+        edges = np.flatnonzero(centre[track.indices])
+    e_in, e_out = edge_transitions(track, edges)
+    prev, node, nxt = track.edge_src[e_in], track.indices[e_in], track.indices[e_out]
+    keep = prev != nxt
+    prev, node, nxt = prev[keep], node[keep], nxt[keep]
+    xy = np.asarray(track.xy)
+    radius = circumradius(xy[prev], xy[node], xy[nxt])
+    return {'prev': prev, 'node': node, 'next': nxt,
+            'radius': radius, 'angle': steering_angles(radius, wheelbase)}
+
+
 # ================= HÀM XỬ LÝ CHÍNH =================
+@traced("analyze.steering")
 def analyze_track():
     if not os.path.exists(INPUT_FILE):
         print(f"❌ Lỗi: Không tìm thấy file {INPUT_FILE}")
         return
 
     print(f"--- ĐANG ĐỌC FILE: {INPUT_FILE} ---")
-    tree = ET.parse(INPUT_FILE)
-    root = tree.getroot()
-    ns = {'g': 'http://graphml.graphdrawing.org/xmlns'}
-    
-    # 1. Đọc dữ liệu Nodes
-    nodes = {} # Lưu tạm: id -> {x, y}
-    for node in root.findall(".//g:node", ns):
-        nid = node.get('id')
-        x, y = 0.0, 0.0
-        # Tìm data d0 (x) và d1 (y)
-        for data in node.findall("g:data", ns):
-            key = data.get('key')
-            if key == 'd0': x = float(data.text)
-            if key == 'd1': y = float(data.text)
-        nodes[nid] = {'id': nid, 'x': x, 'y': y}
-
-    # 2. Sắp xếp lại thứ tự (Reconstruct Path)
-    # Vì graphml lưu lộn xộn, ta cần đi theo mũi tên edge
-    adj = {}
-    for edge in root.findall(".//g:edge", ns):
-        adj[edge.get('source')] = edge.get('target')
-
-    # Tìm điểm bắt đầu (Node 0)
-    # Giả sử node id="0" là bắt đầu, hoặc tìm node không có ai trỏ tới
-    # Với file output của code trước, node id chạy từ "0" -> "n"
-    sorted_nodes = []
-    curr_id = "0" 
-    
-    # Fallback: Nếu không tìm thấy node 0, tìm node đầu tiên trong danh sách
-    if curr_id not in nodes and len(nodes) > 0:
-        curr_id = list(nodes.keys())[0]
-
-    count = 0
-    while curr_id in nodes:
-        sorted_nodes.append(nodes[curr_id])
-        if curr_id in adj:
-            curr_id = adj[curr_id]
-        else:
-            break
-        
-        # Chống lặp vô tận
-        count += 1
-        if count > len(nodes) + 10: break
+    track = load_track(INPUT_FILE)
+    print(f"-> Đã load {track.n_nodes} nodes, {track.n_edges} edges.")
 
-    print(f"-> Đã load {len(sorted_nodes)} nodes theo thứ tự đường đi.")
-    
-    # 3. QUÉT GÓC LÁI (Scan)
+    # QUÉT GÓC LÁI (Scan) - toàn bộ các bộ 3 điểm, kể cả mọi nhánh ở giao lộ
     print(f"\n--- BẮT ĐẦU KIỂM TRA (Max {MAX_STEERING_ANGLE} độ, Wheelbase {WHEELBASE}m) ---")
-    violations = []
-    
-    # Duyệt qua từng bộ 3 điểm
-    for i in range(1, len(sorted_nodes) - 1):
-        p1 = sorted_nodes[i-1]
-        p2 = sorted_nodes[i]   # Node khúc cua
-        p3 = sorted_nodes[i+1]
-        
-        R = calculate_radius(p1, p2, p3)
-        angle = calculate_steering_angle(R)
-        
-        if angle > MAX_STEERING_ANGLE:
-            violations.append({
-                'node_ids': f"{p1['id']} -> {p2['id']} -> {p3['id']}",
-                'center_node': p2['id'],
-                'angle': angle,
-                'radius': R
-            })
-
-    # 4. XUẤT BÁO CÁO
+    scan = scan_triples(track)
+    print(f"-> Đã quét {len(scan['angle'])} bộ 3 điểm.")
+    bad = np.flatnonzero(scan['angle'] > MAX_STEERING_ANGLE)
+    ids = track.ids
+    violations = [{
+        'node_ids': f"{ids[scan['prev'][i]]} -> {ids[scan['node'][i]]} -> {ids[scan['next'][i]]}",
+        'center_node': ids[scan['node'][i]],
+        'angle': float(scan['angle'][i]),
+        'radius': float(scan['radius'][i]),
+    } for i in bad]
+
+    # XUẤT BÁO CÁO
     if len(violations) == 0:
         print("\n✅ TUYỆT VỜI! Không phát hiện khúc cua nào quá gắt.")
     else:
@@ -125,6 +129,177 @@ def analyze_track():
         print("-" * 60)
         print("💡 GIẢI PHÁP: Hãy vào yEd, tìm các node ID ở cột 'Giữa'.")
         print("   Kéo chúng ra xa nhau hoặc làm đường cong rộng hơn.")
+    return violations
+
+# ================= CHẾ ĐỘ THEO DÕI (SỬA MAP TRONG YED, LƯU LÀ THẤY KẾT QUẢ) =================
+# Mỗi lần file được lưu: so hình học từng node với snapshot lần trước (node đổi tọa độ lấy từ
+# convert_streaming incremental, hoặc so trực tiếp theo id khi theo dõi file mét), so tập cạnh,
+# rồi chỉ quét lại các bộ 3 có node giữa là node đã dời / láng giềng của nó / đầu của cạnh vừa
+# thêm-xóa. Bộ (trước, giữa, sau) chỉ phụ thuộc 3 node đó và 2 cạnh nối nên như vậy là đủ.
+def _violations(track, scan):
+    """{(id trước, id giữa, id sau): (góc, bán kính)} của các bộ vượt MAX_STEERING_ANGLE."""
+    ids = track.ids
+    return {(ids[scan['prev'][i]], ids[scan['node'][i]], ids[scan['next'][i]]):
+            (float(scan['angle'][i]), float(scan['radius'][i]))
+            for i in np.flatnonzero(scan['angle'] > MAX_STEERING_ANGLE)}
+
+
+class SteeringWatch:
+    """Tập điểm cua gắt của map hiện tại, cập nhật tăng dần theo từng lần sửa."""
+
+    def __init__(self, track):
+        self.track = track
+        self.violations = _violations(track, scan_triples(track))
+
+    def update(self, new, moved_ids=None):
+        """Chuyển sang map mới -> dict 'added', 'fixed', 'changed' + số bộ 3 đã quét lại.
+
+        moved_ids: id các node đổi tọa độ nếu đã biết (convert_streaming); None -> tự so.
+        """
+        old = self.track
+        N = new.n_nodes
+        same_ids = old.ids == new.ids
+        remap = (np.arange(old.n_nodes) if same_ids
+                 else np.array([new.index.get(n, -1) for n in old.ids], dtype=np.int64))
+        removed = set() if same_ids else {n for n in old.ids if n not in new.index}
+
+        # 1. Node đã dời (hoặc mới)
+        if moved_ids is not None:
+            moved = np.array([new.index[n] for n in moved_ids if n in new.index], dtype=np.int64)
+        else:
+            old_xy = np.full((N, 2), np.nan)
+            ok = remap >= 0
+            old_xy[remap[ok]] = np.asarray(old.xy)[ok]
+            moved = np.flatnonzero(np.any(old_xy != np.asarray(new.xy), axis=1))
+
+        # 2. Cạnh vừa thêm / xóa (khóa src * N + dst theo index của map mới)
+        if same_ids and np.array_equal(old.indptr, new.indptr) and np.array_equal(old.indices, new.indices):
+            changed_keys = np.zeros(0, dtype=np.int64)
+            dangling = changed_keys
+        else:
+            o_src, o_dst = remap[old.edge_src], remap[old.indices]
+            both = (o_src >= 0) & (o_dst >= 0)
+            changed_keys = np.setxor1d(o_src[both] * N + o_dst[both],
+                                       new.edge_src.astype(np.int64) * N + new.indices)
+            dangling = np.concatenate([o_src[(o_src >= 0) & (o_dst < 0)], o_dst[(o_dst >= 0) & (o_src < 0)]])
+
+        # 3. Node giữa của mọi bộ 3 bị ảnh hưởng
+        mask = np.zeros(N, dtype=bool)
+        mask[moved] = True
+        touched = mask.copy()
+        touched[new.indices[mask[new.edge_src]]] = True     # node sau của node đã dời
+        touched[new.edge_src[mask[new.indices]]] = True     # node trước của node đã dời
+        touched[changed_keys // N] = True
+        touched[changed_keys % N] = True
+        touched[dangling] = True
+        centres = np.flatnonzero(touched)
+
+        touched_ids = {new.ids[i] for i in centres} | removed
+        before = {k: v for k, v in self.violations.items() if k[1] in touched_ids}
+        scan = scan_triples(new, nodes=centres)
+        after = _violations(new, scan)
+        for k in before:
+            del self.violations[k]
+        self.violations.update(after)
+        self.track = new
+        return {'added': {k: v for k, v in after.items() if k not in before},
+                'fixed': {k: v for k, v in before.items() if k not in after},
+                'changed': {k: (before[k], v) for k, v in after.items()
+                            if k in before and abs(v[0] - before[k][0]) > ANGLE_EPS},
+                'n_triples': len(scan['angle']), 'n_centres': len(centres), 'n_moved': len(moved)}
+
+
+def _print_changes(report, total):
+    for (p, n, s), (angle, radius) in report['added'].items():
+        print(f"❌ MỚI  {p} -> {n} -> {s:<12} | {angle:.2f}° | {radius:.3f} m")
+    for (p, n, s), (angle, _) in report['fixed'].items():
+        print(f"✅ HẾT  {p} -> {n} -> {s:<12} | trước đó {angle:.2f}°")
+    for (p, n, s), ((a0, _), (a1, radius)) in report['changed'].items():
+        print(f"⚠️ ĐỔI  {p} -> {n} -> {s:<12} | {a0:.2f}° -> {a1:.2f}° | {radius:.3f} m")
+    if not (report['added'] or report['fixed'] or report['changed']):
+        print("-> Không có điểm cua gắt nào thay đổi.")
+    print(f"-> {report['n_moved']} node dời, quét lại {report['n_triples']} bộ 3 quanh "
+          f"{report['n_centres']} node | còn {total} điểm cua gắt")
+
+
+def _wait_for_change(path, last):
+    """Chờ tới khi mtime của path khác last và đứng yên SETTLE_TIME -> mtime mới."""
+    while True:
+        time.sleep(POLL_INTERVAL)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        if mtime == last:
+            continue
+        time.sleep(SETTLE_TIME)
+        try:
+            if os.stat(path).st_mtime_ns == mtime:
+                return mtime
+        except OSError:
+            continue
+
+
+def watch(path, metric=False, output_file=None):
+    """Theo dõi file yEd (chuyển đổi incremental qua extract_nodes) hoặc file GraphML mét
+    (metric=True); mỗi lần lưu in các điểm cua gắt mới / đã hết / đổi góc. Ctrl+C để thoát."""
+    import xml.etree.ElementTree as ET
+    from extract_nodes import OUTPUT_FILE, convert_streaming
+
+    graph_file = path if metric else (output_file or OUTPUT_FILE)
+    if not os.path.exists(path):
+        print(f"❌ Lỗi: Không tìm thấy file {path}")
+        return
+    if not metric and convert_streaming(path, graph_file, incremental=True) is None:
+        return
+    last = os.stat(path).st_mtime_ns
+    watcher = SteeringWatch(load_track(graph_file))
+    print(f"--- ĐANG THEO DÕI {path} (Max {MAX_STEERING_ANGLE} độ) - Ctrl+C để thoát ---")
+    print(f"-> {watcher.track.n_nodes} nodes, {len(watcher.violations)} điểm cua gắt")
+    try:
+        while True:
+            last = _wait_for_change(path, last)
+            t0 = time.perf_counter()
+            if metric:
+                try:
+                    new = load_track(graph_file)
+                except ET.ParseError as e:
+                    print(f"⚠️ File đang ghi dở hoặc lỗi ({e}), chờ lần lưu sau")
+                    continue
+                report = watcher.update(new)
+            else:
+                info = convert_streaming(path, graph_file, incremental=True)
+                if info is None:
+                    continue
+                track = watcher.track
+                if info['removed'] or info['edges_changed'] or any(n not in track.index for n in info['changed']):
+                    new = load_track(graph_file)       # topo đổi -> đọc lại cả file
+                else:
+                    # Chỉ dời node: sửa tọa độ trên bản sao, dùng chung mảng CSR + bảng id
+                    new = copy.copy(track)
+                    new.xy = np.array(track.xy, dtype=np.float64)
+                    if info['changed']:
+                        idx = [track.index[n] for n in info['changed']]
+                        new.xy[idx] = [info['changed_xy'][n] for n in info['changed']]
+                report = watcher.update(new, info['changed'])
+            _print_changes(report, len(watcher.violations))
+            print(f"-> Cập nhật trong {(time.perf_counter() - t0) * 1000:.1f} ms")
+    except KeyboardInterrupt:
+        print("\n-> Dừng theo dõi.")
+
 
 if __name__ == "__main__":
-    analyze_track()
\ No newline at end of file
+    import sys
+    args = sys.argv[1:]
+    if "--watch" in args or "--watch-graph" in args:
+        flag = "--watch-graph" if "--watch-graph" in args else "--watch"
+        k = args.index(flag)
+        target = args[k + 1] if k + 1 < len(args) and not args[k + 1].startswith("--") else None
+        if flag == "--watch-graph":
+            from extract_nodes import OUTPUT_FILE
+            watch(target or OUTPUT_FILE, metric=True)
+        else:
+            from extract_nodes import INPUT_FILE as YED_FILE
+            watch(target or YED_FILE)
+    else:
+        analyze_track()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from astar_planner import AStarPlanner
+from edge_weights import build_search_graph
+from map_cache import GRAPH_FILE
+from track_graph import load_track
+
+
+@pytest.fixture(scope="module")
+def planner():
+    track = load_track(GRAPH_FILE)
+    return AStarPlanner(track, build_search_graph(track))
+
+
+def _uses(planner, vertex_path, blocked):
+    """Cạnh bị chặn mà lộ trình đi qua theo chiều bất kỳ (kể cả đi ngược khi vượt xe)."""
+    track, graph = planner.track, planner.graph
+    nodes = graph.decode(vertex_path)
+    pairs = {(int(track.edge_src[e]), int(track.indices[e])) for e in blocked}
+    hops = set(zip(nodes, nodes[1:]))
+    by_nodes = {e for e, (u, v) in zip(blocked, pairs) if (u, v) in hops or (v, u) in hops}
+    by_state = {int(graph.base_edge[v]) for v in vertex_path if v < graph.n_edges} & set(blocked)
+    return by_nodes | by_state
+
+
+def test_overtake_avoids_blocked_lane_in_both_directions(planner):
+    track, graph = planner.track, planner.graph
+    s, t = graph.start_vertex(track.node("93")), graph.goal_vertex(track.node("84"))
+    blocked = []
+    try:
+        for u, v in [("90", "89"), ("100", "99"), ("99", "98")]:
+            planner.block_edge(u, v)
+            blocked.append(track.edge_index(track.node(u), track.node(v)))
+            cost, path = planner.search_vertices(s, t)
+            assert path is not None
+            assert not _uses(planner, path, blocked)
+    finally:
+        planner.clear_blocks()
+
+
+def test_blocking_any_dotted_edge_blocks_its_overtake_states(planner):
+    track, graph = planner.track, planner.graph
+    queries = [("93", "84"), ("105", "96"), ("84", "93"), ("96", "105")]
+    queries = [(graph.start_vertex(track.node(a)), graph.goal_vertex(track.node(b))) for a, b in queries]
+    for e in np.flatnonzero(track.dotted).tolist():
+        planner.set_edge_blocked(e, True)
+        assert all(planner._blocked[v] for v in np.flatnonzero(graph.base_edge == e))
+        for s, t in queries:
+            _, path = planner.search_vertices(s, t)
+            assert path is None or not _uses(planner, path, [e])
+        planner.set_edge_blocked(e, False)
+        assert not any(planner._blocked)
@@ -0,0 +1,27 @@
+import math
+
+import numpy as np
+import pytest
+
+from extract_nodes import apply_transform, fit_transform, transform_rotation
+
+
+def _anchors(angle_deg, scale=0.01, offset=(1.0, 2.0)):
+    """Điểm mốc của bản vẽ quay angle_deg (ngược chiều kim đồng hồ trên map), trục Y ảnh hướng xuống."""
+    th = math.radians(angle_deg)
+    rot = np.array([[math.cos(th), -math.sin(th)], [math.sin(th), math.cos(th)]])
+    pixel = np.array([[0.0, 0.0], [100.0, 0.0], [0.0, 100.0], [50.0, 70.0]])
+    real = (scale * np.column_stack([pixel[:, 0], -pixel[:, 1]])) @ rot.T + offset
+    return pixel, real
+
+
+@pytest.mark.parametrize("model", ["similarity", "affine"])
+@pytest.mark.parametrize("angle", [5.0, -5.0, 30.0])
+def test_rotation_sign_matches_fitted_matrix(model, angle):
+    pixel, real = _anchors(angle)
+    M = fit_transform(pixel, real, model)
+    assert np.allclose(apply_transform(M, pixel), real)
+    assert transform_rotation(M) == pytest.approx(angle)
+    # Trục X pixel đi theo đúng hướng của góc in ra
+    x_axis = apply_transform(M, [[1.0, 0.0]])[0] - apply_transform(M, [[0.0, 0.0]])[0]
+    assert math.degrees(math.atan2(x_axis[1], x_axis[0])) == pytest.approx(transform_rotation(M))
@@ -0,0 +1,24 @@
+import asyncio
+
+from plan_server import read_line
+
+
+def _lines(data, limit=64):
+    async def run():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(data)
+        reader.feed_eof()
+        out = []
+        while (line := await read_line(reader)) != b"":
+            out.append(line)
+        return out
+    return asyncio.run(run())
+
+
+def test_overlong_line_is_dropped_and_next_line_still_read():
+    data = b'{"a": 1}\n' + b"x" * 500 + b'\n{"b": 2}\n' + b"y" * 200
+    assert _lines(data) == [b'{"a": 1}\n', None, b'{"b": 2}\n', None]
+
+
+def test_last_line_without_newline():
+    assert _lines(b'{"a": 1}\n{"b": 2}') == [b'{"a": 1}\n', b'{"b": 2}']
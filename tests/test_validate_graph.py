@@ -0,0 +1,24 @@
+import os
+
+from extract_nodes import INPUT_FILE, convert_streaming
+from map_cache import GRAPH_FILE
+from track_graph import load_track
+from validate_graph import check_graph, validate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_shipped_map_passes_with_self_loop_as_warning():
+    report = validate(load_track(os.path.join(ROOT, GRAPH_FILE)))
+    assert report['errors'] == []
+    assert len(report['self_loops']) == 1
+    assert any("18 -> 18" in w for w in report['warnings'])
+
+
+def test_default_pipeline_on_shipped_drawing(tmp_path):
+    # Như `python extract_nodes.py`: chuyển file yEd gốc rồi qua cổng validate_graph
+    output = str(tmp_path / "final.graphml")
+    assert convert_streaming(os.path.join(ROOT, INPUT_FILE), output) is not None
+    assert check_graph(output)
+    with open(output, "rb") as a, open(os.path.join(ROOT, GRAPH_FILE), "rb") as b:
+        assert a.read() == b.read()
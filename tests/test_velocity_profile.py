@@ -0,0 +1,28 @@
+import numpy as np
+
+from velocity_profile import A_ACC_MAX, A_DEC_MAX, plan_velocity
+
+
+def test_two_points_from_stop_to_stop_takes_time():
+    # Xuất phát và dừng trên cùng 1 đoạn: tăng tốc tới đỉnh rồi phanh, không phải 0 s
+    seg = 0.47
+    profile = plan_velocity(np.array([[0.0, 0.0], [seg, 0.0]]), v_start=0.0, v_end=0.0)
+    peak = np.sqrt(2 * A_ACC_MAX * A_DEC_MAX * seg / (A_ACC_MAX + A_DEC_MAX))
+    assert profile['lap_time'] > 0
+    assert np.isclose(profile['lap_time'], peak / A_ACC_MAX + peak / A_DEC_MAX)
+
+
+def test_symmetric_accel_matches_closed_form(monkeypatch):
+    import velocity_profile
+    monkeypatch.setattr(velocity_profile, "A_DEC_MAX", A_ACC_MAX)
+    profile = plan_velocity(np.array([[0.0, 0.0], [0.3, 0.0]]))
+    assert np.isclose(profile['lap_time'], 2 * np.sqrt(0.3 / A_ACC_MAX))
+
+
+def test_long_straight_cruises_at_v_max():
+    from velocity_profile import V_MAX
+    length = 10.0
+    profile = plan_velocity(np.array([[0.0, 0.0], [length, 0.0]]))
+    d_acc, d_dec = V_MAX ** 2 / (2 * A_ACC_MAX), V_MAX ** 2 / (2 * A_DEC_MAX)
+    expected = V_MAX / A_ACC_MAX + V_MAX / A_DEC_MAX + (length - d_acc - d_dec) / V_MAX
+    assert np.isclose(profile['lap_time'], expected)
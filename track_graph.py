@@ -0,0 +1,173 @@
+### BỘ ĐỌC ĐỒ THỊ ĐƯỜNG ĐUA DÙNG CHUNG (MẢNG NUMPY + CSR) ###
+
+import xml.etree.ElementTree as ET
+import numpy as np
+
+from instrument import traced
+
+# --- CẤU HÌNH ---
+GRAPHML_NS = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+
+# Key mặc định do extract_nodes.export_to_xml sinh ra (dùng khi file không khai báo <key>)
+DEFAULT_KEYS = {'x': 'd0', 'y': 'd1', 'dotted': 'd2', 'length': None}
+
+
+class TrackGraph:
+    """Đồ thị có hướng lưu dạng mảng: tọa độ (N, 2) + kề CSR (indptr, indices, dotted)."""
+
+    def __init__(self, ids, xy, indptr, indices, dotted, edge_src=None, length=None):
+        self.ids = list(ids)                           # index -> id gốc (chuỗi)
+        self.index = {nid: i for i, nid in enumerate(self.ids)}  # id gốc -> index
+        self.xy = xy                                   # (N, 2) float64, đơn vị mét
+        self.indptr = indptr                           # (N+1,) int32
+        self.indices = indices                         # (E,) int32 - node đích của từng cạnh
+        self.dotted = dotted                           # (E,) bool - cờ nét đứt (key d2)
+        # Node nguồn của từng cạnh (tiện cho các phép tính vector hóa)
+        if edge_src is None:
+            edge_src = np.repeat(np.arange(len(self.ids), dtype=np.int32), np.diff(indptr))
+        self.edge_src = edge_src
+        # (E,) float64 - độ dài cạnh ghi trong file (vd. cạnh gộp của resample_graph dài bằng
+        # cả chuỗi cong, không phải dây cung); None: tính từ tọa độ (edge_weights.edge_lengths)
+        self.length = length
+
+    @property
+    def n_nodes(self):
+        return len(self.ids)
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def node(self, nid):
+        """Đổi id gốc (chuỗi) sang index."""
+        return self.index[str(nid)]
+
+    def successors(self, i):
+        """Các node kế tiếp của node index i (view, không copy)."""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def out_edges(self, i):
+        """Khoảng chỉ số cạnh đi ra từ node index i."""
+        return range(self.indptr[i], self.indptr[i + 1])
+
+    def edge_index(self, u, v):
+        """Chỉ số cạnh u -> v (theo index node), -1 nếu không có."""
+        for e in self.out_edges(u):
+            if self.indices[e] == v:
+                return e
+        return -1
+
+    def positions(self):
+        """Dict {id: (x, y)} cho các hàm vẽ của networkx/matplotlib."""
+        return {nid: (float(x), float(y)) for nid, (x, y) in zip(self.ids, self.xy)}
+
+    def to_networkx(self, weights=None):
+        """Dựng nx.DiGraph (chỉ dùng cho hiển thị / so sánh với code cũ)."""
+        import networkx as nx
+        G = nx.DiGraph()
+        for nid, (x, y) in zip(self.ids, self.xy):
+            G.add_node(nid, x=float(x), y=float(y))
+        for e in range(self.n_edges):
+            u, v = self.ids[self.edge_src[e]], self.ids[self.indices[e]]
+            G.add_edge(u, v, dotted=bool(self.dotted[e]))
+            if weights is not None:
+                G[u][v]['weight'] = float(weights[e])
+        return G
+
+
+def build_csr(n_nodes, src, dst, *edge_data):
+    """Sắp cạnh theo node nguồn (giữ nguyên thứ tự trong file) -> indptr, indices, *edge_data."""
+    src = np.asarray(src, dtype=np.int32)
+    dst = np.asarray(dst, dtype=np.int32)
+    order = np.argsort(src, kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    return (indptr, dst[order]) + tuple(np.asarray(a)[order] for a in edge_data)
+
+
+def edge_transitions(track, edges=None):
+    """Mọi cặp cạnh nối tiếp (e_in: p -> n, e_out: n -> s) trong đồ thị, vector hóa.
+
+    Đây chính là các cạnh của line graph: mỗi nhánh tại giao lộ là một cặp riêng.
+    Bỏ cặp có cạnh dài 0 (vd. self-loop 18 -> 18): cạnh đó không có hướng, đi vòng qua nó
+    sẽ làm góc rẽ p -> n -> s bị tính thành đi thẳng.
+    edges: chỉ xét các cạnh vào e_in này (vd. khi quét lại một phần đồ thị).
+    """
+    dst = track.indices
+    if edges is None:
+        edges = np.arange(track.n_edges, dtype=np.int32)
+    nxt = dst[edges]
+    counts = track.indptr[nxt + 1] - track.indptr[nxt]          # số nhánh ra sau mỗi cạnh
+    e_in = np.repeat(np.asarray(edges, dtype=np.int32), counts)
+    starts = np.cumsum(counts) - counts
+    offset = np.arange(len(e_in), dtype=np.int32) - np.repeat(starts, counts).astype(np.int32)
+    e_out = (track.indptr[dst[e_in]] + offset).astype(np.int32)
+    xy, src = np.asarray(track.xy), track.edge_src
+    keep = (np.any(xy[dst[e_in]] != xy[src[e_in]], axis=1)
+            & np.any(xy[dst[e_out]] != xy[src[e_out]], axis=1))
+    return e_in[keep], e_out[keep]
+
+
+def _resolve_keys(root):
+    """Tìm id của các key x, y, dotted, length theo attr.name (fallback d0/d1/d2, length tùy chọn)."""
+    keys = dict(DEFAULT_KEYS)
+    for key in root.findall("g:key", GRAPHML_NS):
+        name = key.get('attr.name')
+        if name in keys:
+            keys[name] = key.get('id')
+    return keys
+
+
+@traced("load.graphml")
+def load_track(graph_file):
+    """Đọc file GraphML (đã đổi sang mét) một lần duy nhất -> TrackGraph."""
+    root = ET.parse(graph_file).getroot()
+    keys = _resolve_keys(root)
+
+    # 1. Nodes
+    ids = []
+    coords = []
+    for node in root.iter('{%s}node' % GRAPHML_NS['g']):
+        x, y = 0.0, 0.0
+        for data in node.findall("g:data", GRAPHML_NS):
+            key = data.get('key')
+            if key == keys['x']: x = float(data.text)
+            elif key == keys['y']: y = float(data.text)
+        ids.append(node.get('id'))
+        coords.append((x, y))
+    index = {nid: i for i, nid in enumerate(ids)}
+
+    # 2. Edges (bỏ qua cạnh trỏ tới node không tồn tại)
+    src, dst, dotted, length = [], [], [], []
+    for edge in root.iter('{%s}edge' % GRAPHML_NS['g']):
+        u, v = edge.get('source'), edge.get('target')
+        if u not in index or v not in index:
+            print(f"⚠️ Bỏ qua cạnh {u} -> {v}: node không tồn tại")
+            continue
+        flag, dist = False, np.nan
+        for data in edge.findall("g:data", GRAPHML_NS):
+            key = data.get('key')
+            if key == keys['dotted'] and data.text:
+                flag = data.text.strip().lower() in ('true', '1')
+            elif key == keys['length'] and data.text:
+                dist = float(data.text)
+        src.append(index[u])
+        dst.append(index[v])
+        dotted.append(flag)
+        length.append(dist)
+
+    xy = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    indptr, indices, dotted, length = build_csr(len(ids), src, dst, np.array(dotted, dtype=bool),
+                                                np.array(length, dtype=np.float64))
+    track = TrackGraph(ids, xy, indptr, indices, dotted)
+    # Cạnh có khai báo độ dài giữ nguyên giá trị đó, cạnh còn lại lấy theo tọa độ
+    if np.isfinite(length).any():
+        d = xy[indices] - xy[track.edge_src]
+        track.length = np.where(np.isfinite(length), length, np.hypot(d[:, 0], d[:, 1]))
+    return track
+
+
+if __name__ == "__main__":
+    import sys
+    track = load_track(sys.argv[1] if len(sys.argv) > 1 else "Competition_track_graph_FINAL.graphml")
+    print(f"-> {track.n_nodes} nodes, {track.n_edges} edges, {int(track.dotted.sum())} cạnh nét đứt")
@@ -0,0 +1,121 @@
+### SINH QUỸ ĐẠO MỊN, DÀY ĐẶC CHO BỘ ĐIỀU KHIỂN LÁI ###
+#
+# Lộ trình (full_path) chỉ là dãy node. Bộ điều khiển cần điểm tham chiếu cách đều
+# (mặc định 2 cm) kèm hướng (yaw), độ cong và vận tốc. Ở đây dùng spline Catmull-Rom
+# hướng tâm (centripetal, đi qua đúng các node, không tự cắt/không vặn nút) viết dưới
+# dạng Hermite bậc 3 để có đạo hàm giải tích -> độ cong chính xác, không nhiễu sai phân.
+
+import numpy as np
+
+from instrument import traced
+from edge_weights import V_MAX, V_CURVE_MIN
+from steering_safety import WHEELBASE, MAX_STEERING_ANGLE
+
+# --- CẤU HÌNH ---
+SPACING = 0.02        # Khoảng cách giữa 2 điểm quỹ đạo (mét)
+ALPHA = 0.5           # 0.5 = centripetal Catmull-Rom
+SAMPLES_PER_SEG = 16  # Số điểm lấy mẫu mỗi đoạn để ước lượng độ dài cung
+
+
+def _dedupe(points):
+    """Bỏ các node trùng tọa độ liên tiếp (có cạnh dài 0 trong map)."""
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(np.diff(points, axis=0) != 0, axis=1)
+    return points[keep]
+
+
+def _hermite_segments(points):
+    """Hệ số Hermite (P1, T1, P2, T2) cho từng đoạn Pi -> Pi+1, vector hóa."""
+    # Thêm điểm ảo đối xứng ở 2 đầu để đoạn đầu/cuối cũng có tiếp tuyến
+    P = np.vstack([2 * points[0] - points[1], points, 2 * points[-1] - points[-2]])
+    dt = np.hypot(*np.diff(P, axis=0).T) ** ALPHA          # khoảng knot theo centripetal
+    dt = np.maximum(dt, 1e-9)
+    P0, P1, P2, P3 = P[:-3], P[1:-2], P[2:-1], P[3:]
+    d0, d1, d2 = dt[:-2, None], dt[1:-1, None], dt[2:, None]
+    T1 = ((P1 - P0) / d0 - (P2 - P0) / (d0 + d1) + (P2 - P1) / d1) * d1
+    T2 = ((P2 - P1) / d1 - (P3 - P1) / (d1 + d2) + (P3 - P2) / d2) * d1
+    return P1, T1, P2, T2
+
+
+def _eval(coef, seg, u):
+    """Vị trí, đạo hàm bậc 1 và bậc 2 theo u tại (đoạn seg, tham số u ∈ [0, 1])."""
+    P1, T1, P2, T2 = (c[seg] for c in coef)
+    u = u[:, None]
+    u2, u3 = u * u, u * u * u
+    pos = (2*u3 - 3*u2 + 1) * P1 + (u3 - 2*u2 + u) * T1 + (-2*u3 + 3*u2) * P2 + (u3 - u2) * T2
+    d1 = (6*u2 - 6*u) * P1 + (3*u2 - 4*u + 1) * T1 + (-6*u2 + 6*u) * P2 + (3*u2 - 2*u) * T2
+    d2 = (12*u - 6) * P1 + (6*u - 4) * T1 + (-12*u + 6) * P2 + (6*u - 2) * T2
+    return pos, d1, d2
+
+
+def speed_limit(curvature):
+    """Vận tốc theo mức dùng góc lái: V_MAX khi đi thẳng -> V_CURVE_MIN khi lái tối đa."""
+    steer = np.degrees(np.arctan(WHEELBASE * np.abs(curvature)))
+    ratio = np.minimum(steer / MAX_STEERING_ANGLE, 1.0)
+    return V_MAX - (V_MAX - V_CURVE_MIN) * ratio
+
+
+@traced("analyze.trajectory")
+def generate_trajectory(points, spacing=SPACING):
+    """Spline qua các điểm (M, 2) rồi lấy mẫu lại theo độ dài cung.
+
+    Trả về dict mảng: s, x, y, yaw (rad), curvature (1/m, dấu + là rẽ trái),
+    steering (độ), speed (m/s) và feasible (góc lái <= MAX_STEERING_ANGLE).
+    """
+    points = _dedupe(np.asarray(points, dtype=np.float64))
+    if len(points) < 2:
+        raise ValueError("Cần ít nhất 2 điểm khác nhau để sinh quỹ đạo")
+    coef = _hermite_segments(points)
+    n_seg = len(points) - 1
+
+    # 1. Độ dài cung: lấy mẫu dày mỗi đoạn, cộng dồn
+    u = np.linspace(0.0, 1.0, SAMPLES_PER_SEG + 1)
+    seg = np.repeat(np.arange(n_seg), SAMPLES_PER_SEG + 1)
+    pos, _, _ = _eval(coef, seg, np.tile(u, n_seg))
+    pos = pos.reshape(n_seg, SAMPLES_PER_SEG + 1, 2)
+    step = np.hypot(*np.diff(pos, axis=1).transpose(2, 0, 1))       # (n_seg, K)
+    s_knots = np.concatenate([[0.0], np.cumsum(step.ravel())])
+    t_knots = (np.arange(n_seg)[:, None] + u[None, 1:]).ravel()
+    t_knots = np.concatenate([[0.0], t_knots])                      # tham số toàn cục = seg + u
+
+    # 2. Lấy mẫu lại cách đều theo s, đổi ngược s -> tham số rồi tính giải tích
+    s = np.arange(0.0, s_knots[-1], spacing)
+    s = np.append(s, s_knots[-1]) if s_knots[-1] - s[-1] > 1e-9 else s
+    t = np.interp(s, s_knots, t_knots)
+    seg = np.minimum(t.astype(np.int64), n_seg - 1)
+    pos, d1, d2 = _eval(coef, seg, t - seg)
+
+    speed2 = np.einsum('ij,ij->i', d1, d1)
+    curvature = (d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0]) / np.maximum(speed2, 1e-12) ** 1.5
+    steering = np.degrees(np.arctan(WHEELBASE * np.abs(curvature)))
+    return {
+        's': s,
+        'x': pos[:, 0],
+        'y': pos[:, 1],
+        'yaw': np.arctan2(d1[:, 1], d1[:, 0]),
+        'curvature': curvature,
+        'steering': steering,
+        'speed': speed_limit(curvature),
+        'feasible': steering <= MAX_STEERING_ANGLE,
+    }
+
+
+def trajectory_for_route(track, full_path, spacing=SPACING):
+    """Quỹ đạo cho lộ trình dạng list id node (đầu ra của planner)."""
+    idx = [track.node(n) for n in full_path]
+    return generate_trajectory(np.asarray(track.xy)[idx], spacing)
+
+
+if __name__ == "__main__":
+    import time
+    from route_table import load_route_table
+    from map_cache import load_map
+
+    track, _ = load_map()
+    full_path = load_route_table().plan(["1", "89", "36", "67"])
+    t0 = time.perf_counter()
+    traj = trajectory_for_route(track, full_path)
+    dt = time.perf_counter() - t0
+    print(f"-> {len(traj['s'])} điểm, dài {traj['s'][-1]:.2f} m, sinh trong {dt * 1e3:.2f} ms")
+    print(f"-> Góc lái lớn nhất {traj['steering'].max():.1f}°, "
+          f"{int((~traj['feasible']).sum())} điểm vượt {MAX_STEERING_ANGLE}°")
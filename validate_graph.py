@@ -0,0 +1,163 @@
+### KIỂM TRA TOÀN VẸN + TOPO CỦA ĐỒ THỊ ĐƯỜNG ĐUA (CỔNG CHẶN SAU extract_nodes) ###
+#
+# Quét toàn bộ đồ thị trong thời gian tuyến tính thay vì dò theo một lộ trình:
+#   - Thành phần liên thông mạnh (Tarjan không đệ quy trên CSR): node nằm ngoài thành phần
+#     lớn nhất là nơi xe vào được nhưng không quay lại được (hoặc ngược lại).
+#   - Node cụt (không có cạnh ra) và node nguồn (không có cạnh vào).
+#   - Cạnh lặp (trùng cả 2 đầu), cạnh tự vòng, cạnh dài gần 0.
+#   - Node chồng lên nhau (cách nhau < OVERLAP_DIST) - tra bằng lưới đều của spatial_index.
+# LỖI (thoát với mã 1): cạnh lặp / gần 0, node chồng nhau - gần như chắc chắn là vẽ nhầm
+# trong yEd. CẢNH BÁO: node cụt / nguồn / ngoài thành phần chính - có thể cố ý (lối vào bãi
+# đỗ, điểm xuất phát) nên chỉ in ra để kiểm tra bằng mắt. Cạnh tự vòng (như 18 -> 18 của
+# map thi đấu) dài 0 nên vô hại: track_graph.edge_transitions đã bỏ qua khi tính trọng số,
+# vì vậy cũng chỉ là cảnh báo.
+#
+#   python validate_graph.py [file graphml]
+
+import sys
+
+import numpy as np
+
+from instrument import traced
+from map_cache import GRAPH_FILE
+from track_graph import load_track
+from spatial_index import GridIndex
+
+# --- CẤU HÌNH ---
+MIN_EDGE_LENGTH = 0.01    # m - cạnh ngắn hơn coi như dài 0
+OVERLAP_DIST = 0.02       # m - 2 node gần hơn coi như chồng lên nhau
+
+
+def strongly_connected_components(n_nodes, indptr, indices):
+    """Tarjan không đệ quy trên CSR -> (nhãn thành phần của từng node, số thành phần)."""
+    indptr, indices = indptr.tolist(), indices.tolist()
+    index = [-1] * n_nodes
+    low = [0] * n_nodes
+    on_stack = [False] * n_nodes
+    label = [-1] * n_nodes
+    stack = []
+    counter = n_comp = 0
+    for root in range(n_nodes):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, indptr[root])]       # (node, vị trí cạnh ra tiếp theo cần xét)
+        while work:
+            v, k = work[-1]
+            if k < indptr[v + 1]:
+                work[-1] = (v, k + 1)
+                w = indices[k]
+                if index[w] < 0:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, indptr[w]))
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if work:
+                u = work[-1][0]
+                if low[v] < low[u]:
+                    low[u] = low[v]
+            if low[v] == index[v]:          # v là gốc của một thành phần
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    label[w] = n_comp
+                    if w == v:
+                        break
+                n_comp += 1
+    return np.array(label, dtype=np.int32), n_comp
+
+
+@traced("analyze.validate")
+def validate(track, min_edge_length=MIN_EDGE_LENGTH, overlap_dist=OVERLAP_DIST):
+    """Mọi vấn đề tìm được -> dict 'errors' / 'warnings' (list chuỗi) + số liệu thô."""
+    ids = track.ids
+    N = track.n_nodes
+    xy = np.asarray(track.xy, dtype=np.float64)
+    src, dst = np.asarray(track.edge_src), np.asarray(track.indices)
+    out_deg = np.diff(track.indptr)
+    in_deg = np.bincount(dst, minlength=N)
+    isolated = (out_deg == 0) & (in_deg == 0)   # vd. mốc ORIGIN / REF_X
+    errors, warnings = [], []
+
+    # --- CẠNH ---
+    self_loops = np.flatnonzero(src == dst)
+    for e in self_loops:
+        warnings.append(f"Cạnh tự vòng {ids[src[e]]} -> {ids[dst[e]]} (dài 0, bỏ qua khi tính trọng số)")
+    key = src.astype(np.int64) * N + dst
+    _, first, counts = np.unique(key, return_index=True, return_counts=True)
+    duplicates = first[counts > 1]
+    for e, c in zip(duplicates, counts[counts > 1]):
+        errors.append(f"Cạnh lặp {ids[src[e]]} -> {ids[dst[e]]} ({c} lần)")
+    length = np.hypot(*(xy[dst] - xy[src]).T)
+    short = np.flatnonzero((length < min_edge_length) & (src != dst))
+    for e in short:
+        errors.append(f"Cạnh dài gần 0 {ids[src[e]]} -> {ids[dst[e]]} ({length[e] * 100:.2f} cm)")
+
+    # --- NODE CHỒNG NHAU ---
+    active = np.flatnonzero(~isolated)
+    overlaps = []
+    if len(active):
+        near = GridIndex(track).nodes_within(xy[active], overlap_dist)
+        for i, nodes in zip(active, near):
+            overlaps.extend((int(i), int(j)) for j in nodes if j > i and not isolated[j])
+    for i, j in overlaps:
+        d = np.hypot(*(xy[i] - xy[j]))
+        errors.append(f"Node chồng nhau {ids[i]} / {ids[j]} (cách {d * 100:.2f} cm)")
+
+    # --- TOPO ---
+    dead_ends = np.flatnonzero((out_deg == 0) & ~isolated)
+    sources = np.flatnonzero((in_deg == 0) & ~isolated)
+    if len(dead_ends):
+        warnings.append(f"{len(dead_ends)} node cụt (không có cạnh ra): "
+                        + ", ".join(ids[i] for i in dead_ends))
+    if len(sources):
+        warnings.append(f"{len(sources)} node nguồn (không có cạnh vào): "
+                        + ", ".join(ids[i] for i in sources))
+    label, n_comp = strongly_connected_components(N, track.indptr, track.indices)
+    sizes = np.bincount(label[~isolated], minlength=n_comp) if n_comp else np.zeros(0, int)
+    main = int(np.argmax(sizes)) if len(sizes) else -1
+    outside = np.flatnonzero((label != main) & ~isolated)
+    if len(outside):
+        warnings.append(f"{len(outside)} node ngoài thành phần liên thông mạnh chính "
+                        f"({int(sizes[main])} node) - không đi vòng qua lại với phần còn lại: "
+                        + ", ".join(ids[i] for i in outside))
+    if isolated.any():
+        warnings.append(f"{int(isolated.sum())} node không có cạnh nào (bỏ qua): "
+                        + ", ".join(ids[i] for i in np.flatnonzero(isolated)))
+
+    return {'errors': errors, 'warnings': warnings,
+            'n_components': int((sizes > 0).sum()), 'main_component': int(sizes[main]) if main >= 0 else 0,
+            'component': label, 'dead_ends': dead_ends, 'sources': sources,
+            'self_loops': self_loops, 'duplicates': duplicates, 'short_edges': short,
+            'overlaps': overlaps}
+
+
+def check_graph(graph_file=GRAPH_FILE):
+    """In báo cáo kiểm tra -> True nếu không có LỖI (cảnh báo không tính)."""
+    print(f"--- KIỂM TRA ĐỒ THỊ: {graph_file} ---")
+    track = load_track(graph_file)
+    report = validate(track)
+    print(f"-> {track.n_nodes} nodes, {track.n_edges} edges, "
+          f"{report['n_components']} thành phần liên thông mạnh (lớn nhất {report['main_component']} node)")
+    for w in report['warnings']:
+        print(f"⚠️ {w}")
+    for e in report['errors']:
+        print(f"❌ {e}")
+    if report['errors']:
+        print(f"❌ {len(report['errors'])} lỗi - sửa trong yEd rồi chạy lại extract_nodes.py")
+        return False
+    print("✅ Đồ thị hợp lệ.")
+    return True
+
+
+if __name__ == "__main__":
+    ok = check_graph(sys.argv[1] if len(sys.argv) > 1 else GRAPH_FILE)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,116 @@
+### HỒ SƠ VẬN TỐC THỜI GIAN TỐI THIỂU (FORWARD-BACKWARD) DỌC LỘ TRÌNH ###
+#
+# 1. Giới hạn tại từng node theo gia tốc ngang: v <= sqrt(A_LAT_MAX * R), với R là bán kính
+#    đường tròn qua (node trước, node, node sau) - cùng hình học với
+#    steering_safety.calculate_radius.
+# 2. Lượt xuôi: v[i+1]^2 <= v[i]^2 + 2 * A_ACC_MAX * d[i]   (giới hạn tăng tốc)
+# 3. Lượt ngược: v[i]^2   <= v[i+1]^2 + 2 * A_DEC_MAX * d[i] (giới hạn phanh)
+# Cả 2 lượt đều là "min tích lũy" của một hàm tuyến tính theo quãng đường cộng dồn S:
+#    u[j] = 2a*S[j] + min_{k<=j}(lim[k] - 2a*S[k])   (u = v^2)
+# nên tính bằng np.minimum.accumulate, không cần vòng lặp Python.
+# 4. Thời gian từng đoạn: tăng tốc -> (chạy đều) -> phanh giữa 2 node, đỉnh vận tốc không vượt
+#    giới hạn của 2 đầu đoạn. Đoạn chỉ bị giới hạn tăng tốc / phanh cho đúng t = 2d / (v0 + v1);
+#    đoạn có v0 = v1 = 0 (vd. 2 điểm, xuất phát và dừng) vẫn tốn t = 2*sqrt(d/a) khi a đều.
+
+import numpy as np
+
+from instrument import traced
+from edge_weights import V_MAX, A_LAT_MAX
+from steering_safety import circumradius
+
+# --- CẤU HÌNH ---
+A_ACC_MAX = 0.5   # Gia tốc tăng tốc tối đa (m/s^2)
+A_DEC_MAX = 0.8   # Gia tốc phanh tối đa (m/s^2)
+
+
+def node_radii(points, closed=False):
+    """Bán kính cong tại từng điểm của polyline (2 đầu mút = vô cực nếu không khép kín)."""
+    if closed:
+        radius = circumradius(np.roll(points, 1, axis=0), points, np.roll(points, -1, axis=0))
+    else:
+        radius = np.full(len(points), np.inf)
+        if len(points) >= 3:
+            radius[1:-1] = circumradius(points[:-2], points[1:-1], points[2:])
+    return radius
+
+
+def _limit_pass(u_lim, s, accel):
+    """u[j] = min(u_lim[j], u[k] + 2a(s[j] - s[k])) cho mọi k <= j, vector hóa."""
+    return 2 * accel * s + np.minimum.accumulate(u_lim - 2 * accel * s)
+
+
+def plan_velocity(points, v_start=0.0, v_end=0.0, closed=False):
+    """Hồ sơ vận tốc thời gian tối thiểu cho polyline (M, 2).
+
+    closed=True: coi là vòng đua khép kín (điểm cuối nối về điểm đầu, bỏ qua v_start/v_end).
+    Trả về dict: 's', 'v_limit' (giới hạn do độ cong), 'v' (hồ sơ), 'time' (thời điểm
+    tới từng điểm) và 'lap_time' (tổng thời gian).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if closed:
+        # Vòng kín: trải 3 vòng liền nhau, lấy vòng giữa (đã hết ảnh hưởng của điều kiện biên)
+        n = len(points)
+        radius = np.tile(node_radii(points, closed=True), 3)
+        pts = np.vstack([points] * 3 + [points[:1]])
+        radius = np.append(radius, radius[0])
+    else:
+        pts = points
+        radius = node_radii(points)
+    seg = np.hypot(*np.diff(pts, axis=0).T)
+    s = np.concatenate([[0.0], np.cumsum(seg)])
+
+    v_limit = np.minimum(np.sqrt(A_LAT_MAX * radius), V_MAX)
+    u = v_limit ** 2
+    if not closed:
+        u[0] = min(u[0], v_start ** 2)
+        u[-1] = min(u[-1], v_end ** 2)
+    u = _limit_pass(u, s, A_ACC_MAX)                                  # lượt xuôi
+    u = _limit_pass(u[::-1], s[-1] - s[::-1], A_DEC_MAX)[::-1]        # lượt ngược
+    v = np.sqrt(np.maximum(u, 0.0))
+
+    t = np.concatenate([[0.0], np.cumsum(segment_times(seg, v, v_limit))])
+
+    if closed:
+        k = slice(n, 2 * n + 1)
+        s, v_limit, v, t = s[k] - s[n], v_limit[k], v[k], t[k] - t[n]
+    return {'s': s, 'v_limit': v_limit, 'v': v, 'time': t, 'lap_time': float(t[-1])}
+
+
+def segment_times(seg, v, v_limit):
+    """Thời gian tối thiểu trên từng đoạn dài seg, vận tốc 2 đầu v[:-1], v[1:].
+
+    Tăng tốc A_ACC_MAX tới vận tốc đỉnh rồi phanh A_DEC_MAX; đỉnh bị chặn bởi giới hạn lớn hơn
+    của 2 đầu đoạn (phần còn lại chạy đều ở đỉnh). Đoạn dài > 0 luôn tốn thời gian > 0.
+    """
+    a, d = A_ACC_MAX, A_DEC_MAX
+    u0, u1 = v[:-1] ** 2, v[1:] ** 2
+    # Đỉnh khi tăng tốc rồi phanh ngay: (v^2 - u0) / 2a + (v^2 - u1) / 2d = seg
+    peak = np.sqrt((2 * a * d * seg + d * u0 + a * u1) / (a + d))
+    cap = np.maximum(v_limit[:-1], v_limit[1:])
+    peak = np.where(cap > 0, np.minimum(peak, cap), peak)
+    peak = np.maximum(peak, np.maximum(v[:-1], v[1:]))
+    cruise = np.maximum(seg - (peak ** 2 - u0) / (2 * a) - (peak ** 2 - u1) / (2 * d), 0.0)
+    dt = (peak - v[:-1]) / a + (peak - v[1:]) / d + cruise / np.where(peak > 0, peak, np.inf)
+    return np.where(seg > 0, dt, 0.0)
+
+
+@traced("analyze.velocity")
+def route_velocity(track, full_path, **kwargs):
+    """Hồ sơ vận tốc cho lộ trình dạng list id node (bỏ node trùng tọa độ liên tiếp)."""
+    pts = np.asarray(track.xy)[[track.node(n) for n in full_path]]
+    keep = np.ones(len(pts), dtype=bool)
+    keep[1:] = np.any(np.diff(pts, axis=0) != 0, axis=1)
+    return plan_velocity(pts[keep], **kwargs)
+
+
+if __name__ == "__main__":
+    from map_cache import load_map
+    from route_table import load_route_table
+
+    track, _ = load_map()
+    table = load_route_table()
+    waypoints = ["1", "89", "36", "67"]
+    profile = route_velocity(track, table.plan(waypoints))
+    print(f"-> Lộ trình {' -> '.join(waypoints)}: dài {profile['s'][-1]:.2f} m")
+    print(f"-> Thời gian ước tính (forward-backward): {profile['lap_time']:.2f} s"
+          f" | chi phí trong bảng đường đi: {table.cost(waypoints):.2f} s")